@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+from llm.interface import get_client, build_messages, parse_reply
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Statuses after which a batch no longer changes
+FAILED_STATUSES = ('failed', 'expired', 'cancelled')
+
+DEFAULT_BATCH_CFG = {
+    'enabled': False,
+    'backend': 'openai',
+    'job_dir': 'results/batch_jobs/',
+    'poll_interval_s': 60,
+    'timeout_h': 24,
+    'local_delay_s': 5,
+}
+
+
+def answer_id(experiment_name: str, task: str) -> str:
+    return f"answer-{experiment_name}-{task}"
+
+
+def prompt_id(prompt: str) -> str:
+    # Judge prompts are identified by their content, identical prompts are judged once
+    return f"judge-{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:32]}"
+
+
+def batch_request(custom_id: str, llm_cfg: dict, prompt: str) -> dict:
+    """One line of a batch job file, the request LLMClient.query would send."""
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {
+            'model': llm_cfg['model_name'],
+            'messages': build_messages(prompt),
+            'temperature': llm_cfg['temperature'],
+            'max_tokens': llm_cfg['max_tokens'],
+        },
+    }
+
+
+def parse_output(text: str) -> Dict[str, Optional[str]]:
+    """custom id -> reply content of a batch output file, None for failed requests."""
+    replies = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            replies[result['custom_id']] = None
+            continue
+        replies[result['custom_id']] = response['body']['choices'][0]['message']['content']
+    return replies
+
+
+class OpenAIBatchBackend:
+    """Runs jobs through the OpenAI Batch API."""
+    def __init__(self, batch_cfg: dict):
+        self.cfg = batch_cfg
+
+    def submit(self, job_path: str) -> str:
+        with open(job_path, "rb") as f:
+            input_file = get_client().files.create(file=f, purpose='batch')
+        batch = get_client().batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window='24h')
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return get_client().batches.retrieve(batch_id).status
+
+    def output(self, batch_id: str) -> str:
+        batch = get_client().batches.retrieve(batch_id)
+        # Requests that failed are only listed in the error file
+        text = ""
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                text += get_client().files.content(file_id).text + "\n"
+        return text
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for a batch API that never leaves the machine: jobs are copied to a local
+    directory and complete local_delay_s after submission with placeholder replies.
+    """
+    def __init__(self, batch_cfg: dict):
+        self.root = os.path.join(batch_cfg['job_dir'], 'local_backend')
+        self.delay = batch_cfg.get('local_delay_s', 5)
+
+    def submit(self, job_path: str) -> str:
+        batch_id = f"local_{os.path.splitext(os.path.basename(job_path))[0]}_{int(time.time() * 1000)}"
+        batch_dir = os.path.join(self.root, batch_id)
+        os.makedirs(batch_dir, exist_ok=True)
+        shutil.copy(job_path, os.path.join(batch_dir, 'input.jsonl'))
+        with open(os.path.join(batch_dir, 'batch.json'), "w") as f:
+            json.dump({'submitted_at': time.time(), 'delay_s': self.delay}, f)
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        batch_dir = os.path.join(self.root, batch_id)
+        with open(os.path.join(batch_dir, 'batch.json'), "r") as f:
+            batch = json.load(f)
+        if time.time() - batch['submitted_at'] < batch['delay_s']:
+            return 'in_progress'
+        if not os.path.exists(os.path.join(batch_dir, 'output.jsonl')):
+            self._complete(batch_dir)
+        return 'completed'
+
+    def output(self, batch_id: str) -> str:
+        with open(os.path.join(self.root, batch_id, 'output.jsonl'), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _complete(self, batch_dir: str):
+        lines = []
+        with open(os.path.join(batch_dir, 'input.jsonl'), "r", encoding="utf-8") as f:
+            for line in f:
+                request = json.loads(line)
+                content = f"[local batch] {request['body']['model']}"
+                lines.append(json.dumps({
+                    'custom_id': request['custom_id'],
+                    'response': {'status_code': 200, 'body': {'choices': [{'message': {'role': 'assistant', 'content': content}}]}},
+                    'error': None,
+                }))
+        with open(os.path.join(batch_dir, 'output.jsonl'), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+batch_backends = {
+    'openai': OpenAIBatchBackend,
+    'local': LocalBatchBackend,
+}
+
+
+def write_job(job_dir: str, stage: str, model_name: str, requests: List[dict]) -> str:
+    """Write a job file named after its content, so rerunning a sweep finds the same job."""
+    unique = {request['custom_id']: request for request in requests}
+    text = "".join(json.dumps(request, sort_keys=True) + "\n" for request in unique.values())
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+    job_path = os.path.join(job_dir, f"{stage}_{model_name}_{digest}.jsonl")
+    if not os.path.exists(job_path):
+        os.makedirs(job_dir, exist_ok=True)
+        with open(job_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return job_path
+
+
+def run_jobs(stage: str, requests: Dict[str, List[dict]], batch_cfg: dict) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Submit one job per model (a batch can only target one model), poll until all of them
+    completed and return model -> custom id -> reply content. Submitted jobs are recorded
+    next to their job file, a sweep that is started again picks them up instead of resubmitting.
+    """
+    batch_cfg = dict(DEFAULT_BATCH_CFG, **batch_cfg)
+    backend = batch_backends[batch_cfg['backend']](batch_cfg)
+
+    jobs = {}
+    for model_name, model_requests in requests.items():
+        if not model_requests:
+            continue
+        job_path = write_job(batch_cfg['job_dir'], stage, model_name, model_requests)
+        state_path = job_path[:-len('.jsonl')] + '.batch.json'
+        state = None
+        if os.path.exists(state_path):
+            with open(state_path, "r") as f:
+                state = json.load(f)
+        if state is None or state['backend'] != batch_cfg['backend']:
+            state = {'backend': batch_cfg['backend'], 'batch_id': backend.submit(job_path)}
+            with open(state_path, "w") as f:
+                json.dump(state, f)
+            print(f"[INFO] Submitted {len(model_requests)} {stage} requests for {model_name} as batch {state['batch_id']}")
+        else:
+            print(f"[INFO] Resuming batch {state['batch_id']} ({stage}, {model_name})")
+        jobs[model_name] = (job_path, state['batch_id'])
+
+    deadline = time.monotonic() + batch_cfg['timeout_h'] * 3600
+    replies = {}
+    pending = dict(jobs)
+    while pending:
+        for model_name, (job_path, batch_id) in list(pending.items()):
+            status = backend.status(batch_id)
+            if status == 'completed':
+                replies[model_name] = parse_output(backend.output(batch_id))
+                del pending[model_name]
+            elif status in FAILED_STATUSES:
+                raise RuntimeError(f"Batch {batch_id} for {job_path} {status}, delete its .batch.json to submit it again")
+        if not pending:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Batches still running after {batch_cfg['timeout_h']} h: {[batch_id for _, batch_id in pending.values()]}, run again to resume")
+        time.sleep(batch_cfg['poll_interval_s'])
+
+    for model_name, model_requests in requests.items():
+        failed = [request['custom_id'] for request in model_requests if replies.get(model_name, {}).get(request['custom_id']) is None]
+        if failed:
+            print(f"[WARN] {len(failed)} {stage} requests for {model_name} got no reply and are left out of the results, e.g. {failed[0]}")
+    return replies
+
+
+class PromptRecorder:
+    """Stands in for an LLMClient and collects the prompts it is asked, to send them as a batch job."""
+    def __init__(self, config: dict):
+        self.model_name = config['model_name']
+        self.cfg = config
+        self.dry_run = False
+        self.requests = {}
+
+    def query(self, prompt: str) -> str:
+        custom_id = prompt_id(prompt)
+        self.requests[custom_id] = batch_request(custom_id, self.cfg, prompt)
+        return ""
+
+
+class ReplayClient:
+    """
+    Stands in for an LLMClient and answers with the replies of a completed batch job, or with
+    None for a prompt the job has no reply for, which the caller leaves out instead of scoring.
+    """
+    def __init__(self, config: dict, replies: Dict[str, Optional[str]]):
+        self.model_name = config['model_name']
+        self.cfg = config
+        self.dry_run = False
+        self.replies = replies
+
+    def query(self, prompt: str):
+        reply = self.replies.get(prompt_id(prompt))
+        return None if reply is None else parse_reply(reply, self.cfg['mode'])
+
+
+def batch_judge(judge_fn, eval_llm_cfgs: List[dict], batch_cfg: dict) -> list:
+    """
+    Run judge_fn(i, evaluator) for every evaluator config twice: first with a PromptRecorder to
+    learn which prompts need judging, then, after one batch job per judge model, with a
+    ReplayClient. Returns the results of the second pass.
+    """
+    recorders = [PromptRecorder(cfg) for cfg in eval_llm_cfgs]
+    for i, recorder in enumerate(recorders):
+        judge_fn(i, recorder)
+
+    requests = {}
+    for recorder in recorders:
+        requests.setdefault(recorder.model_name, []).extend(recorder.requests.values())
+    replies = run_jobs('judge', requests, batch_cfg)
+
+    return [judge_fn(i, ReplayClient(cfg, replies.get(cfg['model_name'], {}))) for i, cfg in enumerate(eval_llm_cfgs)]
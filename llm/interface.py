@@ -1,22 +1,72 @@
 import os
-from openai import OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 import json
 from typing import Optional, Union, Dict
 import yaml
 import time
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # The OpenAI SDK is slow to import and needs an API key, so only load it once a query is made
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def model_configs(config: dict) -> list:
+    """
+    One LLM config per answer model. `models` lists model names or dicts overriding any
+    setting of the llm section for that model (e.g. concurrency, requests_per_minute).
+    Without `models` the llm section itself is the only model.
+    """
+    shared = {k: v for k, v in config.items() if k != 'models'}
+    models = config.get('models') or [config['model_name']]
+    return [dict(shared, **(model if isinstance(model, dict) else {'model_name': model})) for model in models]
+
+
+class RateLimiter:
+    """Spaces out request starts to at most requests_per_minute, shared by all threads."""
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
 
 class LLMClient:
-    def __init__(self, config):
+    def __init__(self, config, dry_run: bool = False):
         """
         Initialize the LLM client.
         - model_name: OpenAI model like "gpt-4-0613"
         - api_key: your OpenAI API key
         - function_defs: list of function definitions for function-calling
+        - dry_run: don't call the API, return a placeholder reply instead
+        - requests_per_minute: enforced by callers through throttle(), so waiting isn't counted as latency
         """
         self.model_name = config['model_name']
         self.cfg = config        
+        self.dry_run = dry_run
+        self.rate_limiter = RateLimiter(config.get('requests_per_minute'))
+
+
+    def throttle(self):
+        if not self.dry_run:
+            self.rate_limiter.wait()
 
 
     def query(self, prompt: str) -> Union[str, Dict]:
@@ -27,38 +77,47 @@ class LLMClient:
           - "json": tries to parse and return JSON from the reply
           - "function_call": expects the model to respond with a function call structure and returns the function call info as dict
         """
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ]
+        if self.dry_run:
+            return f"[dry run] {self.model_name}" if self.cfg['mode'] == "text" else {}
 
         # Prepare kwargs for function calls if needed
-        response = client.chat.completions.create(model=self.model_name,
-                messages=messages,
+        response = get_client().chat.completions.create(model=self.model_name,
+                messages=build_messages(prompt),
                 temperature=self.cfg['temperature'],
                 max_tokens=self.cfg['max_tokens']
             )
 
         message = response.choices[0].message
         time.sleep(self.cfg['delay'])
-        
 
-        if self.cfg['mode'] == "text":
-            # Return plain text
-            return message.content.strip()
+        return parse_reply(message.content, self.cfg['mode'])
+
+
+def build_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_reply(content: Optional[str], mode: str) -> Union[str, Dict]:
+    """Turn the text of a chat completion into the reply of the configured mode."""
+    content = content or ""
+    if mode == "text":
+        # Return plain text
+        return content.strip()
 
-        elif self.cfg['mode'] == "json":
-            # Try to parse JSON out of the message content
-            text = message.get("content", "")
-            try:
-                parsed = json.loads(text)
-                return parsed
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return raw text with an error key
-                return {"error": "Failed to parse JSON", "raw": text}
+    elif mode == "json":
+        # Try to parse JSON out of the message content
+        try:
+            parsed = json.loads(content)
+            return parsed
+        except json.JSONDecodeError:
+            # If JSON parsing fails, return raw text with an error key
+            return {"error": "Failed to parse JSON", "raw": content}
 
-        else:
-            raise ValueError(f"Unsupported mode: {self.cfg['mode']}")
+    else:
+        raise ValueError(f"Unsupported mode: {mode}")
 
 if __name__ == '__main__':
     with open('/home/anaveen/Documents/mit_research_ws/01_dsg_prompting/dsg_llm_eval/configs/eval_config.yaml', 'r') as file:
@@ -67,4 +126,4 @@ if __name__ == '__main__':
     llm_config = config['llm']
     llmclient = LLMClient(llm_config)
 
-    print(llmclient.query("how are you?"))
\ No newline at end of file
+    print(llmclient.query("how are you?"))
@@ -0,0 +1,134 @@
+import warnings
+from itertools import combinations
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+N_RESAMPLES = 2000
+CONFIDENCE = 0.95
+# Same threshold as the plots
+CORRECT_SCORE = 3.5
+
+
+class QuestionBootstrap:
+    """
+    Paired bootstrap over questions. The resampled question counts are drawn once, stratified by
+    question type, and shared by every grouping and group, so the accuracies of two serializations
+    in the same resample are computed on the same questions.
+
+    Accuracy of every group in every resample is one matrix product:
+    (resamples x questions) @ (questions x groups) of per-question correct and answer counts.
+    Questions answered more than once (several runs or experiments) are resampled as one unit.
+    """
+    def __init__(self, df: pd.DataFrame, n_resamples: int = N_RESAMPLES, seed: int = 0, strata: Optional[str] = 'question_type'):
+        self.df = df
+        self.correct = (df['score'] > CORRECT_SCORE).to_numpy(dtype=np.float64)
+        question = df['question_type'].astype(str) + '_' + df['question_id'].astype(str)
+        self.question_codes, questions = pd.factorize(question)
+        self.n_questions = len(questions)
+
+        if strata is None:
+            question_strata = np.zeros(self.n_questions, dtype=np.int64)
+        else:
+            first_row = pd.Series(np.arange(len(df))).groupby(self.question_codes).first().to_numpy()
+            question_strata = pd.factorize(df[strata].to_numpy()[first_row])[0]
+        self.weights = resample_counts(question_strata, n_resamples, np.random.default_rng(seed))
+
+    def _group_counts(self, group_cols: List[str]):
+        if group_cols:
+            grouped = self.df.groupby(group_cols, sort=True, dropna=False)
+            group_codes = grouped.ngroup().to_numpy()
+            keys = grouped.size().reset_index()[group_cols]
+        else:
+            group_codes, keys = np.zeros(len(self.df), dtype=np.int64), pd.DataFrame(index=[0])
+        n_groups = len(keys)
+
+        cells = group_codes * self.n_questions + self.question_codes
+        size = n_groups * self.n_questions
+        correct = np.bincount(cells, weights=self.correct, minlength=size).reshape(n_groups, self.n_questions)
+        answers = np.bincount(cells, minlength=size).reshape(n_groups, self.n_questions).astype(np.float64)
+        return keys, correct, answers
+
+    def accuracy(self, group_cols: List[str]):
+        """Returns the group keys, point accuracy per group and accuracy per resample and group."""
+        keys, correct, answers = self._group_counts(group_cols)
+        point = correct.sum(axis=1) / answers.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Resamples that drew none of a group's questions have no accuracy
+            samples = (self.weights @ correct.T) / (self.weights @ answers.T)
+        keys['n'] = answers.sum(axis=1).astype(int)
+        return keys, point, samples
+
+    def ci_table(self, group_cols: List[str], confidence: float = CONFIDENCE) -> pd.DataFrame:
+        keys, point, samples = self.accuracy(group_cols)
+        lower, upper = interval(samples, confidence)
+        return keys.assign(accuracy=point, lower=lower, upper=upper)
+
+    def paired_differences(self, group_cols: List[str], compare: str = 'serialization', confidence: float = CONFIDENCE) -> pd.DataFrame:
+        """
+        Accuracy difference (a - b) with its interval for every pair of `compare` values
+        within each combination of the other group columns.
+        """
+        keys, point, samples = self.accuracy(group_cols + [compare])
+        within = [col for col in group_cols if col != compare]
+
+        pairs = []
+        cells = keys.groupby(within, sort=False).indices.values() if within else [np.arange(len(keys))]
+        for rows in cells:
+            pairs.extend(combinations(rows, 2))
+        columns = within + [f'{compare}_a', f'{compare}_b', 'diff', 'lower', 'upper', 'p_a_better', 'decided']
+        if not pairs:
+            return pd.DataFrame(columns=columns)
+
+        a, b = np.array(pairs).T
+        diffs = samples[:, a] - samples[:, b]
+        lower, upper = interval(diffs, confidence)
+        table = keys.loc[a, within].reset_index(drop=True)
+        table[f'{compare}_a'] = keys.loc[a, compare].to_numpy()
+        table[f'{compare}_b'] = keys.loc[b, compare].to_numpy()
+        table['diff'] = point[a] - point[b]
+        table['lower'] = lower
+        table['upper'] = upper
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            table['p_a_better'] = np.nanmean(np.where(np.isnan(diffs), np.nan, diffs > 0), axis=0)
+        table['decided'] = (lower > 0) | (upper < 0)
+        return table[columns]
+
+
+def resample_counts(strata: np.ndarray, n_resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    How often every question is drawn in every resample (n_resamples x questions), drawing
+    with replacement as many questions as each stratum has, from that stratum only.
+    """
+    n_questions = len(strata)
+    draws = np.empty((n_resamples, n_questions), dtype=np.int64)
+    start = 0
+    order = np.argsort(strata, kind='stable')
+    for count in np.bincount(strata):
+        members = order[start:start + count]
+        draws[:, start:start + count] = members[rng.integers(0, count, size=(n_resamples, count))]
+        start += count
+
+    # Offsetting every resample by its row turns the counting into one bincount
+    flat = (draws + np.arange(n_resamples)[:, None] * n_questions).ravel()
+    return np.bincount(flat, minlength=n_resamples * n_questions).reshape(n_resamples, n_questions).astype(np.float64)
+
+
+def interval(samples: np.ndarray, confidence: float = CONFIDENCE):
+    """Percentile interval per column, NaN where no resample has a value."""
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # Groups without a value in any resample
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if not np.isnan(samples).any():
+            lower, upper = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+        else:
+            lower, upper = np.nanquantile(samples, [alpha, 1 - alpha], axis=0)
+    return lower, upper
+
+
+def error_bars(table: pd.DataFrame) -> np.ndarray:
+    """Asymmetric yerr for matplotlib from a ci_table."""
+    return np.vstack([table['accuracy'] - table['lower'], table['upper'] - table['accuracy']]).clip(min=0)
@@ -0,0 +1,111 @@
+import copy
+import itertools
+import json
+import yaml
+
+
+def recursive_merge(base, overrides):
+    for k, v in overrides.items():
+        if isinstance(v, dict) and k in base and isinstance(base[k], dict):
+            recursive_merge(base[k], v)
+        else:
+            base[k] = v
+    return base
+
+
+def load_config(config_path):
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    return config
+
+
+def set_dotted(config, path, value):
+    keys = path.split('.')
+    for key in keys[:-1]:
+        config = config.setdefault(key, {})
+    config[keys[-1]] = value
+
+
+def _format_value(value):
+    if isinstance(value, (list, tuple)):
+        return '-'.join(str(v) for v in value)
+    return str(value)
+
+
+def expand_grid(grid):
+    """
+    Expand a grid block into named experiments, one per combination of axis values.
+    - grid['axes']: dotted config path -> list of values, e.g. 'llm.temperature': [0.0, 0.2]
+    - grid['name']: optional format string over the last path segments, e.g. "{type}_t{temperature}"
+    """
+    axes = grid['axes']
+    paths = list(axes)
+    experiments = []
+    for values in itertools.product(*(axes[path] for path in paths)):
+        overrides = {}
+        for path, value in zip(paths, values):
+            set_dotted(overrides, path, copy.deepcopy(value))
+
+        fields = {path.split('.')[-1]: _format_value(value) for path, value in zip(paths, values)}
+        if 'name' in grid:
+            name = grid['name'].format(**fields)
+        else:
+            # Axes with a single value are the same for every experiment, leave them out
+            name = '_'.join(fields[path.split('.')[-1]] for path in paths if len(axes[path]) > 1) or 'grid'
+        experiments.append({'name': name, 'overrides': overrides})
+    return experiments
+
+
+def normalize_config(config):
+    """
+    Rewrite equivalent settings into one canonical form: repeated serialization types and
+    detail keys are dropped and any detail_keys containing "NA" becomes ["NA"].
+    """
+    serialization_cfg = config['prompt']['serialization']
+    types = serialization_cfg['type']
+    detail_keys = serialization_cfg['detail_keys']
+    serialization_cfg['type'] = list(dict.fromkeys([types] if isinstance(types, str) else types))
+    detail_keys = list(dict.fromkeys([detail_keys] if isinstance(detail_keys, str) else detail_keys))
+    serialization_cfg['detail_keys'] = ['NA'] if 'NA' in detail_keys else detail_keys
+    return config
+
+
+def execution_key(config) -> str:
+    """Everything that changes the prompts, the answers or their scores, as a canonical string."""
+    prompt_cfg = config['prompt']
+    serialization_cfg = prompt_cfg['serialization']
+    return json.dumps({
+        'scene_dir': config['dataset']['scene_dir'],
+        'prompt': {key: value for key, value in prompt_cfg.items() if key != 'serialization'},
+        'serialization': [serialization_cfg['type'], serialization_cfg['detail_keys']],
+        'llm': {key: value for key, value in config['llm'].items() if key != 'delay'},
+        'evaluation': config['evaluation'],
+    }, sort_keys=True, default=str)
+
+
+def group_equivalent(named_configs):
+    """Group (name, config) pairs with the same execution key, keeping first-seen order."""
+    groups = {}
+    for name, config in named_configs:
+        groups.setdefault(execution_key(config), []).append((name, config))
+    return list(groups.values())
+
+
+def expand_experiments(base_config, experiments_config):
+    """
+    Merge every experiment's overrides into a copy of the base config, in file order,
+    followed by the combinations of the grid block if there is one.
+    """
+    experiments = list(experiments_config.get('experiments') or [])
+    if experiments_config.get('grid'):
+        experiments += expand_grid(experiments_config['grid'])
+
+    names = [experiment['name'] for experiment in experiments]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate experiment names: {', '.join(duplicates)}")
+
+    return [
+        (experiment['name'], normalize_config(recursive_merge(copy.deepcopy(base_config), experiment['overrides'])))
+        for experiment in experiments
+    ]
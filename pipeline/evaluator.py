@@ -1,20 +1,73 @@
+from typing import Optional
+
 from llm.interface import LLMClient
 import yaml
 from tqdm import tqdm
 import pandas as pd
+from reference_matching import match_references, AMBIGUOUS
+
+def build_judge_prompt(template: str, question: str, ground_truth: str, predicted: str) -> str:
+    eval_prompt = template.replace("{{question}}", question)
+    eval_prompt = eval_prompt.replace("{{ground_truth}}", ground_truth)
+    eval_prompt = eval_prompt.replace("{{predicted}}", predicted)
+    return eval_prompt
+
+
+def parse_score(result: str) -> float:
+    try:
+        return float(result)
+    except ValueError:
+        return -1  # or handle differently if your LLM might output text instead
+
+
+def judge_answer(evaluator: LLMClient, template: str, question: str, ground_truth: str, predicted: str) -> Optional[float]:
+    # None when a batch job has no reply for the prompt
+    result = evaluator.query(build_judge_prompt(template, question, ground_truth, predicted))
+    return None if result is None else parse_score(result.lower())
+
+
+def num_attributes(detail_keys: list) -> int:
+    # "NA" disables attributes entirely
+    return 0 if "NA" in detail_keys else len(detail_keys)
 
-def evaluate_summary(predicted_answers: dict, ground_truth_answers: dict, cfg: dict, serialization_cfg: dict, debug: bool = False) -> dict:
-    evaluator = LLMClient(cfg['llm'])
+
+def result_row(qid: str, task: dict, prediction: dict, serialization_cfg: dict, score: float, eval_method: str = "llm_judge") -> dict:
+    row = {
+        "question_id": qid.split('_')[1],
+        "question_type": qid.split('_')[0],
+        "serialization": '-'.join(serialization_cfg['type']),
+        "num_attributes": num_attributes(serialization_cfg['detail_keys']),
+        "question": task["query"],
+        "ground_truth_answer": task["answer"],
+        "predicted_answer": prediction['answer'],
+        'llm_elapsed_time': prediction['elapsed_time'],
+        "score": score,
+        "eval_method": eval_method
+    }
+    # The answer model, and what the prompt was restricted to when only a subgraph of the scene was sent
+    for key in ('model', 'prompt_rooms', 'selection', 'prompt_chars'):
+        if key in prediction:
+            row[key] = prediction[key]
+    return row
+
+
+def llm_judge_summary(predicted_answers: dict, ground_truth_answers: dict, cfg: dict, serialization_cfg: dict, debug: bool = False, evaluator=None) -> pd.DataFrame:
+    # The caller's evaluator carries the run's dry_run setting, or stands in for a batch job
+    evaluator = evaluator or LLMClient(cfg['llm'])
 
     with open(cfg['expected_template'], "r", encoding="utf-8") as f:
         template = f.read()    
 
     rows = []
+    judged = []
     
     for qid in tqdm(ground_truth_answers):        
-        eval_prompt = template.replace("{{question}}", ground_truth_answers[qid]["query"])
-        eval_prompt = eval_prompt.replace("{{ground_truth}}", ground_truth_answers[qid]["answer"])
-        eval_prompt = eval_prompt.replace("{{predicted}}", predicted_answers[qid]['answer'])
+        eval_prompt = build_judge_prompt(
+            template,
+            ground_truth_answers[qid]["query"],
+            ground_truth_answers[qid]["answer"],
+            predicted_answers[qid]['answer']
+        )
 
         if debug: 
             # Find the index of the last period
@@ -27,37 +80,108 @@ def evaluate_summary(predicted_answers: dict, ground_truth_answers: dict, cfg: d
             result = eval_prompt[:second_last_sentence]
             eval_prompt += " Explain why.\n"
 
-        result = evaluator.query(eval_prompt).lower()
+        result = evaluator.query(eval_prompt)
+        if result is None:
+            # The batch request for this answer failed, it is left out rather than scored
+            continue
+        result = result.lower()
         
         if debug:
             print(eval_prompt)
             print(result)
             return
         
-        try:
-            score = float(result)
-        except ValueError:
-            score = -1  # or handle differently if your LLM might output text instead
+        score = parse_score(result)
+        rows.append(result_row(qid, ground_truth_answers[qid], predicted_answers[qid], serialization_cfg, score))
+        judged.append(qid)
 
-        if "NA" in serialization_cfg['detail_keys']: serialization_cfg['detail_keys'] = []
-        
-        row = {
-            "question_id": qid.split('_')[1],
-            "question_type": qid.split('_')[0],
-            "serialization": '-'.join(serialization_cfg['type']),
-            "num_attributes": len(serialization_cfg['detail_keys']),
-            "question": ground_truth_answers[qid]["query"],
-            "ground_truth_answer": ground_truth_answers[qid]["answer"],
-            "predicted_answer": predicted_answers[qid]['answer'],
-            'llm_elapsed_time': predicted_answers[qid]['elapsed_time'],
-            "score": score
-        }
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame(rows, index=judged)
     return df
+
+
+def reference_matching_summary(predicted_answers: dict, ground_truth_answers: dict, cfg: dict, serialization_cfg: dict, labels: list) -> pd.DataFrame:
+    rows = [
+        result_row(qid, ground_truth_answers[qid], predicted_answers[qid], serialization_cfg, None, "reference_matching")
+        for qid in ground_truth_answers
+    ]
+    df = pd.DataFrame(rows, index=list(ground_truth_answers))
+    if df.empty:
+        return df
+
+    scored = match_references(df, labels, cfg.get('reference_matching', {}))
+    df['score'] = scored['score']
+    df.loc[scored['match_status'] == AMBIGUOUS, 'eval_method'] = AMBIGUOUS
+    return df
+
+
+def evaluate_summary(predicted_answers: dict, ground_truth_answers: dict, cfg: dict, serialization_cfg: dict, debug: bool = False, labels: list = None, evaluator=None) -> pd.DataFrame:
+    eval_type = cfg.get('eval_type', 'llm_judge')
+    if eval_type == 'llm_judge':
+        return llm_judge_summary(predicted_answers, ground_truth_answers, cfg, serialization_cfg, debug, evaluator)
+
+    df = reference_matching_summary(predicted_answers, ground_truth_answers, cfg, serialization_cfg, labels or [])
+    if eval_type == 'reference_matching' or df.empty:
+        return df.reset_index(drop=True)
+
+    if eval_type != 'hybrid':
+        raise ValueError(f"Unsupported eval_type: {eval_type}")
+
+    # Only the answers the local matcher could not decide go to the LLM judge
+    ambiguous = df.index[df['eval_method'] == AMBIGUOUS]
+    print(f"[INFO] Reference matching scored {len(df) - len(ambiguous)}/{len(df)} answers, sending the rest to the LLM judge")
+    if len(ambiguous):
+        judged = llm_judge_summary(
+            {qid: predicted_answers[qid] for qid in ambiguous},
+            {qid: ground_truth_answers[qid] for qid in ambiguous},
+            cfg,
+            serialization_cfg,
+            evaluator=evaluator
+        )
+        if not judged.empty:
+            df.loc[judged.index, 'score'] = judged['score']
+            df.loc[judged.index, 'eval_method'] = 'llm_judge'
+        # Answers the judge had no reply for are left out
+        df = df.drop(ambiguous.difference(judged.index))
+
+    return df.reset_index(drop=True)
     
 
+def rescore_results(results: pd.DataFrame, cfg: dict, labels: list = None, evaluator=None) -> pd.DataFrame:
+    """Score the answers of an existing results table again with the given evaluation config."""
+    eval_type = cfg.get('eval_type', 'llm_judge')
+    df = results.copy()
+
+    to_judge = df.index
+    if eval_type != 'llm_judge':
+        scored = match_references(df, labels or [], cfg.get('reference_matching', {}))
+        df['score'] = scored['score']
+        df['eval_method'] = 'reference_matching'
+        df.loc[scored['match_status'] == AMBIGUOUS, 'eval_method'] = AMBIGUOUS
+        if eval_type == 'reference_matching':
+            return df
+        to_judge = df.index[df['eval_method'] == AMBIGUOUS]
+
+    evaluator = evaluator or LLMClient(cfg['llm'])
+    with open(cfg['expected_template'], "r", encoding="utf-8") as f:
+        template = f.read()
+
+    unanswered = []
+    for i in tqdm(to_judge):
+        score = judge_answer(
+            evaluator,
+            template,
+            df.loc[i, 'question'],
+            str(df.loc[i, 'ground_truth_answer']),
+            str(df.loc[i, 'predicted_answer'])
+        )
+        if score is None:
+            unanswered.append(i)
+            continue
+        df.loc[i, 'score'] = score
+        df.loc[i, 'eval_method'] = 'llm_judge'
+    return df.drop(unanswered)
+
+
 if __name__ == '__main__':
     predicted_answers = {
         0: "To determine which object most frequently appears directly next to swivel chairs or chairs in Room 3, we first need to identify the positions of the swivel chairs and chairs in that room.\n\nIn Room 3, the objects are as follows:\n- **Chairs**:\n  - Chair (id = 273) at position [-12.93421085, 16.49990415, 1.82354166]\n  - Chair (id = 266) at position [-8.59625987, 16.88161511, 1.78747596]\n  \n- **Swivel**:\n  - Swivel (id = 276) at position [-12.91257052, 16.49470501, 1.45444641]\n  - Swivel (id = 276) at position [-12.91257052, 16.49470501, 1.45444641]\n\nNext, we need to check the objects that are adjacent to these chairs and swivel chairs. \n\nHowever, the scene information does not provide explicit adjacency data, such as which objects are next to each other. Therefore, we can only infer adjacency based on their positions.\n\nGiven the positions of the chairs and swivel chairs, we can check for other objects that are close to these positions. \n\nThe objects in Room 3 are:\n- 2 cabinets\n- 3 chairs\n- 10 desks\n- 5 lights\n- 2 sofas\n- 1 swivel\n- 1 wardrobe\n\nSince we do not have the exact positions of the other objects in Room 3, we cannot definitively determine which object appears most frequently next to the chairs or swivel chairs based on the provided data.\n\nIf we had the positions of all objects in Room 3, we could calculate distances to find which object is most frequently adjacent to the chairs and swivel chairs. \n\nIn conclusion, without specific positional data for all objects in Room 3, we cannot determine which object most frequently appears next to the swivel chairs or chairs.",
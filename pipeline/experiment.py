@@ -0,0 +1,372 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+import pandas as pd
+import hashlib
+import json
+import time
+
+from config import expand_experiments, group_equivalent
+from prompt_builder import (
+    load_dataset,
+    dataset_labels,
+    serialize_dataset,
+    build_prompt,
+    serialize_subgraph,
+)
+from models.scene_index import build_scene_indices
+from subgraph import select_task_subgraphs, format_rooms
+
+from task_dataset import load_task_dataset
+from llm.interface import LLMClient, model_configs, parse_reply
+from llm.batch import answer_id, batch_request, run_jobs, batch_judge
+from evaluator import evaluate_summary, judge_answer, result_row, reference_matching_summary, num_attributes
+from reference_matching import AMBIGUOUS
+from sequential import run_adaptive
+from sharding import shard_of
+from profiling import span
+
+
+def prepare_experiment(config):
+    dataset_cfg = config['dataset']
+    prompt_cfg = config['prompt']
+    serialization_cfg = prompt_cfg['serialization']
+    llm_cfg = config['llm']
+    eval_cfg = config['evaluation']
+    dry_run = config['run'].get('dry_run', False)
+
+    with span('load_dataset'):
+        dsg_dataset = load_dataset(dataset_cfg)
+
+    with span('serialize_dataset', trace_memory=True):
+        scene_reprs = serialize_dataset(dsg_dataset, serialization_cfg)
+
+    with open(eval_cfg['expected_template'], "r", encoding="utf-8") as f:
+        judge_template = f.read()
+
+    task_dataset = load_task_dataset(prompt_cfg)
+    labels = dataset_labels(dsg_dataset)
+
+    # Rooms each question is about, when only that part of the scene should be serialized
+    subgraph_cfg = prompt_cfg.get('subgraph') or {}
+    selections = None
+    if subgraph_cfg.get('enabled', False):
+        with span('select_subgraphs'):
+            selections = select_task_subgraphs(task_dataset, build_scene_indices(dsg_dataset), labels, subgraph_cfg.get('hops', 1))
+
+    return {
+        'config': config,
+        'scene_reprs': scene_reprs,
+        'task_dataset': task_dataset,
+        'labels': labels,
+        # Answer models, in config order, all sent the same prompts
+        'llmclients': {cfg['model_name']: LLMClient(cfg, dry_run=dry_run) for cfg in model_configs(llm_cfg)},
+        'evaluator': LLMClient(eval_cfg['llm'], dry_run=dry_run),
+        'judge_template': judge_template,
+        'scene_graphs': dsg_dataset if selections is not None else None,
+        'selections': selections,
+        'subgraph_reprs': {},
+    }
+
+
+def task_prompt(experiment, task) -> (str, dict):
+    """Prompt of a task and, with subgraph selection enabled, what was selected for it."""
+    config = experiment['config']
+    task_info = experiment['task_dataset'][task]
+    scene_id = task_info['scene_id']
+
+    selection = None
+    scene_repr = experiment['scene_reprs'][scene_id]
+    if experiment['selections'] is not None:
+        selection = experiment['selections'][task]
+        if selection['rooms'] is not None:
+            key = (scene_id, selection['rooms'])
+            if key not in experiment['subgraph_reprs']:
+                experiment['subgraph_reprs'][key] = serialize_subgraph(
+                    scene_id, experiment['scene_graphs'][scene_id], selection['rooms'], config['prompt']['serialization']
+                )
+            scene_repr = experiment['subgraph_reprs'][key]
+
+    return build_prompt(scene_repr, task_info['query'], config['prompt']), selection
+
+
+def query_model(client, prompt) -> dict:
+    client.throttle()
+    start = time.perf_counter()
+    with span('llm_query'):
+        pred_answer = client.query(prompt)
+    delay = 0 if client.dry_run else client.cfg['delay']
+    duration = time.perf_counter() - start - delay
+
+    return {
+        'answer': pred_answer,
+        'elapsed_time': duration,
+        'model': client.model_name,
+    }
+
+
+def add_selection(prediction, prompt, selection):
+    if selection is not None:
+        prediction.update(prompt_rooms=format_rooms(selection['rooms']), selection=selection['reason'], prompt_chars=len(prompt))
+    return prediction
+
+
+def answer_task(experiment, task):
+    """Answer a task with the first answer model of the experiment."""
+    with span('build_prompt'):
+        prompt, selection = task_prompt(experiment, task)
+    client = next(iter(experiment['llmclients'].values()))
+    return add_selection(query_model(client, prompt), prompt, selection)
+
+
+def answer_all_models(clients: dict, prompts: dict) -> dict:
+    """
+    Send every prompt to every model. Each model has its own pool of `concurrency` workers
+    and all models run at once, so the slowest model bounds the wall time.
+    - prompts: task -> (prompt, selection)
+    Returns model -> task -> prediction, tasks in the order of prompts.
+    """
+    pools = {
+        model: ThreadPoolExecutor(max_workers=max(1, client.cfg.get('concurrency', 1)), thread_name_prefix=model)
+        for model, client in clients.items()
+    }
+    answers = {model: {} for model in clients}
+    try:
+        futures = {
+            pools[model].submit(query_model, client, prompt): (model, task)
+            for task, (prompt, _) in prompts.items()
+            for model, client in clients.items()
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            model, task = futures[future]
+            answers[model][task] = future.result()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    return {
+        model: {task: add_selection(answers[model][task], prompt, selection) for task, (prompt, selection) in prompts.items()}
+        for model in clients
+    }
+
+
+def judge_task(experiment, task, prediction):
+    with span('evaluate_summary'):
+        return _judge_task(experiment, task, prediction)
+
+
+def _judge_task(experiment, task, prediction):
+    eval_cfg = experiment['config']['evaluation']
+    serialization_cfg = experiment['config']['prompt']['serialization']
+    ground_truth = experiment['task_dataset'][task]
+
+    eval_type = eval_cfg.get('eval_type', 'llm_judge')
+    if eval_type != 'llm_judge':
+        rows = reference_matching_summary({task: prediction}, {task: ground_truth}, eval_cfg, serialization_cfg, experiment['labels'])
+        row = rows.iloc[0].to_dict()
+        if eval_type == 'reference_matching' or row['eval_method'] != AMBIGUOUS:
+            return row
+
+    score = judge_answer(
+        experiment['evaluator'],
+        experiment['judge_template'],
+        ground_truth['query'],
+        ground_truth['answer'],
+        prediction['answer']
+    )
+    return result_row(task, ground_truth, prediction, serialization_cfg, score)
+
+
+def run_experiment(config):
+    return run_prepared_experiment(prepare_experiment(config))
+
+
+def run_prepared_experiment(experiment):
+    task_dataset = experiment['task_dataset']
+
+    # Prompts are built once and shared by every answer model
+    with span('build_prompt'):
+        prompts = {task: task_prompt(experiment, task) for task in task_dataset}
+    return evaluate_predictions(experiment, answer_all_models(experiment['llmclients'], prompts))
+
+
+def evaluate_predictions(experiment, predictions, evaluator=None):
+    """
+    Score model -> task -> prediction with the experiment's evaluator, or the given stand-in.
+    Only the tasks a model has a prediction for are scored.
+    """
+    config = experiment['config']
+    frames = []
+    for predicted_answers in predictions.values():
+        ground_truth_answers = {task: experiment['task_dataset'][task] for task in predicted_answers}
+        with span('evaluate_summary'):
+            frames.append(evaluate_summary(
+                predicted_answers, ground_truth_answers, config['evaluation'], config['prompt']['serialization'],
+                labels=experiment['labels'], evaluator=evaluator or experiment['evaluator']
+            ))
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_batched_experiments(experiments, batch_cfg):
+    """
+    Answer and judge the tasks of every (name, prepared experiment) through batch jobs, one per
+    model and stage, instead of one request at a time. Returns the results of every experiment
+    in the same form as run_prepared_experiment.
+    """
+    prompts, requests = {}, {}
+    for name, experiment in experiments:
+        with span('build_prompt'):
+            prompts[name] = {task: task_prompt(experiment, task) for task in experiment['task_dataset']}
+        for model, client in experiment['llmclients'].items():
+            requests.setdefault(model, []).extend(
+                batch_request(answer_id(name, task), client.cfg, prompt) for task, (prompt, _) in prompts[name].items()
+            )
+    with span('llm_query'):
+        replies = run_jobs('answer', requests, batch_cfg)
+
+    # Tasks whose answer request failed are left out of the results instead of being scored
+    predictions = [
+        {
+            model: {
+                task: add_selection({
+                    'answer': parse_reply(replies[model][answer_id(name, task)], client.cfg['mode']),
+                    # Batch replies carry no per-request latency
+                    'elapsed_time': None,
+                    'model': model,
+                }, prompt, selection)
+                for task, (prompt, selection) in prompts[name].items()
+                if replies.get(model, {}).get(answer_id(name, task)) is not None
+            }
+            for model, client in experiment['llmclients'].items()
+        }
+        for name, experiment in experiments
+    ]
+
+    return batch_judge(
+        lambda i, evaluator: evaluate_predictions(experiments[i][1], predictions[i], evaluator),
+        [experiment['config']['evaluation']['llm'] for _, experiment in experiments],
+        batch_cfg
+    )
+
+
+def prompt_digest(experiment) -> str:
+    """Hash of every prompt an experiment sends, together with the settings that answer and score them."""
+    config = experiment['config']
+    task_dataset = experiment['task_dataset']
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        [{k: v for k, v in config['llm'].items() if k != 'delay'}, config['evaluation']],
+        sort_keys=True, default=str
+    ).encode('utf-8'))
+    for task in sorted(task_dataset):
+        prompt, _ = task_prompt(experiment, task)
+        digest.update(task.encode('utf-8') + b'\0' + prompt.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+def prepare_unique_experiments(named_configs):
+    """
+    Prepare one experiment per distinct execution. Configs with the same canonical form are
+    grouped before serializing, the rest after, if they turn out to send byte-identical prompts.
+    Returns a list of (prepared experiment, [(name, config), ...]) in first-seen order.
+    """
+    unique = {}
+    for group in group_equivalent(named_configs):
+        experiment = prepare_experiment(group[0][1])
+        digest = prompt_digest(experiment)
+        if digest in unique:
+            unique[digest][1].extend(group)
+        else:
+            unique[digest] = (experiment, list(group))
+
+    for experiment, group in unique.values():
+        names = [name for name, _ in group]
+        aliases = f" (also {', '.join(names[1:])})" if len(names) > 1 else ""
+        print(f"EXPERIMENT: {names[0]}{aliases}")
+    return list(unique.values())
+
+
+def fan_out(results_df, group):
+    """Copy the results of one execution to every experiment label it stands for."""
+    frames = []
+    for name, config in group:
+        serialization_cfg = config['prompt']['serialization']
+        rows = results_df.copy()
+        rows['experiment'] = name
+        rows['executed_as'] = group[0][0]
+        rows['serialization'] = '-'.join(serialization_cfg['type'])
+        rows['num_attributes'] = num_attributes(serialization_cfg['detail_keys'])
+        frames.append(rows)
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_adaptive_sweep(base_config, experiments_config):
+    unique = prepare_unique_experiments(expand_experiments(base_config, experiments_config))
+
+    # Every answer model of an experiment is a separate arm, named "experiment[model]" when there are several
+    arms, arm_experiments = {}, {}
+    for experiment, group in unique:
+        clients = experiment['llmclients']
+        for model, client in clients.items():
+            arm = group[0][0] if len(clients) == 1 else f"{group[0][0]}[{model}]"
+            arms[arm] = dict(experiment, llmclients={model: client})
+            arm_experiments[arm] = group[0][0]
+
+    results_df, decision, interval_history = run_adaptive(
+        arms,
+        answer_task,
+        judge_task,
+        experiments_config['adaptive'],
+        seed=base_config['run']['seed']
+    )
+
+    if not results_df.empty:
+        results_df['experiment'] = results_df['experiment'].map(arm_experiments)
+    decision['equivalent_experiments'] = {
+        group[0][0]: [name for name, _ in group[1:]] for _, group in unique if len(group) > 1
+    }
+    experiments_df = pd.concat(
+        [fan_out(results_df[results_df['experiment'] == group[0][0]], group) for _, group in unique],
+        ignore_index=True
+    )
+    return experiments_df, decision, interval_history
+
+
+def run_sweep(base_config, experiments_config, shard=None):
+    """
+    Run every distinct experiment of a sweep. With shard=(i, N) only the (experiment, task)
+    work items hashed to shard i are run; the work items of the whole sweep and of this shard
+    are then listed in the attrs of the returned frame.
+    """
+    experiments_df = pd.DataFrame()
+    all_items, shard_items = [], []
+    selected = []
+    for experiment, group in prepare_unique_experiments(expand_experiments(base_config, experiments_config)):
+        executed = group[0][0]
+        tasks = list(experiment['task_dataset'])
+        all_items += [(name, task) for name, _ in group for task in tasks]
+        if shard is not None:
+            # Items are assigned by the executed experiment so equivalent configs stay together
+            tasks = [task for task in tasks if shard_of(executed, task, shard[1]) == shard[0]]
+            experiment['task_dataset'] = {task: experiment['task_dataset'][task] for task in tasks}
+            shard_items += [(name, task) for name, _ in group for task in tasks]
+            if not tasks:
+                continue
+        selected.append((experiment, group))
+
+    batch_cfg = base_config.get('batch') or {}
+    if batch_cfg.get('enabled', False) and not base_config['run'].get('dry_run', False):
+        print(f"RUNNING: {', '.join(group[0][0] for _, group in selected)} as batch jobs")
+        results = run_batched_experiments([(group[0][0], experiment) for experiment, group in selected], batch_cfg)
+    else:
+        results = []
+        for experiment, group in selected:
+            print(f"RUNNING: {group[0][0]}")
+            results.append(run_prepared_experiment(experiment))
+
+    for results_df, (_, group) in zip(results, selected):
+        experiments_df = pd.concat([experiments_df, fan_out(results_df, group)], ignore_index=True)
+
+    if shard is not None:
+        experiments_df.attrs.update(all_items=all_items, shard_items=shard_items)
+    return experiments_df
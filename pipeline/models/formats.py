@@ -0,0 +1,7 @@
+# Names of the serialization types and of the object attributes they can encode, kept free of
+# spark_dsg and numpy so configs can be checked without loading the serializers
+
+SERIALIZATION_TYPES = ('indented', 'json', 'triplets', 'natural', 'spatial', 'compact')
+
+# Object attributes with a sanitization function, the ones json serialization can encode
+DETAIL_KEYS = ('bounding_box', 'position', 'world_R_object')
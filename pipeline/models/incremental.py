@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import spark_dsg as dsg
+
+from .serialization import room_serializers
+from .utils import get_object_labelspace
+
+# Bump whenever a serializer's output changes so cached fragments are rebuilt
+FRAGMENT_CACHE_VERSION = 2
+
+
+def room_fingerprints(scene_graph: dsg.DynamicSceneGraph, detail_keys: List[str]) -> Dict[str, str]:
+    """
+    Hash of everything a room's fragment is built from: its neighbor rooms, its places and
+    the ids, labels, positions and requested attributes of its objects, in iteration order.
+    """
+    attribute_keys = [key for key in dict.fromkeys(['position'] + list(detail_keys)) if key != 'NA']
+
+    fingerprints = {}
+    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
+        digest = hashlib.sha256(f"{room.id.value}|{list(room.siblings())}".encode('utf-8'))
+        for place_id in room.children():
+            digest.update(f"|P{place_id}".encode('utf-8'))
+            for object_id in scene_graph.get_node(place_id).children():
+                if dsg.NodeSymbol(object_id).category != 'O':
+                    continue
+                attributes = scene_graph.get_node(object_id).attributes
+                values = [str(getattr(attributes, key, 'N/A')) for key in attribute_keys]
+                digest.update(f"|O{object_id}:{attributes.semantic_label}:{values}".encode('utf-8'))
+        fingerprints[str(room.id.value)] = digest.hexdigest()
+    return fingerprints
+
+
+def _scene_key(scene_graph: dsg.DynamicSceneGraph, serialize_type: str, detail_keys: List[str]) -> str:
+    # Settings shared by all rooms; if any of these changes no fragment can be reused
+    labelspace = get_object_labelspace(scene_graph)
+    return json.dumps([FRAGMENT_CACHE_VERSION, serialize_type, list(detail_keys), list(labelspace.names_to_labels.items())])
+
+
+def fragment_cache_path(cache_dir, scene_name: str, serialize_type: str, detail_keys: List[str]) -> Path:
+    keys_hash = hashlib.sha256(json.dumps(list(detail_keys)).encode('utf-8')).hexdigest()[:12]
+    return Path(cache_dir) / Path(scene_name).stem / f"{serialize_type}_{keys_hash}.json"
+
+
+def _write_atomic(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def serialize_incremental(
+    scene_name: str,
+    scene_graph: dsg.DynamicSceneGraph,
+    serialize_type: str,
+    detail_keys: List[str],
+    cache_dir,
+    fingerprints: Dict[str, str] = None
+) -> (str, int, int):
+    """
+    Serialize a scene, reusing the cached fragments of rooms whose fingerprint is unchanged
+    since the scene was last serialized under the same name.
+    Returns the serialization, the number of rooms serialized again and the number of rooms.
+    """
+    room_fn, assemble_fn = room_serializers[serialize_type]
+    path = fragment_cache_path(cache_dir, scene_name, serialize_type, detail_keys)
+    scene_key = _scene_key(scene_graph, serialize_type, detail_keys)
+    fingerprints = fingerprints or room_fingerprints(scene_graph, detail_keys)
+
+    cached_rooms = {}
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('scene_key') == scene_key:
+                cached_rooms = cached['rooms']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    rooms = {}
+    fragments = []
+    changed = 0
+    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
+        room_key = str(room.id.value)
+        entry = cached_rooms.get(room_key)
+        if entry is None or entry['fingerprint'] != fingerprints[room_key]:
+            entry = {'fingerprint': fingerprints[room_key], 'fragment': room_fn(scene_graph, room, detail_keys)}
+            changed += 1
+        rooms[room_key] = entry
+        fragments.append(entry['fragment'])
+
+    if changed or rooms.keys() != cached_rooms.keys():
+        _write_atomic(path, {'scene_key': scene_key, 'rooms': rooms})
+
+    return assemble_fn(scene_graph, fragments, detail_keys), changed, len(rooms)
@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import spark_dsg as dsg
+
+from .formats import DETAIL_KEYS
+
+# Bump whenever the array layout below changes so stale caches are rebuilt
+CACHE_VERSION = 1
+
+# Every detail key the serializers can sanitize is cached, position as floats and the others as
+# the string spark_dsg prints for them. Any other attribute is read from the JSON scene.
+STRING_ATTRIBUTES = [key for key in DETAIL_KEYS if key != 'position']
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ragged(lists: List[list], dtype) -> (np.ndarray, np.ndarray):
+    # Flatten a list of lists into values + offsets (CSR layout)
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    values = np.array([v for values in lists for v in values], dtype=dtype)
+    return values, offsets
+
+
+class StringTable:
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, value: str) -> int:
+        if value not in self.index:
+            self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return self.index[value]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        encoded = [s.encode('utf-8') for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(s) for s in encoded])
+        return {
+            'strings_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'strings_offsets': offsets,
+        }
+
+
+def extract_arrays(scene_graph: dsg.DynamicSceneGraph) -> Dict[str, np.ndarray]:
+    """Extract the rooms, places, objects, labels and room edges the serializers read."""
+    strings = StringTable()
+
+    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
+    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
+    # The serializers iterate names_to_labels, so keep its order
+    labels = [(label, name) for name, label in labelspace.names_to_labels.items()]
+
+    rooms = list(scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes)
+    room_children = [list(room.children()) for room in rooms]
+    room_siblings = [list(room.siblings()) for room in rooms]
+
+    place_ids = list(dict.fromkeys(place_id for children in room_children for place_id in children))
+    place_children = [
+        [child for child in scene_graph.get_node(place_id).children() if dsg.NodeSymbol(child).category == 'O']
+        for place_id in place_ids
+    ]
+
+    object_ids = list(dict.fromkeys(object_id for children in place_children for object_id in children))
+    object_nodes = [scene_graph.get_node(object_id) for object_id in object_ids]
+
+    arrays = {
+        'layer_key': np.array([key.layer, key.partition], dtype=np.int64),
+        'label_ids': np.array([label for label, _ in labels], dtype=np.int64),
+        'label_names': np.array([strings.add(name) for _, name in labels], dtype=np.int64),
+        'room_ids': np.array([room.id.value for room in rooms], dtype=np.uint64),
+        'place_ids': np.array(place_ids, dtype=np.uint64),
+        'object_ids': np.array(object_ids, dtype=np.uint64),
+        'object_labels': np.array([node.attributes.semantic_label for node in object_nodes], dtype=np.int64),
+        'object_positions': np.array([node.attributes.position for node in object_nodes], dtype=np.float64).reshape(-1, 3),
+        'room_edges': np.array(
+            [(edge.source, edge.target) for edge in scene_graph.get_layer(dsg.DsgLayers.ROOMS).edges],
+            dtype=np.uint64
+        ).reshape(-1, 2),
+    }
+    arrays['room_children'], arrays['room_child_offsets'] = _ragged(room_children, np.uint64)
+    arrays['room_siblings'], arrays['room_sibling_offsets'] = _ragged(room_siblings, np.uint64)
+    arrays['place_children'], arrays['place_child_offsets'] = _ragged(place_children, np.uint64)
+    for attribute in STRING_ATTRIBUTES:
+        arrays[f'object_{attribute}'] = np.array(
+            [strings.add(str(getattr(node.attributes, attribute, 'N/A'))) for node in object_nodes],
+            dtype=np.int64
+        )
+
+    arrays.update(strings.to_arrays())
+    return arrays
+
+
+def save_arrays(arrays: Dict[str, np.ndarray], cache_path: Path, source_hash: str):
+    # Write into a temporary directory first so concurrent workers never see a partial cache
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=cache_path.parent))
+    for name, array in arrays.items():
+        np.save(tmp_path / f'{name}.npy', array)
+    with open(tmp_path / 'meta.json', 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'source_hash': source_hash}, f)
+
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Another worker finished the same cache first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_arrays(cache_path: Path) -> Dict[str, np.ndarray]:
+    # Memory mapped, so worker processes reading the same cache share its pages
+    return {
+        file.stem: np.load(file, mmap_mode='r')
+        for file in cache_path.glob('*.npy')
+    }
+
+
+def cache_path_for(scene_file, cache_dir) -> (Path, str):
+    source_hash = file_hash(scene_file)
+    return Path(cache_dir) / f'v{CACHE_VERSION}_{source_hash}', source_hash
+
+
+def load_cached_scene(scene_file, cache_dir):
+    """Load a scene through the binary cache, converting the JSON scene on a miss."""
+    cache_path, source_hash = cache_path_for(scene_file, cache_dir)
+    if (cache_path / 'meta.json').exists():
+        return CachedSceneGraph(load_arrays(cache_path), scene_file)
+
+    scene_graph = dsg.DynamicSceneGraph.load(str(scene_file))
+    save_arrays(extract_arrays(scene_graph), cache_path, source_hash)
+    return scene_graph
+
+
+class CachedAttribute:
+    """Stands in for a spark_dsg attribute object, formatting exactly as the original did."""
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    __repr__ = __str__
+
+    def __format__(self, format_spec):
+        return format(self.text, format_spec)
+
+
+class CachedAttributes:
+    def __init__(self, scene, node_id: int, index: int):
+        self._scene = scene
+        self._node_id = node_id
+        self.semantic_label = int(scene.arrays['object_labels'][index])
+        self.position = np.array(scene.arrays['object_positions'][index])
+        for attribute in STRING_ATTRIBUTES:
+            setattr(self, attribute, CachedAttribute(scene.string(scene.arrays[f'object_{attribute}'][index])))
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not cached
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._scene.source_graph().get_node(self._node_id).attributes, name)
+
+
+class CachedNode:
+    def __init__(self, node_id: int, children=(), siblings=(), attributes=None):
+        self.id = dsg.NodeSymbol(node_id)
+        self._children = children
+        self._siblings = siblings
+        self.attributes = attributes
+
+    def children(self):
+        return [int(child) for child in self._children]
+
+    def siblings(self):
+        return [int(sibling) for sibling in self._siblings]
+
+
+class CachedEdge:
+    def __init__(self, source: int, target: int):
+        self.source = source
+        self.target = target
+
+
+class CachedLayer:
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+
+
+class CachedLabelspace:
+    def __init__(self, names_to_labels: Dict[str, int]):
+        self.names_to_labels = names_to_labels
+        self.labels_to_names = {label: name for name, label in names_to_labels.items()}
+
+
+class CachedSceneGraph:
+    """
+    Read-only view over a cached scene that implements the subset of the
+    DynamicSceneGraph interface used by the serializers. Object attributes that
+    are not cached are read from the JSON scene, which is only loaded if one is used.
+    """
+    def __init__(self, arrays: Dict[str, np.ndarray], scene_file=None):
+        self.arrays = arrays
+        self.scene_file = scene_file
+        self._source_graph = None
+        layer, partition = (int(v) for v in arrays['layer_key'])
+        self.layer_key = dsg.LayerKey(layer, partition)
+        self.labelspace = CachedLabelspace({
+            self.string(name): int(label)
+            for label, name in zip(arrays['label_ids'], arrays['label_names'])
+        })
+
+        self.rooms = {}
+        for i, room_id in enumerate(arrays['room_ids']):
+            self.rooms[int(room_id)] = CachedNode(
+                int(room_id),
+                children=self._slice('room_children', 'room_child_offsets', i),
+                siblings=self._slice('room_siblings', 'room_sibling_offsets', i)
+            )
+        self.places = {
+            int(place_id): CachedNode(int(place_id), children=self._slice('place_children', 'place_child_offsets', i))
+            for i, place_id in enumerate(arrays['place_ids'])
+        }
+        self.object_index = {int(object_id): i for i, object_id in enumerate(arrays['object_ids'])}
+        self.objects = {}
+
+    def _slice(self, values: str, offsets: str, i: int) -> np.ndarray:
+        start, end = self.arrays[offsets][i], self.arrays[offsets][i + 1]
+        return self.arrays[values][start:end]
+
+    def source_graph(self) -> dsg.DynamicSceneGraph:
+        if self._source_graph is None:
+            if self.scene_file is None:
+                raise ValueError("Attribute is not in the scene cache and the cached scene has no source file")
+            print(f"[INFO] Loading {self.scene_file} for object attributes that are not in the scene cache")
+            self._source_graph = dsg.DynamicSceneGraph.load(str(self.scene_file))
+        return self._source_graph
+
+    def string(self, index: int) -> str:
+        offsets = self.arrays['strings_offsets']
+        return bytes(self.arrays['strings_data'][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def get_layer_key(self, layer):
+        return self.layer_key
+
+    def get_labelspace(self, layer, partition=0):
+        return self.labelspace
+
+    def get_layer(self, layer):
+        if layer != dsg.DsgLayers.ROOMS:
+            raise ValueError(f"Only the {dsg.DsgLayers.ROOMS} layer is cached, not {layer}")
+        return CachedLayer(
+            list(self.rooms.values()),
+            [CachedEdge(int(source), int(target)) for source, target in self.arrays['room_edges']]
+        )
+
+    def get_node(self, node_id):
+        node_id = int(node_id)
+        if node_id in self.rooms:
+            return self.rooms[node_id]
+        if node_id in self.places:
+            return self.places[node_id]
+        if node_id not in self.objects:
+            self.objects[node_id] = CachedNode(node_id, attributes=CachedAttributes(self, node_id, self.object_index[node_id]))
+        return self.objects[node_id]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert JSON scene graphs into the binary scene cache")
+    parser.add_argument('--scene_dir', type=str, default='data/scenes/scene_graphs', help="Directory with the JSON scene graphs")
+    parser.add_argument('--cache_dir', type=str, default='data/scenes/cache', help="Directory to write the cache to")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    for scene_file in sorted(Path(args.scene_dir).glob("*.json")):
+        cache_path, source_hash = cache_path_for(scene_file, args.cache_dir)
+        if not (cache_path / 'meta.json').exists():
+            save_arrays(extract_arrays(dsg.DynamicSceneGraph.load(str(scene_file))), cache_path, source_hash)
+        print(f"[INFO] {scene_file.name} -> {cache_path}")
@@ -0,0 +1,100 @@
+from typing import Dict, Iterable, Optional, Set
+
+import spark_dsg as dsg
+
+from .scene_cache import CachedLayer
+from .utils import get_object_counts_in_room, get_object_labelspace
+
+
+class SceneIndex:
+    """Room ids, the rooms every object label appears in and room adjacency of one scene."""
+    def __init__(self, scene_graph: dsg.DynamicSceneGraph):
+        labelspace = get_object_labelspace(scene_graph)
+        rooms_layer = scene_graph.get_layer(dsg.DsgLayers.ROOMS)
+
+        # Rooms are named by their category id in prompts and questions ("room 3")
+        self.rooms = {room.id.category_id: room.id.value for room in rooms_layer.nodes}
+        self.adjacency = {room_id: set() for room_id in self.rooms}
+        self.label_rooms = {}
+        for room in rooms_layer.nodes:
+            room_id = room.id.category_id
+            for sibling in room.siblings():
+                self.adjacency[room_id].add(dsg.NodeSymbol(sibling).category_id)
+            for label, count in get_object_counts_in_room(scene_graph, room, labelspace).items():
+                if count:
+                    self.label_rooms.setdefault(label, set()).add(room_id)
+
+        for edge in rooms_layer.edges:
+            source, target = dsg.NodeSymbol(edge.source).category_id, dsg.NodeSymbol(edge.target).category_id
+            self.adjacency.setdefault(source, set()).add(target)
+            self.adjacency.setdefault(target, set()).add(source)
+
+    def k_hop(self, room_ids: Iterable[int], hops: int) -> Set[int]:
+        selected = set(room_ids)
+        frontier = set(selected)
+        for _ in range(hops):
+            frontier = {neighbor for room_id in frontier for neighbor in self.adjacency.get(room_id, ())} - selected
+            selected |= frontier
+        return selected
+
+    def rooms_with_labels(self, labels: Iterable[str]) -> Set[int]:
+        return {room_id for label in labels for room_id in self.label_rooms.get(label, ())}
+
+
+def select_rooms(
+    index: SceneIndex,
+    room_ids: Iterable[int],
+    labels: Iterable[str],
+    hops: int = 1,
+    compares: bool = False
+) -> (Optional[Set[int]], str):
+    """
+    Pick the rooms a question is about: the rooms it names and their neighbors up to hops away,
+    otherwise the rooms containing the object labels it mentions. Questions that compare rooms or
+    ask about missing objects (compares) can be answered by rooms without the label, so labels
+    don't narrow them down.
+    Returns None (serialize the full scene) with the reason when nothing narrower applies.
+    """
+    room_ids, labels = set(room_ids), set(labels)
+    if room_ids:
+        if not room_ids <= index.rooms.keys():
+            return None, 'unknown room'
+        selected, reason = index.k_hop(room_ids, hops), 'rooms'
+    elif labels:
+        if compares:
+            return None, 'negative or comparative'
+        selected, reason = index.rooms_with_labels(labels), 'labels'
+        if not selected:
+            return None, 'label not in scene'
+    else:
+        return None, 'no rooms or labels'
+
+    if len(selected) == len(index.rooms):
+        return None, 'all rooms'
+    return selected, reason
+
+
+class SubgraphView:
+    """
+    A scene graph restricted to some of its rooms: the room layer only holds the selected
+    rooms and the edges touching them, everything else is read from the full scene.
+    """
+    def __init__(self, scene_graph: dsg.DynamicSceneGraph, room_ids: Set[int]):
+        self.scene_graph = scene_graph
+        rooms_layer = scene_graph.get_layer(dsg.DsgLayers.ROOMS)
+        nodes = [room for room in rooms_layer.nodes if room.id.category_id in room_ids]
+        kept = {room.id.value for room in nodes}
+        edges = [edge for edge in rooms_layer.edges if edge.source in kept or edge.target in kept]
+        self.rooms_layer = CachedLayer(nodes, edges)
+
+    def get_layer(self, layer):
+        if layer == dsg.DsgLayers.ROOMS:
+            return self.rooms_layer
+        return self.scene_graph.get_layer(layer)
+
+    def __getattr__(self, name):
+        return getattr(self.scene_graph, name)
+
+
+def build_scene_indices(scene_graphs: Dict[str, dsg.DynamicSceneGraph]) -> Dict[str, SceneIndex]:
+    return {name: SceneIndex(scene_graph) for name, scene_graph in scene_graphs.items()}
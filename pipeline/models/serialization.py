@@ -1,130 +1,135 @@
 import spark_dsg as dsg
 from typing import List, Dict
 import json
-from .utils import get_object_counts_per_room, sanitization_function, get_objects_in_room
+import numpy as np
+from .formats import SERIALIZATION_TYPES
+from .utils import get_object_counts_in_room, get_object_labelspace, sanitization_function, get_objects_in_room
+from .spatial_index import get_room_relations, SPATIAL_K, SPATIAL_RADIUS, MAX_NEAR_OBJECTS
 
+# Every serialization is split into a fragment per room and an assembly step that adds what
+# spans rooms (headers, room layer edges), so fragments of unchanged rooms can be reused
+# when a new version of a scene is serialized (see models/incremental.py)
 
 
-def indented_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
-    encoding = ''
-    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
-    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
-    
-    room_object_counts = get_object_counts_per_room(scene_graph)    
-    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
-        encoding += f'Room (id = {room.id.category_id}) \n'
-        object_counts = room_object_counts[room.id]
-        encoding += '\tRoom Object Summary:\n'
-        for obj in object_counts:
-            if object_counts[obj] == 0:
-                continue
-            encoding += (
-                f'\t\t- {object_counts[obj]} {obj}s\n'
-                if object_counts[obj] > 1
-                else f'\t\t- {object_counts[obj]} {obj}\n'
-            )
-
-        if "NA" not in detail_keys:
-            encoding += '\tRoom Object Attributes:\n'
-            for place_id in room.children():
-                place = scene_graph.get_node(place_id)
-                
-                for object_id in place.children():
-                    if dsg.NodeSymbol(object_id).category != 'O':
-                        continue
-
-                    object_node = scene_graph.get_node(object_id)
-                    
-                    props = ", ".join(
-                        f"{key}={getattr(object_node.attributes, key, 'N/A')}"
-                        for key in detail_keys
-                    )
-                    encoding += f'\t\t- {labelspace.labels_to_names[object_node.attributes.semantic_label]} (id = {object_node.id.category_id}, {props}) \n'
-    
+def indented_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> str:
+    labelspace = get_object_labelspace(scene_graph)
+
+    encoding = f'Room (id = {room.id.category_id}) \n'
+    object_counts = get_object_counts_in_room(scene_graph, room, labelspace)
+    encoding += '\tRoom Object Summary:\n'
+    for obj in object_counts:
+        if object_counts[obj] == 0:
+            continue
+        encoding += (
+            f'\t\t- {object_counts[obj]} {obj}s\n'
+            if object_counts[obj] > 1
+            else f'\t\t- {object_counts[obj]} {obj}\n'
+        )
+
+    if "NA" not in detail_keys:
+        encoding += '\tRoom Object Attributes:\n'
+        for place_id in room.children():
+            place = scene_graph.get_node(place_id)
+
+            for object_id in place.children():
+                if dsg.NodeSymbol(object_id).category != 'O':
+                    continue
+
+                object_node = scene_graph.get_node(object_id)
+
+                props = ", ".join(
+                    f"{key}={getattr(object_node.attributes, key, 'N/A')}"
+                    for key in detail_keys
+                )
+                encoding += f'\t\t- {labelspace.labels_to_names[object_node.attributes.semantic_label]} (id = {object_node.id.category_id}, {props}) \n'
+    return encoding
+
+
+def indented_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[str], detail_keys: List [str]) -> str:
+    encoding = ''.join(room_fragments)
     encoding += "Edges (Room layer):\n"
     for edge in scene_graph.get_layer(dsg.DsgLayers.ROOMS).edges:
         encoding += f'\t - Room(id={dsg.NodeSymbol(edge.source).category_id}) <----> Room(id={dsg.NodeSymbol(edge.target).category_id})\n'
 
     return encoding
 
-def json_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
-    encoding = {"rooms": []}
-    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
-    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
-    
-    room_object_counts = get_object_counts_per_room(scene_graph)    
-    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
-        room_encoding = {
-            'id': room.id.category_id,
-            'neighbor_rooms': [scene_graph.get_node(neighbor_id).id.category_id for neighbor_id in room.siblings()],
-            'objects': {
-                'count summary': {
-                    k: v for k, v in room_object_counts[room.id].items() if v != 0
-                }
+
+def json_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> dict:
+    labelspace = get_object_labelspace(scene_graph)
+
+    room_encoding = {
+        'id': room.id.category_id,
+        'neighbor_rooms': [scene_graph.get_node(neighbor_id).id.category_id for neighbor_id in room.siblings()],
+        'objects': {
+            'count summary': {
+                k: v for k, v in get_object_counts_in_room(scene_graph, room, labelspace).items() if v != 0
             }
         }
-        
-        if 'NA' not in detail_keys: 
-            object_details = {}
-            for place_id in room.children():
-                place = scene_graph.get_node(place_id)
-                
-                for object_id in place.children():
-                    if dsg.NodeSymbol(object_id).category != 'O':
-                        continue
-
-                    object_node = scene_graph.get_node(object_id)
-                    
-                    object_key = labelspace.labels_to_names[object_node.attributes.semantic_label]
-                    if object_key not in object_details: object_details[object_key] = {}
-                    
-                    object_details[object_key][f"id: {object_node.id.category_id}"] = {
-                        k: v
-                        for key in detail_keys
-                        for k, v in sanitization_function[key](f"{key}={getattr(object_node.attributes, key, 'N/A')}").items()
-                    }
-                    
-                    
-            room_encoding["objects"]['attributes'] = object_details
-            
-        encoding["rooms"].append(room_encoding)
-
-    
-    return json.dumps(encoding, indent=2)
+    }
 
+    if 'NA' not in detail_keys:
+        object_details = {}
+        for place_id in room.children():
+            place = scene_graph.get_node(place_id)
+
+            for object_id in place.children():
+                if dsg.NodeSymbol(object_id).category != 'O':
+                    continue
+
+                object_node = scene_graph.get_node(object_id)
+
+                object_key = labelspace.labels_to_names[object_node.attributes.semantic_label]
+                if object_key not in object_details: object_details[object_key] = {}
+
+                object_details[object_key][f"id: {object_node.id.category_id}"] = {
+                    k: v
+                    for key in detail_keys
+                    for k, v in sanitization_function[key](f"{key}={getattr(object_node.attributes, key, 'N/A')}").items()
+                }
+
+        room_encoding["objects"]['attributes'] = object_details
+
+    return room_encoding
+
+
+def json_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[dict], detail_keys: List [str]) -> str:
+    return json.dumps({"rooms": list(room_fragments)}, indent=2)
+
+
+def triplets_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> str:
+    labelspace = get_object_labelspace(scene_graph)
 
-def triplets_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
     encoding = ''
-    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
-    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
-    
-    room_object_counts = get_object_counts_per_room(scene_graph)    
-    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
-        room_id = f"Room [id = {room.id.category_id}]"
-        for obj in room_object_counts:
-            if room_object_counts[obj] == 0:
-                continue
-            encoding += f" \t ({room_id}, has, {obj} [count = {room_object_counts[obj]}]) \t | "
-
-        if 'NA' not in detail_keys:
-            for place_id in room.children():
-                place = scene_graph.get_node(place_id)
-                
-                for object_id in place.children():
-                    if dsg.NodeSymbol(object_id).category != 'O':
-                        continue
-
-                    object_node = scene_graph.get_node(object_id)
-                    object_category = labelspace.labels_to_names[object_node.attributes.semantic_label]
-
-                    object_id = f"{object_category} [room_id = {room.id.category_id} object_id = {object_node.id.category_id}]"
-                    props = ", ".join(
-                        f"{key}={getattr(object_node.attributes, key, 'N/A')}"
-                        for key in detail_keys
-                    )
-                    attributes_id = f"Attributes [{props}]"
-                    encoding += f" \t ({object_id}, has, {attributes_id}) \t |"
+    room_id = f"Room [id = {room.id.category_id}]"
+    object_counts = get_object_counts_in_room(scene_graph, room, labelspace)
+    for obj in object_counts:
+        if object_counts[obj] == 0:
+            continue
+        encoding += f" \t ({room_id}, has, {obj} [count = {object_counts[obj]}]) \t | "
+
+    if 'NA' not in detail_keys:
+        for place_id in room.children():
+            place = scene_graph.get_node(place_id)
+
+            for object_id in place.children():
+                if dsg.NodeSymbol(object_id).category != 'O':
+                    continue
+
+                object_node = scene_graph.get_node(object_id)
+                object_category = labelspace.labels_to_names[object_node.attributes.semantic_label]
 
+                object_id = f"{object_category} [room_id = {room.id.category_id} object_id = {object_node.id.category_id}]"
+                props = ", ".join(
+                    f"{key}={getattr(object_node.attributes, key, 'N/A')}"
+                    for key in detail_keys
+                )
+                attributes_id = f"Attributes [{props}]"
+                encoding += f" \t ({object_id}, has, {attributes_id}) \t |"
+    return encoding
+
+
+def triplets_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[str], detail_keys: List [str]) -> str:
+    encoding = ''.join(room_fragments)
     for edge in scene_graph.get_layer(dsg.DsgLayers.ROOMS).edges:
         src_room_id = f"Room [id = {dsg.NodeSymbol(edge.source).category_id}]"
         target_room_id = f"Room [id = {dsg.NodeSymbol(edge.target).category_id}]"
@@ -132,75 +137,223 @@ def triplets_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str
 
     return encoding
 
-def natural_lang_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
-    encoding = '~~~~~~~~~~ ROOM DESCRIPTIONS ~~~~~~~~~~\n'
-    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
-    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
-    
-    room_object_counts = get_object_counts_per_room(scene_graph)  
-    
-    def generate_room_descriptor(room):
-        
-        def summarize_objects(obj_counts):
-            nonzero_items = [f"{v} of {k}" for k, v in obj_counts.items() if v > 0]
-            if not nonzero_items:
-                return "Inside this room there are no objects."
-            if len(nonzero_items) == 1:
-                return f"Inside this room there is {nonzero_items[0]}."
-            return f"Inside this room there are {', '.join(nonzero_items[:-1])}, and {nonzero_items[-1]}. \n"
-
-        def describe_objects(obj_nodes, detail_keys):
-            descriptions = []
-
-            for obj_node in obj_nodes:
-                # Collect and format attributes
-                obj_name = labelspace.labels_to_names[obj_node.attributes.semantic_label]
-                attributes = {
-                    key: getattr(obj_node.attributes, key, "N/A")
-                    for key in detail_keys
-                }
-                attr_descriptions = [f"{k} is {v}" for k, v in attributes.items() if v != "N/A"]
-                attr_sentence = ", ".join(attr_descriptions[:-1])
-                if attr_descriptions:
-                    attr_sentence += f", and {attr_descriptions[-1]}" if len(attr_descriptions) > 1 else attr_descriptions[0]
-                else:
-                    attr_sentence = "No attributes available"
-
-                paragraph = f"The {obj_name} has the following attributes: {attr_sentence}."
-                descriptions.append(paragraph)
-
-            return "\n".join(descriptions)
-
-        intro = f'\n\nROOM {room.id.category_id} SUMMARY: \n'
-        object_summary_descriptor = summarize_objects(room_object_counts[room.id])
-        
-        room_objects_nodes = get_objects_in_room(scene_graph, room)
-        object_attribute_descriptor = ""
-        if 'NA' not in detail_keys: object_attribute_descriptor = describe_objects(room_objects_nodes, detail_keys)
-        
-        return f"{intro}{object_summary_descriptor}\n{object_attribute_descriptor}"
-    
+
+def _summarize_objects(obj_counts):
+    nonzero_items = [f"{v} of {k}" for k, v in obj_counts.items() if v > 0]
+    if not nonzero_items:
+        return "Inside this room there are no objects."
+    if len(nonzero_items) == 1:
+        return f"Inside this room there is {nonzero_items[0]}."
+    return f"Inside this room there are {', '.join(nonzero_items[:-1])}, and {nonzero_items[-1]}. \n"
+
+
+def _describe_objects(labelspace, obj_nodes, detail_keys):
+    descriptions = []
+
+    for obj_node in obj_nodes:
+        # Collect and format attributes
+        obj_name = labelspace.labels_to_names[obj_node.attributes.semantic_label]
+        attributes = {
+            key: getattr(obj_node.attributes, key, "N/A")
+            for key in detail_keys
+        }
+        # Positions are arrays, only the missing marker is a string
+        attr_descriptions = [f"{k} is {v}" for k, v in attributes.items() if not (isinstance(v, str) and v == "N/A")]
+        attr_sentence = ", ".join(attr_descriptions[:-1])
+        if attr_descriptions:
+            attr_sentence += f", and {attr_descriptions[-1]}" if len(attr_descriptions) > 1 else attr_descriptions[0]
+        else:
+            attr_sentence = "No attributes available"
+
+        paragraph = f"The {obj_name} has the following attributes: {attr_sentence}."
+        descriptions.append(paragraph)
+
+    return "\n".join(descriptions)
+
+
+def natural_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> str:
+    labelspace = get_object_labelspace(scene_graph)
+
+    intro = f'\n\nROOM {room.id.category_id} SUMMARY: \n'
+    object_summary_descriptor = _summarize_objects(get_object_counts_in_room(scene_graph, room, labelspace))
+
+    room_objects_nodes = get_objects_in_room(scene_graph, room)
+    object_attribute_descriptor = ""
+    if 'NA' not in detail_keys: object_attribute_descriptor = _describe_objects(labelspace, room_objects_nodes, detail_keys)
+
+    return f"{intro}{object_summary_descriptor}\n{object_attribute_descriptor}"
+
+
+def natural_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[str], detail_keys: List [str]) -> str:
     def generate_edge_descriptor(edge):
         src_room_id = dsg.NodeSymbol(edge.source).category_id
         target_room_id = dsg.NodeSymbol(edge.target).category_id
         return f"Room {src_room_id} is connected to {target_room_id}. "
-        
-    
-    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
-        encoding += generate_room_descriptor(room)
+
+    encoding = '~~~~~~~~~~ ROOM DESCRIPTIONS ~~~~~~~~~~\n'
+    encoding += ''.join(room_fragments)
 
     encoding += '\n\n~~~~~~~~~~ ROOM LAYOUT SUMMARY ~~~~~~~~~~\n'
     encoding += 'Additionally several rooms are connected to each other as follows:\n'
     for edge in scene_graph.get_layer(dsg.DsgLayers.ROOMS).edges:
         encoding += generate_edge_descriptor(edge)
-        
+
     return encoding
 
+
+def spatial_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> str:
+    relations = get_room_relations(scene_graph, room)
+
+    encoding = f'Room (id = {room.id.category_id})\n'
+    names = [f"{label} (id = {object_id})" for label, object_id in zip(relations['labels'], relations['ids'])]
+    for i, name in enumerate(names):
+        nearest = ", ".join(
+            f"{names[j]} {distance:.2f}"
+            for j, distance in zip(relations['knn_indices'][i], relations['knn_distances'][i])
+        )
+        encoding += f'\t- {name}: nearest {nearest or "none"}'
+
+        listed = set(relations['knn_indices'][i])
+        near = [names[j] for j in relations['near'][i] if j not in listed][:MAX_NEAR_OBJECTS]
+        if near:
+            encoding += f' | near {", ".join(near)}'
+        encoding += '\n'
+    return encoding
+
+
+def spatial_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[str], detail_keys: List [str]) -> str:
+    # Only the object neighborhoods, meant to be combined with another serialization type
+    encoding = (
+        f'Spatial relations per room: "nearest" lists the {SPATIAL_K} closest objects with their distance in meters, '
+        f'"near" any other object within {SPATIAL_RADIUS} m.\n'
+    )
+    return encoding + ''.join(room_fragments)
+
+
+# Field order of every attribute in compact rows; other attributes are emitted as their raw string
+COMPACT_FIELDS = {
+    'position': ['x', 'y', 'z'],
+    'bounding_box': ['cx', 'cy', 'cz', 'dx', 'dy', 'dz'],
+    'world_R_object': ['qw', 'qx', 'qy', 'qz'],
+}
+# Decimals kept for every float (centimeters for positions and sizes)
+COMPACT_PRECISION = 2
+
+
+def _quantize(value: float) -> str:
+    text = f"{value:.{COMPACT_PRECISION}f}".rstrip('0').rstrip('.')
+    return '0' if text in ('', '-0') else text
+
+
+def _flatten_numbers(value) -> list:
+    if isinstance(value, dict):
+        return [number for item in value.values() for number in _flatten_numbers(item)]
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [number for item in value for number in _flatten_numbers(item)]
+    return [float(value)]
+
+
+def _compact_attribute(key: str, value) -> str:
+    if key not in COMPACT_FIELDS:
+        return str(value).replace(' ', '')
+    if isinstance(value, str) and value == 'N/A':
+        return ' '.join('-' * len(COMPACT_FIELDS[key]))
+    if isinstance(value, np.ndarray):
+        numbers = value.ravel().tolist()
+    else:
+        numbers = _flatten_numbers(sanitization_function[key](f"{key}={value}")[key])
+    # Rows are only readable through the header, every value has to fill exactly its columns
+    if len(numbers) != len(COMPACT_FIELDS[key]):
+        raise ValueError(f"{key} has {len(numbers)} values, compact rows expect {len(COMPACT_FIELDS[key])} ({' '.join(COMPACT_FIELDS[key])}): {value}")
+    return ' '.join(_quantize(number) for number in numbers)
+
+
+def compact_room(scene_graph: dsg.DynamicSceneGraph, room, detail_keys: List [str]) -> dict:
+    labelspace = get_object_labelspace(scene_graph)
+    object_counts = get_object_counts_in_room(scene_graph, room, labelspace)
+    counts = {labelspace.names_to_labels[name]: count for name, count in object_counts.items() if count}
+
+    neighbors = ','.join(str(dsg.NodeSymbol(neighbor_id).category_id) for neighbor_id in room.siblings())
+    encoding = f"room {room.id.category_id} | adj {neighbors or '-'} | counts {' '.join(f'{label}:{count}' for label, count in counts.items())}\n"
+
+    if 'NA' not in detail_keys:
+        for object_node in get_objects_in_room(scene_graph, room):
+            attributes = object_node.attributes
+            values = [
+                _compact_attribute(key, getattr(attributes, key, 'N/A'))
+                for key in detail_keys
+            ]
+            encoding += ' '.join([str(object_node.id.category_id), str(attributes.semantic_label)] + values) + '\n'
+
+    # Labels are listed once per scene, so the assembly needs the ones this room uses
+    return {'text': encoding, 'labels': sorted(counts)}
+
+
+def compact_assemble(scene_graph: dsg.DynamicSceneGraph, room_fragments: List[dict], detail_keys: List [str]) -> str:
+    labelspace = get_object_labelspace(scene_graph)
+    used = sorted({label for fragment in room_fragments for label in fragment['labels']})
+
+    encoding = 'labels: ' + '; '.join(f"{label}={labelspace.labels_to_names[label]}" for label in used) + '\n'
+    if 'NA' not in detail_keys:
+        fields = ' '.join(
+            f"{key}({' '.join(COMPACT_FIELDS[key])})" if key in COMPACT_FIELDS else key
+            for key in detail_keys
+        )
+        encoding += f'object rows: id label {fields}\n'
+    encoding += ''.join(fragment['text'] for fragment in room_fragments)
+
+    edges = ' '.join(
+        f"{dsg.NodeSymbol(edge.source).category_id}-{dsg.NodeSymbol(edge.target).category_id}"
+        for edge in scene_graph.get_layer(dsg.DsgLayers.ROOMS).edges
+    )
+    return encoding + f'room edges: {edges}\n'
+
+
+# serialization type -> (room fragment function, assembly function)
+room_serializers = {
+    "indented": (indented_room, indented_assemble),
+    "json": (json_room, json_assemble),
+    "triplets": (triplets_room, triplets_assemble),
+    "natural": (natural_room, natural_assemble),
+    "spatial": (spatial_room, spatial_assemble),
+    "compact": (compact_room, compact_assemble),
+}
+
+
+def serialize_rooms(serialize_type: str, scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    room_fn, assemble_fn = room_serializers[serialize_type]
+    return assemble_fn(
+        scene_graph,
+        [room_fn(scene_graph, room, detail_keys) for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes],
+        detail_keys
+    )
+
+
+def indented_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("indented", scene_graph, detail_keys)
+
+def json_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("json", scene_graph, detail_keys)
+
+def triplets_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("triplets", scene_graph, detail_keys)
+
+def natural_lang_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("natural", scene_graph, detail_keys)
+
+def spatial_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("spatial", scene_graph, detail_keys)
+
+def compact_encoding(scene_graph: dsg.DynamicSceneGraph, detail_keys: List [str]) -> str:
+    return serialize_rooms("compact", scene_graph, detail_keys)
+
 serialization_functions = {
     "indented": indented_encoding,
     "json": json_encoding,
     "triplets": triplets_encoding,
     "natural": natural_lang_encoding,
+    "spatial": spatial_encoding,
+    "compact": compact_encoding,
 }
-
+assert tuple(serialization_functions) == SERIALIZATION_TYPES, "update models/formats.py"
 
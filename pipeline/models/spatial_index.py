@@ -0,0 +1,156 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+import spark_dsg as dsg
+
+from .utils import get_objects_in_room
+
+# Nearest neighbors listed per object
+SPATIAL_K = 3
+# Objects closer than this (in meters) are also listed as near each other
+SPATIAL_RADIUS = 1.0
+# Upper bound on the near objects listed per object, dense rooms would otherwise dominate the prompt
+MAX_NEAR_OBJECTS = 8
+# Points per KD-tree leaf; queries are vectorized over a leaf at a time
+LEAF_SIZE = 32
+# Rooms whose relations are kept in memory
+CACHE_SIZE = 4096
+
+
+class KDTree:
+    """
+    Static KD-tree over 3D points. Points are split on their widest axis at the median
+    until every leaf holds at most leaf_size points; queries run per leaf, pruning the
+    other leaves by the distance between their bounding boxes.
+    """
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.leaves = self._build(leaf_size)
+        if self.leaves:
+            self.lower = np.array([self.points[leaf].min(axis=0) for leaf in self.leaves])
+            self.upper = np.array([self.points[leaf].max(axis=0) for leaf in self.leaves])
+
+    def _build(self, leaf_size: int) -> List[np.ndarray]:
+        leaves = []
+        stack = [np.arange(len(self.points))] if len(self.points) else []
+        while stack:
+            index = stack.pop()
+            if len(index) <= leaf_size:
+                leaves.append(index)
+                continue
+            points = self.points[index]
+            axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+            middle = len(index) // 2
+            order = np.argpartition(points[:, axis], middle)
+            stack += [index[order[:middle]], index[order[middle:]]]
+        return leaves
+
+    def _leaf_distances(self, leaf: int) -> np.ndarray:
+        # Smallest distance between the bounding box of one leaf and that of every leaf
+        gap = np.maximum(0, np.maximum(self.lower - self.upper[leaf], self.lower[leaf] - self.upper))
+        return np.linalg.norm(gap, axis=1)
+
+    def _distances(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        distances = np.linalg.norm(self.points[queries][:, None, :] - self.points[candidates][None, :, :], axis=2)
+        # A point is never its own neighbor
+        distances[queries[:, None] == candidates[None, :]] = np.inf
+        return distances
+
+    def query_knn(self, k: int) -> (np.ndarray, np.ndarray):
+        """k nearest other points of every point, as (n, k) index and distance arrays sorted by distance."""
+        n = len(self.points)
+        k = min(k, n - 1)
+        indices = np.zeros((n, max(k, 0)), dtype=np.int64)
+        distances = np.zeros((n, max(k, 0)))
+        if k <= 0:
+            return indices, distances
+
+        for leaf, queries in enumerate(self.leaves):
+            leaf_distances = self._leaf_distances(leaf)
+            order = np.argsort(leaf_distances, kind='stable')
+
+            # Take the closest leaves until there are enough points to bound the k-th distance ...
+            sizes = np.cumsum([len(self.leaves[j]) for j in order])
+            enough = np.searchsorted(sizes, k + 1) + 1
+            candidates = np.concatenate([self.leaves[j] for j in order[:enough]])
+            bound = np.partition(self._distances(queries, candidates), k - 1, axis=1)[:, k - 1].max()
+
+            # ... then every leaf that could still hold a closer point
+            candidates = np.concatenate([self.leaves[j] for j in order if leaf_distances[j] <= bound])
+            candidate_distances = self._distances(queries, candidates)
+            nearest = np.argpartition(candidate_distances, k - 1, axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(candidate_distances, nearest, axis=1)
+            ranked = np.argsort(nearest_distances, axis=1, kind='stable')
+
+            indices[queries] = candidates[np.take_along_axis(nearest, ranked, axis=1)]
+            distances[queries] = np.take_along_axis(nearest_distances, ranked, axis=1)
+        return indices, distances
+
+    def query_radius(self, radius: float) -> List[np.ndarray]:
+        """Other points within radius of every point, sorted by distance."""
+        neighbors = [np.zeros(0, dtype=np.int64) for _ in range(len(self.points))]
+        for leaf, queries in enumerate(self.leaves):
+            close_leaves = np.flatnonzero(self._leaf_distances(leaf) <= radius)
+            candidates = np.concatenate([self.leaves[j] for j in close_leaves])
+            candidate_distances = self._distances(queries, candidates)
+            for row, query in enumerate(queries):
+                within = np.flatnonzero(candidate_distances[row] <= radius)
+                neighbors[query] = candidates[within[np.argsort(candidate_distances[row, within], kind='stable')]]
+        return neighbors
+
+
+def room_objects(scene_graph: dsg.DynamicSceneGraph, room) -> dict:
+    """Ids, labels and positions of the objects in a room."""
+    key = scene_graph.get_layer_key(dsg.DsgLayers.OBJECTS)
+    labelspace = scene_graph.get_labelspace(key.layer, key.partition)
+
+    object_nodes = get_objects_in_room(scene_graph, room)
+    return {
+        'ids': [node.id.category_id for node in object_nodes],
+        'labels': [labelspace.labels_to_names[node.attributes.semantic_label] for node in object_nodes],
+        'positions': np.array([node.attributes.position for node in object_nodes], dtype=np.float64).reshape(-1, 3),
+    }
+
+
+def compute_relations(objects: dict, k: int = SPATIAL_K, radius: float = SPATIAL_RADIUS) -> dict:
+    tree = KDTree(objects['positions'])
+    knn_indices, knn_distances = tree.query_knn(k)
+    return dict(objects, knn_indices=knn_indices, knn_distances=knn_distances, near=tree.query_radius(radius))
+
+
+def _room_key(objects: dict, k: int, radius: float) -> str:
+    digest = hashlib.sha256(f"{k}:{radius}:{objects['ids']}:{objects['labels']}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(objects['positions']).tobytes())
+    return digest.hexdigest()
+
+
+_relations_cache = OrderedDict()
+
+
+def get_room_relations(scene_graph: dsg.DynamicSceneGraph, room, k: int = SPATIAL_K, radius: float = SPATIAL_RADIUS) -> dict:
+    """
+    Nearest and within-radius neighbors of every object in a room. Results are cached by the
+    room's content, so repeated serializations and unchanged rooms of a new scene version
+    only build their trees once.
+    """
+    objects = room_objects(scene_graph, room)
+    key = _room_key(objects, k, radius)
+    if key in _relations_cache:
+        _relations_cache.move_to_end(key)
+        return _relations_cache[key]
+
+    relations = compute_relations(objects, k, radius)
+    _relations_cache[key] = relations
+    if len(_relations_cache) > CACHE_SIZE:
+        _relations_cache.popitem(last=False)
+    return relations
+
+
+def get_spatial_relations(scene_graph: dsg.DynamicSceneGraph, k: int = SPATIAL_K, radius: float = SPATIAL_RADIUS) -> Dict[int, dict]:
+    """Relations of every room, keyed by room id."""
+    return {
+        room.id.category_id: get_room_relations(scene_graph, room, k, radius)
+        for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes
+    }
@@ -2,32 +2,43 @@ import spark_dsg as dsg
 import re
 import json
 
+from .formats import DETAIL_KEYS
+
+
+def get_object_labelspace(G):
+    key = G.get_layer_key(dsg.DsgLayers.OBJECTS)
+    return G.get_labelspace(key.layer, key.partition)
+
+
+def get_object_counts_in_room(G, room, labelspace=None):
+    # Number of object instances of every category name in the labelspace, including zeros
+    labelspace = labelspace or get_object_labelspace(G)
+    object_counts = {name: 0 for name in labelspace.names_to_labels}
+
+    for place_id in room.children():
+        place = G.get_node(place_id)
+
+        for object_id in place.children():
+            if dsg.NodeSymbol(object_id).category != 'O':
+                continue
+            object_node = G.get_node(object_id)
+            object_counts[labelspace.labels_to_names[object_node.attributes.semantic_label]] += 1
+
+    return object_counts
+
 
 def get_object_counts_per_room(G):
     # This should be a mapping between the node ID of each room and a dictionary
     # containing the category name and number of object instances for that category
-    room_object_counts = {}
-    
-    key = G.get_layer_key(dsg.DsgLayers.OBJECTS)
-    labelspace = G.get_labelspace(key.layer, key.partition)
-    
-    for room in G.get_layer(dsg.DsgLayers.ROOMS).nodes:
-        room_object_counts[room.id] = {}
-        for name in labelspace.names_to_labels:
-            room_object_counts[room.id][name] = 0
-        
-        for place_id in room.children():
-            place = G.get_node(place_id)
-            
-            for object_id in place.children():
-                if dsg.NodeSymbol(object_id).category != 'O':
-                    continue
-                object_node = G.get_node(object_id)
-                room_object_counts[room.id][labelspace.labels_to_names[object_node.attributes.semantic_label]] += 1
-    
-    
-    
-    return room_object_counts
+    labelspace = get_object_labelspace(G)
+    return {
+        room.id: get_object_counts_in_room(G, room, labelspace)
+        for room in G.get_layer(dsg.DsgLayers.ROOMS).nodes
+    }
+
+
+def get_object_labels(G):
+    return list(get_object_labelspace(G).names_to_labels)
 
 
 def get_objects_in_room(G, room):
@@ -118,3 +129,5 @@ sanitization_function = {
     "position": sanitize_position,
     'world_R_object': sanitize_world_R,
 }
+assert tuple(sanitization_function) == DETAIL_KEYS, "update models/formats.py"
+
@@ -1,6 +1,7 @@
 import os
 from datetime import datetime
 import shutil
+import json
 
 def save_experiment_results(output_cfg, experiment_dataframe, condensed_results_keys, experiment_name=None):
     # Create unique folder name
@@ -20,13 +21,27 @@ def save_experiment_results(output_cfg, experiment_dataframe, condensed_results_
     return log_path
 
 
-def save_config_to_results(config_paths, results_dir):
+def save_config_to_results(config_paths, results_dir, dest_files=None):
     result_config_path = f"{results_dir}/configs"
     os.makedirs(result_config_path, exist_ok=True)
     
-    for config_path in config_paths:
+    for i, config_path in enumerate(config_paths):
         filename = os.path.basename(config_path)
         dest_file = "base_config.yaml" if filename == "base_eval_config.yaml" else "experiment_config.yaml"
+        if dest_files is not None:
+            dest_file = dest_files[i]
 
         destination = os.path.join(result_config_path, dest_file)
-        shutil.copy(config_path, destination)
\ No newline at end of file
+        shutil.copy(config_path, destination)
+
+
+def save_adaptive_decision(decision, interval_history, results_dir):
+    with open(os.path.join(results_dir, "adaptive_decision.json"), "w") as f:
+        json.dump(decision, f, indent=2, default=str)
+
+    interval_history.to_csv(os.path.join(results_dir, "adaptive_intervals.csv"), index=False)
+
+
+def save_shard_manifest(manifest, results_dir):
+    with open(os.path.join(results_dir, "shard_manifest.json"), "w") as f:
+        json.dump(manifest, f)
@@ -0,0 +1,267 @@
+import glob
+import os
+from functools import lru_cache
+from typing import Optional
+
+import pandas as pd
+import yaml
+
+from config import expand_experiments, group_equivalent
+from llm.interface import model_configs
+from models.scene_index import build_scene_indices
+from prompt_builder import dataset_labels, load_dataset, serialize_dataset, serialize_subgraph
+from subgraph import select_task_subgraphs
+from task_dataset import load_task_dataset
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Used when no tokenizer is available, roughly right for English text and JSON
+CHARS_PER_TOKEN = 4
+# The judge only replies with a score
+JUDGE_OUTPUT_TOKENS = 4
+
+DEFAULT_PLANNER_CFG = {
+    'default_latency_s': 5.0,
+    'default_judge_latency_s': 1.0,
+    'pricing': {},
+    'batch_discount': 0.5,
+    'budget': {},
+}
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use, which fails offline
+        print(f"[WARN] No tokenizer for {model_name} ({type(e).__name__}), estimating {CHARS_PER_TOKEN} characters per token")
+        return None
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def load_history(log_dir: str) -> dict:
+    """Average answer latency and answer length per answer model over every saved run in log_dir."""
+    frames = []
+    for path in glob.glob(os.path.join(log_dir, '**', 'raw_experiment_results.csv'), recursive=True):
+        try:
+            frame = pd.read_csv(path)
+        except (ValueError, pd.errors.EmptyDataError):
+            continue
+        if not {'llm_elapsed_time', 'predicted_answer'} <= set(frame.columns):
+            continue
+        if 'model' not in frame.columns:
+            # Runs from before multi-model sweeps used the base config's model
+            model_name = saved_model_name(os.path.dirname(path))
+            if model_name is None:
+                continue
+            frame['model'] = model_name
+        frames.append(frame[['model', 'llm_elapsed_time', 'predicted_answer']].assign(run=path))
+    if not frames:
+        return {}
+
+    history = pd.concat(frames, ignore_index=True)
+    # Dry runs don't reflect real latency or answer length
+    history = history[~history['predicted_answer'].astype(str).str.startswith('[dry run]')]
+    per_model = {}
+    for model_name, runs in history.groupby('model'):
+        latencies = runs['llm_elapsed_time'][runs['llm_elapsed_time'] > 0]
+        answers = runs['predicted_answer'].dropna().astype(str)
+        per_model[model_name] = {
+            'runs': runs['run'].nunique(),
+            'latency_s': latencies.mean() if len(latencies) else None,
+            'answer_tokens': answers.map(lambda answer: count_tokens(answer, model_name)).mean() if len(answers) else None,
+        }
+    return per_model
+
+
+def saved_model_name(results_dir: str):
+    try:
+        with open(os.path.join(results_dir, 'configs', 'base_config.yaml'), "r") as f:
+            return (yaml.safe_load(f) or {}).get('llm', {}).get('model_name')
+    except (OSError, yaml.YAMLError):
+        return None
+
+
+def task_scene_reprs(config: dict, tasks: dict, scene_cache: dict) -> dict:
+    """
+    Key and text of the scene representation in every task's prompt: the full scene, or the
+    selected rooms with prompt.subgraph enabled. Scenes are loaded and serialized once per
+    scene directory and serialization, whichever experiment or model asks for them.
+    """
+    dataset_cfg = config['dataset']
+    serialization_cfg = config['prompt']['serialization']
+    subgraph_cfg = config['prompt'].get('subgraph') or {}
+
+    dataset_key = ('dataset', dataset_cfg['scene_dir'])
+    if dataset_key not in scene_cache:
+        scene_graphs = load_dataset(dataset_cfg)
+        scene_cache[dataset_key] = (scene_graphs, build_scene_indices(scene_graphs), dataset_labels(scene_graphs))
+    scene_graphs, indices, labels = scene_cache[dataset_key]
+
+    repr_key = ('repr', dataset_cfg['scene_dir'], tuple(serialization_cfg['type']), tuple(serialization_cfg['detail_keys']))
+    if repr_key not in scene_cache:
+        scene_cache[repr_key] = serialize_dataset(scene_graphs, dict(serialization_cfg, verbose=False))
+
+    selections = {}
+    if subgraph_cfg.get('enabled', False):
+        selections = select_task_subgraphs(tasks, indices, labels, subgraph_cfg.get('hops', 1))
+
+    reprs = {}
+    for task, task_info in tasks.items():
+        scene_id = task_info['scene_id']
+        rooms = selections[task]['rooms'] if task in selections else None
+        if rooms is None:
+            reprs[task] = (repr_key + (scene_id,), scene_cache[repr_key][scene_id])
+            continue
+        key = repr_key + (scene_id, rooms)
+        if key not in scene_cache:
+            scene_cache[key] = serialize_subgraph(scene_id, scene_graphs[scene_id], rooms, serialization_cfg)
+        reprs[task] = (key, scene_cache[key])
+    return reprs
+
+
+def plan_experiment(config: dict, history: dict, planner_cfg: dict, scene_cache: dict, concurrency: Optional[int] = None) -> dict:
+    """
+    Calls, tokens, cost and wall time of one experiment. Every answer model runs with its own
+    llm concurrency, or with `concurrency` when it is given. The judge scores answers one at a time.
+    """
+    prompt_cfg = config['prompt']
+    eval_cfg = config['evaluation']
+    judge_model = eval_cfg['llm']['model_name']
+
+    tasks = load_task_dataset(prompt_cfg)
+    scene_reprs = task_scene_reprs(config, tasks, scene_cache)
+    pricing = planner_cfg['pricing']
+    judge_price = pricing.get(judge_model, {})
+    # Hybrid evaluation is planned as if every answer reached the judge
+    judged = eval_cfg.get('eval_type', 'llm_judge') != 'reference_matching'
+
+    with open(eval_cfg['expected_template'], "r", encoding="utf-8") as f:
+        judge_template_tokens = count_tokens(f.read(), judge_model)
+
+    plan = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0, 'wall_time_s': 0.0, 'priced': True}
+    answer_seconds = []
+    for llm_cfg in model_configs(config['llm']):
+        model_name = llm_cfg['model_name']
+        model_history = history.get(model_name, {})
+        latency = model_history.get('latency_s') or planner_cfg['default_latency_s']
+
+        with open(prompt_cfg['template_path'], "r", encoding="utf-8") as f:
+            template_tokens = count_tokens(f.read(), model_name)
+
+        answer_tokens = round(model_history.get('answer_tokens') or llm_cfg['max_tokens'])
+
+        input_tokens = 0
+        judge_input_tokens = 0
+        for task, task_info in tasks.items():
+            # Only the token counts depend on the model, the representations are shared
+            key, scene_repr = scene_reprs[task]
+            tokens_key = ('tokens', key, model_name)
+            if tokens_key not in scene_cache:
+                scene_cache[tokens_key] = count_tokens(scene_repr, model_name)
+            query_tokens = count_tokens(task_info['query'], model_name)
+            input_tokens += template_tokens + scene_cache[tokens_key] + query_tokens
+            judge_input_tokens += judge_template_tokens + query_tokens + count_tokens(str(task_info['answer']), model_name) + answer_tokens
+
+        answer_calls = len(tasks)
+        judge_calls = len(tasks) if judged else 0
+
+        # Answer models run side by side, each with its own concurrency. The judge then scores
+        # the answers of every model one at a time, as evaluator.llm_judge_summary does
+        answer_concurrency = concurrency or llm_cfg.get('concurrency', 1)
+        answer_seconds.append(answer_calls * (latency + llm_cfg['delay']) / max(answer_concurrency, 1))
+        plan['wall_time_s'] += judge_calls * (planner_cfg['default_judge_latency_s'] + eval_cfg['llm']['delay'])
+
+        answer_price = pricing.get(model_name, {})
+        plan['cost_usd'] += (
+            input_tokens * answer_price.get('input', 0)
+            + answer_calls * answer_tokens * answer_price.get('output', 0)
+            + judge_input_tokens * judge_price.get('input', 0)
+            + judge_calls * JUDGE_OUTPUT_TOKENS * judge_price.get('output', 0)
+        ) / 1e6
+        plan['calls'] += answer_calls + judge_calls
+        plan['input_tokens'] += input_tokens + (judge_input_tokens if judge_calls else 0)
+        plan['output_tokens'] += answer_calls * answer_tokens + judge_calls * JUDGE_OUTPUT_TOKENS
+        plan['priced'] = plan['priced'] and model_name in pricing
+
+    plan['wall_time_s'] += max(answer_seconds)
+    return plan
+
+
+def plan_sweep(base_config: dict, experiments_config: dict, concurrency: Optional[int] = None) -> pd.DataFrame:
+    """
+    Project API calls, tokens, cost and wall time of every experiment in a sweep.
+    concurrency overrides the per-model llm concurrency when given.
+    """
+    planner_cfg = dict(DEFAULT_PLANNER_CFG, **base_config.get('planner', {}))
+    history = load_history(base_config['output']['log_dir'])
+
+    # Batch jobs are billed at a discount
+    price_factor = planner_cfg['batch_discount'] if (base_config.get('batch') or {}).get('enabled', False) else 1.0
+
+    scene_cache = {}
+    rows = []
+    for group in group_equivalent(expand_experiments(base_config, experiments_config)):
+        (name, config), duplicates = group[0], group[1:]
+        row = plan_experiment(config, history, planner_cfg, scene_cache, concurrency)
+        row['cost_usd'] *= price_factor
+        row['experiment'] = name
+        row['same_as'] = ''
+        row['wall_time_h'] = row.pop('wall_time_s') / 3600
+        rows.append(row)
+        # Equivalent configs are run once, their results are copied
+        for duplicate, _ in duplicates:
+            rows.append(dict(row, experiment=duplicate, same_as=name, calls=0, input_tokens=0, output_tokens=0, cost_usd=0.0, wall_time_h=0.0))
+
+    plan = pd.DataFrame(rows)[['experiment', 'same_as', 'calls', 'input_tokens', 'output_tokens', 'cost_usd', 'wall_time_h', 'priced']]
+    plan.attrs['history'] = history
+    return plan
+
+
+def check_budget(plan: pd.DataFrame, budget: dict) -> list:
+    """Return a message for every configured budget limit the plan exceeds."""
+    totals = {
+        'max_calls': plan['calls'].sum(),
+        'max_cost_usd': plan['cost_usd'].sum(),
+        'max_hours': plan['wall_time_h'].sum(),
+    }
+    return [
+        f"{key.replace('max_', '')} {totals[key]:.2f} exceeds the budget of {budget[key]}"
+        for key in totals
+        if budget.get(key) is not None and totals[key] > budget[key]
+    ]
+
+
+def print_plan(plan: pd.DataFrame, concurrency: Optional[int] = None):
+    history = plan.attrs.get('history', {})
+    if history:
+        runs = ', '.join(f"{model_name} ({model_history['runs']} runs)" for model_name, model_history in history.items())
+        print(f"[INFO] Using latency/answer length from previous runs of {runs}, defaults for other models")
+    else:
+        print("[INFO] No previous runs found, using default latency and max_tokens answers")
+
+    with pd.option_context('display.float_format', '{:,.3f}'.format, 'display.width', 200):
+        print(plan.drop(columns='priced').to_string(index=False))
+    at_concurrency = f"concurrency {concurrency}" if concurrency else "the configured concurrency"
+    print(
+        f"TOTAL: {plan['calls'].sum()} calls, {plan['input_tokens'].sum():,} input tokens, "
+        f"{plan['output_tokens'].sum():,} output tokens, ${plan['cost_usd'].sum():.2f}, "
+        f"{plan['wall_time_h'].sum():.2f} h at {at_concurrency}"
+    )
+    if not plan['priced'].all():
+        print("[WARN] Some models have no pricing in planner.pricing, their cost is counted as 0")
@@ -0,0 +1,188 @@
+import cProfile
+import csv
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+PROFILE_MODES = ('timing', 'sampling', 'cprofile')
+# Stage spanning the whole run, the share of every stage is taken of its wall time
+RUN_STAGE = 'run'
+
+
+class StageProfiler:
+    """
+    Collects wall time per pipeline stage and, depending on the mode, a per-stage
+    cProfile or a sampled call stack profile in folded (flame graph) format.
+    """
+    def __init__(self, mode: str = 'timing', sample_interval: float = 0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unsupported profile mode: {mode}")
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.started = time.perf_counter()
+        self.stats = {}
+        self.profiles = {}
+        self.folded = Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # thread id -> stack of active stage names, read by the sampling thread
+        self.active = {}
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+        if mode == 'sampling':
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+            self.active[threading.get_ident()] = self.local.stack
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name: str, trace_memory: bool = False):
+        stack = self._stack()
+        stack.append(name)
+
+        # cProfile can't nest, so only the outermost stage of each thread is profiled
+        profile = None
+        if self.mode == 'cprofile' and len(stack) == 1:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = None
+            if started_tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profile is not None:
+                profile.disable()
+            stack.pop()
+
+            with self.lock:
+                stage = self.stats.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0, 'peak_memory': None})
+                stage['calls'] += 1
+                stage['total'] += elapsed
+                stage['max'] = max(stage['max'], elapsed)
+                if peak is not None:
+                    stage['peak_memory'] = max(stage['peak_memory'] or 0, peak)
+                if profile is not None:
+                    if name in self.profiles:
+                        self.profiles[name].add(profile)
+                    else:
+                        self.profiles[name] = _ProfileStats(profile)
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_sampling.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for thread_id, stages in list(self.active.items()):
+                if thread_id == own_id or not stages or thread_id not in frames:
+                    continue
+                self.folded[';'.join(stages + _frame_names(frames[thread_id]))] += 1
+
+    def close(self):
+        if self.sampler is not None:
+            self.stop_sampling.set()
+            self.sampler.join()
+
+    def summary_rows(self):
+        # Stages overlap when they nest or run in worker threads, so their totals can't be summed.
+        # Without a run stage, the time since profiling was enabled stands in for it
+        if RUN_STAGE in self.stats:
+            overall = self.stats[RUN_STAGE]['total']
+        else:
+            overall = time.perf_counter() - self.started
+        overall = overall or 1.0
+        return [
+            {
+                'stage': name,
+                'calls': stage['calls'],
+                'total_s': round(stage['total'], 4),
+                'mean_s': round(stage['total'] / stage['calls'], 4),
+                'max_s': round(stage['max'], 4),
+                'share': round(stage['total'] / overall, 4),
+                'peak_memory_mb': None if stage['peak_memory'] is None else round(stage['peak_memory'] / 2 ** 20, 2),
+            }
+            for name, stage in sorted(self.stats.items(), key=lambda item: -item[1]['total'])
+        ]
+
+    def write(self, results_dir: str) -> str:
+        self.close()
+        profile_dir = os.path.join(results_dir, 'profile')
+        os.makedirs(profile_dir, exist_ok=True)
+
+        rows = self.summary_rows()
+        with open(os.path.join(profile_dir, 'summary.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['stage', 'calls', 'total_s', 'mean_s', 'max_s', 'share', 'peak_memory_mb'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+        if self.folded:
+            # One "stage;frame;...;frame count" line per stack, as read by flamegraph.pl and speedscope
+            with open(os.path.join(profile_dir, 'stacks.folded'), 'w') as f:
+                for stack, count in self.folded.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        for name, profile in self.profiles.items():
+            profile.dump(os.path.join(profile_dir, f"{name}.prof"))
+
+        print(f"{'stage':<20} {'calls':>6} {'total_s':>9} {'mean_s':>9} {'max_s':>9} {'share':>6} {'peak_mb':>8}")
+        for row in rows:
+            peak = '' if row['peak_memory_mb'] is None else row['peak_memory_mb']
+            print(f"{row['stage']:<20} {row['calls']:>6} {row['total_s']:>9} {row['mean_s']:>9} {row['max_s']:>9} {row['share']:>6} {peak:>8}")
+        print(f"[INFO] Profile saved to {profile_dir}")
+        return profile_dir
+
+
+class _ProfileStats:
+    # Accumulates the cProfile runs of one stage across calls
+    def __init__(self, profile: cProfile.Profile):
+        self.stats = pstats.Stats(profile)
+
+    def add(self, profile: cProfile.Profile):
+        self.stats.add(profile)
+
+    def dump(self, path: str):
+        self.stats.dump_stats(path)
+
+
+def _frame_names(frame):
+    names = []
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return names[::-1]
+
+
+_profiler = None
+
+
+def enable_profiling(mode: str = 'timing', sample_interval: float = 0.005) -> StageProfiler:
+    global _profiler
+    _profiler = StageProfiler(mode, sample_interval)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def span(name: str, trace_memory: bool = False):
+    """Time a pipeline stage if profiling is enabled, otherwise do nothing."""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.span(name, trace_memory)
@@ -2,17 +2,35 @@ import os
 import spark_dsg as dsg
 from typing import List, Dict
 from models.serialization import serialization_functions
+from models.utils import get_object_labels
+from models.scene_cache import load_cached_scene
+from models.incremental import room_fingerprints, serialize_incremental
+from models.scene_index import SubgraphView
 from pathlib import Path
 
 
+def load_scene(file: Path, dataset_cfg: dict) -> dsg.DynamicSceneGraph:
+    cache_dir = dataset_cfg.get('cache_dir')
+    if cache_dir:
+        return load_cached_scene(file, cache_dir)
+    return dsg.DynamicSceneGraph.load(file)
+
+
 def load_dataset(dataset_cfg: dict) -> Dict[str, dsg.DynamicSceneGraph]:
     directory = Path(dataset_cfg['scene_dir'])
     return {
-        file.name: dsg.DynamicSceneGraph.load(file)
+        file.name: load_scene(file, dataset_cfg)
         for file in directory.glob("*.json")
-    }   
-    
-    
+    }
+
+
+def dataset_labels(scene_graphs: Dict[str, dsg.DynamicSceneGraph]) -> List[str]:
+    labels = set()
+    for scene_graph in scene_graphs.values():
+        labels.update(get_object_labels(scene_graph))
+    return sorted(labels)
+
+
 def serialize_dataset(
     scene_graphs: Dict[str, dsg.DynamicSceneGraph],
     serialization_cfg: dict
@@ -23,15 +41,31 @@ def serialize_dataset(
     
     serialize_fn = {s: serialization_functions[s] for s in serialization}
 
-        
-    dsg_serialized = {
-        name: '\n'.join(
-            f'Below is a {serialize_type} summarization of scene graph {name}\n'
-            + serialize_fn[serialize_type](scene_graph, detail_keys)
-            for serialize_type in serialize_fn
-        )
-        for name, scene_graph in scene_graphs.items()
-    }
+    # With a cache directory only the rooms that changed since the last serialization are serialized again
+    cache_dir = serialization_cfg.get('cache_dir')
+    if cache_dir:
+        dsg_serialized = {}
+        changed_rooms, total_rooms = 0, 0
+        for name, scene_graph in scene_graphs.items():
+            fingerprints = room_fingerprints(scene_graph, detail_keys)
+            parts = []
+            for serialize_type in serialize_fn:
+                encoding, changed, total = serialize_incremental(name, scene_graph, serialize_type, detail_keys, cache_dir, fingerprints)
+                parts.append(f'Below is a {serialize_type} summarization of scene graph {name}\n' + encoding)
+                changed_rooms += changed
+                total_rooms += total
+            dsg_serialized[name] = '\n'.join(parts)
+        if changed_rooms < total_rooms:
+            print(f"[INFO] Serialized {changed_rooms}/{total_rooms} rooms, reused the rest from {cache_dir}")
+    else:
+        dsg_serialized = {
+            name: '\n'.join(
+                f'Below is a {serialize_type} summarization of scene graph {name}\n'
+                + serialize_fn[serialize_type](scene_graph, detail_keys)
+                for serialize_type in serialize_fn
+            )
+            for name, scene_graph in scene_graphs.items()
+        }
 
     
     
@@ -41,6 +75,15 @@ def serialize_dataset(
             
     return dsg_serialized
 
+def serialize_subgraph(name: str, scene_graph: dsg.DynamicSceneGraph, room_ids, serialization_cfg: dict) -> str:
+    """Serialize only some rooms of a scene, noting in the representation that it is partial."""
+    # The fragment cache holds the full scenes, so subgraphs are serialized directly
+    view = SubgraphView(scene_graph, room_ids)
+    scene_repr = serialize_dataset({name: view}, dict(serialization_cfg, cache_dir=None, verbose=False))[name]
+    rooms = ', '.join(str(room_id) for room_id in sorted(room_ids))
+    return f'Only the rooms relevant to the question are included (rooms {rooms}).\n' + scene_repr
+
+
 def build_prompt(scene_repr: str, query: str, prompt_cfg: dict) -> str:
     with open(prompt_cfg['template_path'], "r", encoding="utf-8") as f:
         prompt_template = f.read()    
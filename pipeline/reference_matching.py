@@ -0,0 +1,160 @@
+import difflib
+import re
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+
+MATCH = 'match'
+MISMATCH = 'mismatch'
+AMBIGUOUS = 'ambiguous'
+
+NUMBER_WORDS = {
+    # 'no' is left out, it is mostly a yes/no answer or "room no 3", not a count
+    'zero': 0, 'none': 0, 'one': 1, 'single': 1, 'two': 2, 'three': 3, 'four': 4,
+    'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11,
+    'twelve': 12, 'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16,
+    'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20,
+}
+NUMBER_WORDS_PATTERN = r'\b(' + '|'.join(NUMBER_WORDS) + r')\b'
+ROOM_PATTERN = r'\brooms?\s*(?:id\s*)?(?:number\s*|no\s*)?(\d+(?:\s+(?:and\s+|or\s+)?\d+)*)'
+OBJECT_ID_PATTERN = r'\bid\s*\d+'
+# Shorter words are too often a letter away from an unrelated label to correct them
+MIN_FUZZY_LENGTH = 4
+
+
+def normalize_answers(answers: pd.Series) -> pd.Series:
+    """Lowercase, strip punctuation and spell numbers as digits."""
+    text = answers.fillna('').astype(str).str.lower()
+    text = text.str.replace(r'[^a-z0-9\s]', ' ', regex=True)
+    text = text.str.replace(NUMBER_WORDS_PATTERN, lambda m: str(NUMBER_WORDS[m.group(1)]), regex=True)
+    return text.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def singularize(text: pd.Series) -> pd.Series:
+    text = text.str.replace(r'\b(\w+(?:s|x|z|ch|sh))es\b', r'\1', regex=True)
+    return text.str.replace(r'\b(\w{2,}[^s\W])s\b', r'\1', regex=True)
+
+
+def normalize_labels(labels: Iterable[str]) -> pd.Series:
+    """Labels as extract_labels reports them: normalized and singular."""
+    return singularize(normalize_answers(pd.Series(list(labels), dtype=object)))
+
+
+def _collect(text: pd.Series, pattern: str, split: bool = False) -> pd.Series:
+    # Set of all matches of the first capture group in every row
+    matches = text.str.extractall(pattern)[0]
+    if split:
+        matches = matches.str.findall(r'\d+').explode()
+    found = matches.groupby(level=0).agg(frozenset)
+    return found.reindex(text.index).apply(lambda s: s if isinstance(s, frozenset) else frozenset())
+
+
+def extract_room_ids(text: pd.Series) -> pd.Series:
+    # "rooms 1 and 2" mentions both rooms
+    return _collect(text, ROOM_PATTERN, split=True)
+
+
+def extract_numbers(text: pd.Series) -> pd.Series:
+    # Room and object ids are numbers too, so drop them before looking for counts
+    text = text.str.replace(ROOM_PATTERN, ' ', regex=True).str.replace(OBJECT_ID_PATTERN, ' ', regex=True)
+    return _collect(text, r'\b(\d+)\b')
+
+
+def extract_labels(text: pd.Series, labels: Iterable[str], fuzzy_cutoff: float = 0.85) -> pd.Series:
+    """Labels mentioned in every row, matching misspelled single words against the labelspace."""
+    normalized = normalize_labels(sorted(set(labels))).drop_duplicates()
+    normalized = normalized[normalized != '']
+    if normalized.empty:
+        return pd.Series([frozenset()] * len(text), index=text.index, dtype=object)
+
+    # Map every distinct unknown word in the batch to a label word once: plurals of label
+    # words to their singular, other words to their closest single-word label
+    single_words = [label for label in normalized if ' ' not in label]
+    # Misspellings rarely change the first letter, while other words a letter away from a
+    # label ("hair" and "chair") usually do, so only labels with the same first letter are candidates
+    candidates = {}
+    for label in single_words:
+        candidates.setdefault(label[0], []).append(label)
+    label_words = set(' '.join(normalized).split())
+    vocabulary = sorted(set(text.str.split().explode().dropna()) - label_words)
+    corrections = {}
+    for word, singular in zip(vocabulary, singularize(pd.Series(vocabulary, dtype=object))):
+        if singular in label_words:
+            corrections[word] = singular
+            continue
+        if len(word) < MIN_FUZZY_LENGTH:
+            continue
+        close = difflib.get_close_matches(word, candidates.get(word[0], []), n=1, cutoff=fuzzy_cutoff)
+        if close:
+            corrections[word] = close[0]
+    if corrections:
+        correction_pattern = r'\b(' + '|'.join(map(re.escape, corrections)) + r')\b'
+        text = text.str.replace(correction_pattern, lambda m: corrections[m.group(1)], regex=True)
+
+    # Longest labels first so "swivel chair" wins over "chair"
+    ordered = sorted(normalized, key=len, reverse=True)
+    return _collect(text, r'\b(' + '|'.join(map(re.escape, ordered)) + r')\b')
+
+
+def compare_sets(ground_truth: pd.Series, predicted: pd.Series) -> np.ndarray:
+    """
+    Compare extracted values row by row.
+    Returns MATCH when the prediction mentions exactly the ground truth values, MISMATCH
+    when it mentions none of them, AMBIGUOUS when it mentions a superset or nothing at all,
+    and None when the ground truth carries no value of this kind.
+    """
+    gt_empty = ground_truth.map(len).to_numpy() == 0
+    pred_empty = predicted.map(len).to_numpy() == 0
+    equal = np.array([a == b for a, b in zip(ground_truth, predicted)], dtype=bool)
+    overlap = np.array([bool(a & b) for a, b in zip(ground_truth, predicted)], dtype=bool)
+
+    return np.select(
+        [gt_empty, pred_empty, equal, ~overlap],
+        [None, AMBIGUOUS, MATCH, MISMATCH],
+        default=AMBIGUOUS
+    )
+
+
+def match_references(questions: pd.DataFrame, labels: List[str], cfg: dict) -> pd.DataFrame:
+    """
+    Score a batch of predictions against their reference answers without calling an LLM.
+    - questions: indexed by question id with 'question_type', 'ground_truth_answer', 'predicted_answer'
+    - labels: object labelspace of the scenes the questions are about
+    Adds 'match_status' and 'score' columns; ambiguous rows get cfg['ambiguous_score'].
+    """
+    gt_text = normalize_answers(questions['ground_truth_answer'])
+    pred_text = normalize_answers(questions['predicted_answer'])
+
+    number_status = compare_sets(extract_numbers(gt_text), extract_numbers(pred_text))
+    room_status = compare_sets(extract_room_ids(gt_text), extract_room_ids(pred_text))
+    fuzzy_cutoff = cfg.get('fuzzy_cutoff', 0.85)
+    label_status = compare_sets(
+        extract_labels(gt_text, labels, fuzzy_cutoff),
+        extract_labels(pred_text, labels, fuzzy_cutoff)
+    )
+
+    question_type = questions['question_type'].to_numpy()
+    is_count = question_type == 'object-count'
+    is_room = question_type == 'room-attributes'
+    is_spatial = question_type == 'spatial-reasoning'
+
+    status = np.select(
+        [
+            (gt_text == pred_text).to_numpy() & (gt_text != '').to_numpy(),
+            is_count & pd.notna(number_status),
+            is_room & pd.notna(room_status),
+            (is_room | is_spatial) & pd.notna(label_status),
+        ],
+        [MATCH, number_status, room_status, label_status],
+        default=AMBIGUOUS
+    )
+
+    scored = questions.copy()
+    scored['match_status'] = status
+    scored['score'] = np.select(
+        [status == MATCH, status == MISMATCH],
+        [cfg.get('match_score', 5.0), cfg.get('mismatch_score', 1.0)],
+        default=cfg.get('ambiguous_score', -1)
+    )
+    return scored
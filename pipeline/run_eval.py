@@ -1,105 +1,365 @@
 import argparse
-import yaml
-import copy
-from tqdm import tqdm
-import pandas as pd
+import csv
+import os
+import re
+import subprocess
+import sys
 import time
+from datetime import datetime
 
-
-from prompt_builder import (
-    load_dataset,
-    serialize_dataset,
-    build_prompt,
+# Only configuration helpers are imported up front; pandas, spark_dsg, plotting and the
+# OpenAI client are imported by the commands that need them so --help and validate stay fast
+from config import (
+    load_config,
+    expand_experiments,
+    group_equivalent
 )
 
-from task_dataset import load_task_dataset
-from llm.interface import LLMClient
-from evaluator import evaluate_summary 
-from output_logging import (
-    save_experiment_results, 
-    save_config_to_results
-)
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(PIPELINE_DIR)
 
-from visualize import (
-    vizualize_fns
-)
+COMMANDS = ('run', 'plan', 'merge', 'judge', 'plot', 'serve', 'bench', 'validate')
+
+# Modules timed by the bench command, each imported in a fresh interpreter
+BENCH_IMPORTS = {
+    'interpreter': 'pass',
+    'run_eval': 'import run_eval',
+    'config': 'import config',
+    'prompt_builder': 'import prompt_builder',
+    'llm.interface': 'import llm.interface',
+    'evaluator': 'import evaluator',
+    'experiment': 'import experiment',
+    'planner': 'import planner',
+    'service': 'import service',
+    'visualize': 'import visualize',
+    'openai': 'import openai',
+}
+
+
+def add_config_args(parser):
+    parser.add_argument('--base_config', type=str, default='configs/base_eval_config.yaml', help="Path to the config file")
+    parser.add_argument('--experiment_config', type=str, default='configs/experiment_multi.yaml', help="Path to the experiment config file")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate scene graph serializations with LLMs")
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help="Run every experiment of a sweep, judge the answers and plot the results")
+    add_config_args(run_parser)
+    run_parser.add_argument('--dry_run', action='store_true', help="Don't call the LLM, just simulate")
+    run_parser.add_argument('--profile', nargs='?', const='sampling', default=None, choices=('timing', 'sampling', 'cprofile'),
+                            help="Time every pipeline stage; 'sampling' (default) also writes a folded flame graph, 'cprofile' a .prof per stage")
+    run_parser.add_argument('--batch', action='store_true', help="Send answers and judge prompts as batch jobs (see the batch section of the base config)")
+    run_parser.add_argument('--ignore_budget', action='store_true', help="Start the sweep even if the planner projects it over budget")
+    run_parser.add_argument('--shard', type=str, default=None, help="Only run shard i of N (0-based, e.g. 0/4); combine the shards with merge")
+    run_parser.add_argument('--run_name', type=str, default=None, help="Results directory name, shards add _shard<i>of<N>")
+
+    merge_parser = subparsers.add_parser('merge', help="Combine the results of every shard of a sweep and plot them")
+    merge_parser.add_argument('--results_paths', type=str, nargs='+', required=True, help="Results directories of all shards")
+    merge_parser.add_argument('--run_name', type=str, default=None, help="Name of the merged results directory")
+
+    plan_parser = subparsers.add_parser('plan', help="Project calls, tokens, cost and wall time of a sweep without running it")
+    add_config_args(plan_parser)
+    plan_parser.add_argument('--concurrency', type=int, default=None, help="Requests in flight per model, overrides llm.concurrency")
+
+    judge_parser = subparsers.add_parser('judge', help="Score the answers of a saved experiment again")
+    judge_parser.add_argument('--results_path', type=str, required=True, help="Results directory with raw_experiment_results.csv")
+    judge_parser.add_argument('--base_config', type=str, default='configs/base_eval_config.yaml', help="Config providing the evaluation settings")
+    judge_parser.add_argument('--dry_run', action='store_true', help="Don't call the judge, just simulate")
+    judge_parser.add_argument('--batch', action='store_true', help="Send the judge prompts as one batch job")
+
+    plot_parser = subparsers.add_parser('plot', help="Redraw the plots of a saved experiment")
+    plot_parser.add_argument('--results_path', type=str, required=True, help="Results Directory to Update")
+
+    serve_parser = subparsers.add_parser('serve', help="Answer questions about warm, hot-reloaded scenes over HTTP")
+    serve_parser.add_argument('--base_config', type=str, default='configs/base_eval_config.yaml', help="Config providing dataset, prompt, llm and service settings")
+    serve_parser.add_argument('--host', type=str, default=None, help="Overrides service.host")
+    serve_parser.add_argument('--port', type=int, default=None, help="Overrides service.port")
+    serve_parser.add_argument('--unix_socket', type=str, default=None, help="Listen on a Unix socket instead of TCP")
+    serve_parser.add_argument('--dry_run', action='store_true', help="Don't call the LLM, just simulate")
+
+    bench_parser = subparsers.add_parser('bench', help="Measure import time of the pipeline modules")
+    bench_parser.add_argument('--repeat', type=int, default=3, help="Imports per module, the fastest one is kept")
+    bench_parser.add_argument('--output', type=str, default='results/bench/import_times.csv', help="CSV the measurements are appended to")
+
+    validate_parser = subparsers.add_parser('validate', help="Check the configs without loading scenes or calling the LLM")
+    add_config_args(validate_parser)
 
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Invocations without a command (the original flag-only CLI) run the sweep
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    return parser.parse_args(argv)
 
 
+def cmd_run(args):
+    from experiment import run_sweep, run_adaptive_sweep
+    from output_logging import (
+        save_experiment_results,
+        save_config_to_results,
+        save_adaptive_decision
+    )
+    from visualize import (
+        visualize
+    )
+    from profiling import enable_profiling, span
 
+    profiler = enable_profiling(args.profile) if args.profile else None
 
-def recursive_merge(base, overrides):
-    for k, v in overrides.items():
-        if isinstance(v, dict) and k in base and isinstance(base[k], dict):
-            recursive_merge(base[k], v)
+    # Stage shares are taken of the whole run
+    with span('run'):
+        shard = None
+        if args.shard:
+            from sharding import parse_shard
+            try:
+                shard = parse_shard(args.shard)
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+                sys.exit(1)
+
+        base_config = load_config(args.base_config)
+        if args.dry_run:
+            base_config['run']['dry_run'] = True
+        if args.batch:
+            base_config.setdefault('batch', {})['enabled'] = True
+        experiments_config = load_config(args.experiment_config)
+
+        budget = base_config.get('planner', {}).get('budget') or {}
+        if not args.dry_run and not args.ignore_budget and any(v is not None for v in budget.values()):
+            from planner import plan_sweep, check_budget
+            over_budget = check_budget(plan_sweep(base_config, experiments_config), budget)
+            for message in over_budget:
+                print(f"[ERROR] Projected {message}")
+            if over_budget:
+                print("[ERROR] Refusing to start, see `run_eval.py plan` or pass --ignore_budget")
+                sys.exit(1)
+
+        viz_config = experiments_config['visualization']
+        condensed_results_keys = experiments_config['condensed_results_keys']
+
+        adaptive_cfg = experiments_config.get('adaptive', {})
+        if shard is not None and adaptive_cfg.get('enabled', False):
+            print("[ERROR] Adaptive sweeps decide when to stop from all results and cannot be sharded")
+            sys.exit(1)
+        if adaptive_cfg.get('enabled', False) and (base_config.get('batch') or {}).get('enabled', False):
+            print("[ERROR] Adaptive sweeps need every score before asking the next question and cannot run as batch jobs")
+            sys.exit(1)
+
+        if adaptive_cfg.get('enabled', False):
+            experiments_df, decision, interval_history = run_adaptive_sweep(base_config, experiments_config)
         else:
-            base[k] = v
-    return base
+            experiments_df = run_sweep(base_config, experiments_config, shard)
 
+        run_name = args.run_name
+        if shard is not None:
+            run_name = f"{run_name or 'experiment_' + datetime.now().strftime('%Y%m%d_%H%M%S')}_shard{shard[0]}of{shard[1]}"
+            if experiments_df.empty:
+                import pandas as pd
+                experiments_df = pd.DataFrame(columns=list(dict.fromkeys(['experiment', 'question_id', 'question_type'] + condensed_results_keys)))
 
-def parse_args():
-    parser = argparse.ArgumentParser(description="Load config file")
-    parser.add_argument('--base_config', type=str, default='configs/base_eval_config.yaml', help="Path to the config file")
-    parser.add_argument('--experiment_config', type=str, default='configs/experiment_multi.yaml', help="Path to the experiment config file")
-    return parser.parse_args()
-
-def load_config(config_path):
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-    return config
-
-def run_experiment(config):
-    dataset_cfg = config['dataset']
-    prompt_cfg = config['prompt']
-    serialization_cfg = prompt_cfg['serialization']
-    llm_cfg = config['llm']
-    eval_cfg = config['evaluation']
-
-
-    dsg_dataset = load_dataset(dataset_cfg)
-    scene_reprs = serialize_dataset(dsg_dataset, serialization_cfg)
-    task_dataset = load_task_dataset(prompt_cfg)
-    
-    llmclient = LLMClient(llm_cfg)
-    
-    predicted_answers = {}
-    for task in tqdm(task_dataset):
-        prompt = build_prompt(scene_reprs[task_dataset[task]['scene_id']], task_dataset[task]['query'], prompt_cfg)
-        start = time.perf_counter()
-        pred_answer = llmclient.query(prompt)
-        duration = time.perf_counter() - start - llm_cfg['delay']
-        
-        predicted_answers[task] = {
-            'answer': pred_answer,
-            'elapsed_time': duration
-        }
-    
-    return evaluate_summary(predicted_answers, task_dataset, eval_cfg, serialization_cfg)
-    
+        results_path = save_experiment_results(base_config['output'], experiments_df, condensed_results_keys, run_name)
+
+        save_config_to_results([args.experiment_config, args.base_config], results_path, ['experiment_config.yaml', 'base_config.yaml'])
+
+        if adaptive_cfg.get('enabled', False):
+            save_adaptive_decision(decision, interval_history, results_path)
+
+        if shard is not None:
+            from output_logging import save_shard_manifest
+            from sharding import build_manifest, config_hash
+            save_shard_manifest(
+                build_manifest(shard, config_hash(base_config, experiments_config), experiments_df.attrs['all_items'], experiments_df.attrs['shard_items']),
+                results_path
+            )
+            print(f"[INFO] Shard {shard[0]}/{shard[1]} done, plot the sweep after `run_eval.py merge`")
+        else:
+            with span('plotting'):
+                visualize(experiments_df, results_path, viz_config)
+
+    if profiler is not None:
+        profiler.write(results_path)
+
+
+def cmd_plan(args):
+    from planner import plan_sweep, check_budget, print_plan
+
+    base_config = load_config(args.base_config)
+    experiments_config = load_config(args.experiment_config)
+
+    plan = plan_sweep(base_config, experiments_config, args.concurrency)
+    print_plan(plan, args.concurrency)
+    for message in check_budget(plan, base_config.get('planner', {}).get('budget') or {}):
+        print(f"[WARN] Projected {message}")
 
 
+def cmd_judge(args):
+    import pandas as pd
+    from evaluator import rescore_results
+    from llm.interface import LLMClient
+    from output_logging import save_experiment_results, save_config_to_results
+    from visualize import plot_results
+
+    base_config = load_config(args.base_config)
+    eval_cfg = base_config['evaluation']
+    experiment_config = os.path.join(args.results_path, 'configs', 'experiment_config.yaml')
+    experiments_config = load_config(experiment_config)
+
+    labels = None
+    if eval_cfg.get('eval_type', 'llm_judge') != 'llm_judge':
+        from prompt_builder import load_dataset, dataset_labels
+        labels = dataset_labels(load_dataset(base_config['dataset']))
+
+    results = pd.read_csv(os.path.join(args.results_path, 'raw_experiment_results.csv'))
+    batch_cfg = base_config.get('batch') or {}
+    if (args.batch or batch_cfg.get('enabled', False)) and not args.dry_run:
+        from llm.batch import batch_judge
+        rescored = batch_judge(lambda _, evaluator: rescore_results(results, eval_cfg, labels, evaluator), [eval_cfg['llm']], batch_cfg)[0]
+    else:
+        rescored = rescore_results(results, eval_cfg, labels, LLMClient(eval_cfg['llm'], dry_run=args.dry_run))
+
+    experiment_name = f"{os.path.basename(os.path.normpath(args.results_path))}_rejudged"
+    results_path = save_experiment_results(base_config['output'], rescored, experiments_config['condensed_results_keys'], experiment_name)
+    save_config_to_results([experiment_config, args.base_config], results_path, ['experiment_config.yaml', 'base_config.yaml'])
+    plot_results(results_path)
+
+
+def cmd_merge(args):
+    from output_logging import save_experiment_results, save_config_to_results
+    from sharding import merge_shards
+    from visualize import plot_results
+
+    try:
+        merged = merge_shards(args.results_paths)
+    except (OSError, ValueError) as e:
+        for error in str(e).splitlines():
+            print(f"[ERROR] {error}")
+        sys.exit(1)
+
+    # The shards were checked to share their configs, so any shard's copy will do
+    config_dir = os.path.join(args.results_paths[0], 'configs')
+    base_config = load_config(os.path.join(config_dir, 'base_config.yaml'))
+    experiments_config = load_config(os.path.join(config_dir, 'experiment_config.yaml'))
+
+    run_name = args.run_name
+    if run_name is None:
+        prefixes = {re.sub(r'_shard\d+of\d+$', '', os.path.basename(os.path.normpath(path))) for path in args.results_paths}
+        run_name = prefixes.pop() if len(prefixes) == 1 else None
+
+    results_path = save_experiment_results(base_config['output'], merged, experiments_config['condensed_results_keys'], run_name)
+    save_config_to_results(
+        [os.path.join(config_dir, 'experiment_config.yaml'), os.path.join(config_dir, 'base_config.yaml')],
+        results_path,
+        ['experiment_config.yaml', 'base_config.yaml']
+    )
+    print(f"[INFO] Merged {len(args.results_paths)} shards, {len(merged)} results")
+    plot_results(results_path)
+
+
+def cmd_plot(args):
+    from visualize import plot_results
+    plot_results(args.results_path)
+
+
+def cmd_serve(args):
+    from service import run_service
+
+    base_config = load_config(args.base_config)
+    service_cfg = base_config.setdefault('service', {})
+    for key in ('host', 'port', 'unix_socket'):
+        if getattr(args, key) is not None:
+            service_cfg[key] = getattr(args, key)
+    run_service(base_config, dry_run=args.dry_run or base_config['run'].get('dry_run', False))
+
+
+def cmd_validate(args):
+    from models.formats import SERIALIZATION_TYPES, DETAIL_KEYS
+    from task_dataset import FILES
+
+    base_config = load_config(args.base_config)
+    experiments_config = load_config(args.experiment_config)
+
+    errors = []
+    for key in ('condensed_results_keys', 'visualization'):
+        if key not in experiments_config:
+            errors.append(f"{args.experiment_config}: missing '{key}'")
+    if not experiments_config.get('experiments') and not experiments_config.get('grid'):
+        errors.append(f"{args.experiment_config}: needs 'experiments' or 'grid'")
+
+    experiments = []
+    try:
+        experiments = expand_experiments(base_config, experiments_config)
+    except (KeyError, TypeError, ValueError) as e:
+        errors.append(f"{args.experiment_config}: cannot expand experiments ({type(e).__name__}: {e})")
+    for name, config in experiments:
+        prompt_cfg = config['prompt']
+        serialization_cfg = prompt_cfg['serialization']
+
+        for serialize_type in serialization_cfg['type']:
+            if serialize_type not in SERIALIZATION_TYPES:
+                errors.append(f"{name}: unknown serialization type '{serialize_type}'")
+        if 'json' in serialization_cfg['type']:
+            for detail_key in serialization_cfg['detail_keys']:
+                if detail_key != 'NA' and detail_key not in DETAIL_KEYS:
+                    errors.append(f"{name}: json serialization cannot encode detail key '{detail_key}'")
+        if prompt_cfg['task'] not in FILES:
+            errors.append(f"{name}: unknown task '{prompt_cfg['task']}'")
+        else:
+            for file_name in FILES[prompt_cfg['task']]:
+                task_file = os.path.join(prompt_cfg['task_path'], file_name)
+                if not os.path.exists(task_file):
+                    errors.append(f"{name}: missing task file {task_file}")
+
+        for path in (prompt_cfg['template_path'], config['evaluation']['expected_template'], config['dataset']['scene_dir']):
+            if not os.path.exists(path):
+                errors.append(f"{name}: missing {path}")
+
+    for error in errors:
+        print(f"[ERROR] {error}")
+    if errors:
+        sys.exit(1)
+    executions = len(group_equivalent(experiments))
+    print(f"[INFO] {len(experiments)} experiments are valid ({executions} distinct configurations)")
+
+
+def cmd_bench(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PIPELINE_DIR, REPO_DIR, env.get('PYTHONPATH')]))
+
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for name, statement in BENCH_IMPORTS.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-c', statement], env=env, capture_output=True)
+            timings.append(time.perf_counter() - start)
+        status = 'ok' if completed.returncode == 0 else 'error'
+        rows.append({'timestamp': timestamp, 'module': name, 'seconds': round(min(timings), 4), 'status': status})
+        print(f"{name:<16} {min(timings):8.3f}s {status}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    write_header = not os.path.exists(args.output)
+    with open(args.output, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['timestamp', 'module', 'seconds', 'status'])
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+    print(f"[INFO] Import times appended to {args.output}")
+
+
+command_fns = {
+    'run': cmd_run,
+    'plan': cmd_plan,
+    'merge': cmd_merge,
+    'judge': cmd_judge,
+    'plot': cmd_plot,
+    'serve': cmd_serve,
+    'bench': cmd_bench,
+    'validate': cmd_validate,
+}
+
 
 if __name__ == "__main__":
     args = parse_args()
-    base_config = load_config(args.base_config)
-    
-    with open(args.experiment_config, "r") as f:
-        experiments_config = yaml.safe_load(f)
-    
-    viz_config = experiments_config['visualization']
-    condensed_results_keys = experiments_config['condensed_results_keys']
-    
-    experiments_df = pd.DataFrame()
-    for experiment in experiments_config["experiments"]:
-        print(f"EXPERIMENT: {experiment['name']}")
-        config_copy = copy.deepcopy(base_config)
-        config = recursive_merge(config_copy, experiment["overrides"])        
-
-        experiments_df = pd.concat([experiments_df, run_experiment(config)], ignore_index=True)
-
-    results_path = save_experiment_results(base_config['output'], experiments_df, condensed_results_keys)
-
-    save_config_to_results([args.experiment_config, args.base_config], results_path)
-    
-    vizualize_fns[viz_config['type']](experiments_df, results_path, viz_config['args'])
-    
\ No newline at end of file
+    command_fns[args.command](args)
@@ -0,0 +1,159 @@
+import math
+import random
+from itertools import combinations
+from statistics import NormalDist
+from typing import Dict, List
+
+import pandas as pd
+from tqdm import tqdm
+
+from reference_matching import AMBIGUOUS
+
+# Lower bound on the variance of paired score differences, so a few unanimous questions
+# (e.g. 5 against 1 every time) don't give a zero-width interval
+MIN_VARIANCE = 1.0
+
+
+def look_alpha(confidence: float, look: int, n_comparisons: int) -> float:
+    """
+    Error rate spent on one pair at the look-th check. The shares 6 / (pi^2 k^2) sum to 1 over
+    all looks k, and are split evenly over the pairs (Bonferroni), so the chance that any pair
+    is ever wrongly decided stays below 1 - confidence however often the intervals are checked.
+    """
+    return (1 - confidence) * 6 / (math.pi ** 2 * look ** 2) / max(n_comparisons, 1)
+
+
+def paired_interval(scores_a: Dict[str, float], scores_b: Dict[str, float], confidence: float,
+                    look: int = 1, n_comparisons: int = 1, min_variance: float = MIN_VARIANCE) -> dict:
+    # Paired difference (a - b) over the questions both experiments have answered
+    common = [qid for qid in scores_a if qid in scores_b]
+    diffs = [scores_a[qid] - scores_b[qid] for qid in common]
+    n = len(diffs)
+    if n < 2:
+        return {'n': n, 'mean_diff': math.nan, 'lower': -math.inf, 'upper': math.inf}
+
+    mean = sum(diffs) / n
+    var = max(sum((d - mean) ** 2 for d in diffs) / (n - 1), min_variance)
+    alpha = look_alpha(confidence, look, n_comparisons)
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+    half_width = z * math.sqrt(var / n)
+    return {'n': n, 'mean_diff': mean, 'lower': mean - half_width, 'upper': mean + half_width, 'alpha': alpha}
+
+
+def compare_experiments(scores: Dict[str, Dict[str, float]], confidence: float, look: int = 1, min_variance: float = MIN_VARIANCE) -> List[dict]:
+    pairs = list(combinations(scores, 2))
+    intervals = []
+    for name_a, name_b in pairs:
+        interval = paired_interval(scores[name_a], scores[name_b], confidence, look, len(pairs), min_variance)
+        interval['experiment_a'] = name_a
+        interval['experiment_b'] = name_b
+        interval['decided'] = interval['lower'] > 0 or interval['upper'] < 0
+        intervals.append(interval)
+    return intervals
+
+
+def find_leader(scores: Dict[str, Dict[str, float]], intervals: List[dict]):
+    """Return the experiment with the highest mean score if it is separated from every other one."""
+    means = {name: sum(s.values()) / len(s) for name, s in scores.items() if s}
+    if len(means) < len(scores):
+        return None
+    leader = max(means, key=means.get)
+    for interval in intervals:
+        if leader not in (interval['experiment_a'], interval['experiment_b']):
+            continue
+        if not interval['decided']:
+            return None
+    return leader
+
+
+def max_calls_per_answer(experiment: dict) -> int:
+    # One answer call, plus a judge call unless answers are only matched against the reference.
+    # Hybrid evaluation may send any answer to the judge
+    eval_type = experiment['config']['evaluation'].get('eval_type', 'llm_judge')
+    return 1 if eval_type == 'reference_matching' else 2
+
+
+def run_adaptive(experiments: Dict[str, dict], answer_fn, judge_fn, adaptive_cfg: dict, seed: int = 0):
+    """
+    Interleave questions across experiments and stop once the best experiment is
+    separated from all others at the configured confidence, or the budget runs out.
+    - experiments: name -> prepared experiment, each with a 'task_dataset' and its 'config'
+    - answer_fn(experiment, qid) -> prediction dict, judge_fn(experiment, qid, prediction) -> result row
+    Returns the result rows collected so far, the stopping decision and the interval history.
+    """
+    confidence = adaptive_cfg.get('confidence', 0.95)
+    min_questions = adaptive_cfg.get('min_questions', 10)
+    check_every = adaptive_cfg.get('check_every', 1)
+    max_calls = adaptive_cfg.get('max_calls')
+    max_questions = adaptive_cfg.get('max_questions')
+    min_variance = adaptive_cfg.get('min_variance', MIN_VARIANCE)
+
+    question_ids = sorted(set().union(*(experiment['task_dataset'] for experiment in experiments.values())))
+    random.Random(seed).shuffle(question_ids)
+
+    # Most API calls a question can take across the experiments that ask it
+    calls_per_answer = {name: max_calls_per_answer(experiment) for name, experiment in experiments.items()}
+    question_calls = {
+        qid: sum(calls for name, calls in calls_per_answer.items() if qid in experiments[name]['task_dataset'])
+        for qid in question_ids
+    }
+
+    scores = {name: {} for name in experiments}
+    rows = []
+    history = []
+    api_calls = 0
+    decision = {'stopped_early': False, 'reason': 'exhausted', 'leader': None}
+
+    n_questions = 0
+    # Every check of the intervals is a look that spends part of the error rate
+    looks = 0
+    for qid in tqdm(question_ids):
+        if max_calls is not None and api_calls + question_calls[qid] > max_calls:
+            decision.update(stopped_early=True, reason='budget')
+            break
+        n_questions += 1
+
+        for name, experiment in experiments.items():
+            if qid not in experiment['task_dataset']:
+                continue
+            prediction = answer_fn(experiment, qid)
+            row = judge_fn(experiment, qid, prediction)
+            row['experiment'] = name
+            rows.append(row)
+            api_calls += 1 + (row.get('eval_method', 'llm_judge') == 'llm_judge')
+            # Reference matching could not score the answer, its score only marks that
+            if row.get('eval_method') == AMBIGUOUS:
+                continue
+            scores[name][qid] = row['score']
+
+        if n_questions < min_questions or n_questions % check_every != 0:
+            continue
+
+        looks += 1
+        intervals = compare_experiments(scores, confidence, looks, min_variance)
+        history.extend({'questions': n_questions, 'api_calls': api_calls, 'look': looks, **interval} for interval in intervals)
+
+        leader = find_leader(scores, intervals)
+        if leader is not None:
+            decision.update(stopped_early=n_questions < len(question_ids), reason='confidence', leader=leader)
+            break
+
+        if max_questions is not None and n_questions >= max_questions:
+            decision.update(stopped_early=True, reason='budget')
+            break
+
+    # Reported at the last look taken, so they agree with the decision
+    intervals = compare_experiments(scores, confidence, max(looks, 1), min_variance)
+    decision.update(
+        confidence=confidence,
+        looks=looks,
+        questions_evaluated=n_questions,
+        questions_total=len(question_ids),
+        api_calls=api_calls,
+        api_calls_full_sweep=sum(question_calls.values()),
+        final_intervals=intervals,
+    )
+    print(f"[INFO] Adaptive sweep stopped ({decision['reason']}) after "
+          f"{decision['questions_evaluated']}/{decision['questions_total']} questions, {api_calls} API calls")
+
+    return pd.DataFrame(rows), decision, pd.DataFrame(history)
@@ -0,0 +1,401 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from llm.interface import LLMClient, model_configs
+from models.serialization import serialization_functions
+from models.formats import DETAIL_KEYS
+from prompt_builder import load_scene, serialize_dataset, build_prompt
+
+DEFAULT_SERVICE_CFG = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'unix_socket': None,
+    'reload_interval_s': 2.0,
+    'answer_cache_size': 1024,
+    'latency_window': 1000,
+    'max_body_bytes': 1 << 20,
+}
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Coalescer:
+    """Runs one task per key at a time, concurrent callers with the same key share its result."""
+    def __init__(self):
+        self.in_flight = {}
+
+    async def run(self, key, factory):
+        """Return (result, shared) where shared tells whether another caller had started the work."""
+        task = self.in_flight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # A caller that disconnects must not cancel the work the others are waiting for
+        return await asyncio.shield(task), shared
+
+
+class Metrics:
+    """Request counters and latency percentiles over the last `window` observations."""
+    def __init__(self, window: int):
+        self.started = time.time()
+        self.window = window
+        self.counters = Counter()
+        self.latencies = {}
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def observe(self, name: str, seconds: float):
+        self.latencies.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def snapshot(self) -> dict:
+        latencies = {}
+        for name, values in self.latencies.items():
+            ordered = sorted(values)
+            percentile = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+            latencies[name] = {
+                'count': len(ordered),
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': percentile(0.5),
+                'p90_ms': percentile(0.9),
+                'p99_ms': percentile(0.99),
+                'max_ms': ordered[-1] * 1000,
+            }
+        return {'uptime_s': time.time() - self.started, 'counters': dict(self.counters), 'latency': latencies}
+
+
+class SceneStore:
+    """
+    Scene graphs of the dataset directory and their serialized representations, kept in memory.
+    refresh() loads new and changed files, drops removed ones and serializes the loaded scenes
+    with the default serialization again so the next question doesn't wait for it.
+    """
+    def __init__(self, dataset_cfg: dict, serialization_cfg: dict):
+        self.dataset_cfg = dataset_cfg
+        self.serialization_cfg = dict(serialization_cfg, verbose=False)
+        self.directory = Path(dataset_cfg['scene_dir'])
+        self.lock = threading.Lock()
+        self.scenes = {}
+        self.stamps = {}
+        # Bumped on every reload, so a serialization started before it isn't stored after it
+        self.generations = Counter()
+        self.reprs = {}
+
+    def _scan(self) -> dict:
+        stamps = {}
+        for file in self.directory.glob("*.json"):
+            stat = file.stat()
+            stamps[file.name] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """Returns the names of the scenes (re)loaded and removed."""
+        stamps = self._scan()
+        changed = [name for name, stamp in stamps.items() if self.stamps.get(name) != stamp]
+        removed = [name for name in self.stamps if name not in stamps]
+
+        loaded = []
+        for name in changed:
+            try:
+                scene_graph = load_scene(self.directory / name, self.dataset_cfg)
+            except Exception as e:
+                # Usually a file caught halfway through being written, it is retried on the next scan
+                print(f"[WARN] Could not load {name}: {type(e).__name__}: {e}")
+                continue
+            with self.lock:
+                self.scenes[name] = scene_graph
+                self.stamps[name] = stamps[name]
+                self.generations[name] += 1
+                self.reprs = {key: text for key, text in self.reprs.items() if key[0] != name}
+            loaded.append(name)
+
+        with self.lock:
+            for name in removed:
+                self.scenes.pop(name, None)
+                self.stamps.pop(name, None)
+                self.generations[name] += 1
+                self.reprs = {key: text for key, text in self.reprs.items() if key[0] != name}
+
+        for name in loaded:
+            self.serialize(name, tuple(self.serialization_cfg['type']), tuple(self.serialization_cfg['detail_keys']))
+        return loaded, removed
+
+    def resolve(self, scene_id: str) -> str:
+        for name in (scene_id, f"{scene_id}.json"):
+            if name in self.scenes:
+                return name
+        raise ServiceError(404, f"Unknown scene '{scene_id}', loaded scenes: {sorted(self.scenes)}")
+
+    def cached_repr(self, key: tuple):
+        return self.reprs.get(key)
+
+    def serialize(self, name: str, types: tuple, detail_keys: tuple) -> str:
+        key = (name, types, detail_keys)
+        with self.lock:
+            if key in self.reprs:
+                return self.reprs[key]
+            scene_graph = self.scenes[name]
+            generation = self.generations[name]
+
+        cfg = dict(self.serialization_cfg, type=list(types), detail_keys=list(detail_keys))
+        text = serialize_dataset({name: scene_graph}, cfg)[name]
+
+        with self.lock:
+            if self.generations[name] == generation:
+                self.reprs[key] = text
+        return text
+
+
+class SceneQueryService:
+    """Answers questions about warm scenes over HTTP: POST /query, GET /health, GET /metrics."""
+    def __init__(self, config: dict, dry_run: bool = False):
+        self.config = config
+        self.cfg = dict(DEFAULT_SERVICE_CFG, **(config.get('service') or {}))
+        self.store = SceneStore(config['dataset'], config['prompt']['serialization'])
+        self.clients = {cfg['model_name']: LLMClient(cfg, dry_run=dry_run) for cfg in model_configs(config['llm'])}
+        self.default_model = next(iter(self.clients))
+        # Same per-model concurrency as sweeps, the LLMClient rate limiter spaces the requests
+        self.slots = {model: asyncio.Semaphore(max(1, client.cfg.get('concurrency', 1))) for model, client in self.clients.items()}
+        self.executor = ThreadPoolExecutor(max_workers=sum(client.cfg.get('concurrency', 1) for client in self.clients.values()) + 4)
+        self.answers = OrderedDict()
+        self.coalescer = Coalescer()
+        self.metrics = Metrics(self.cfg['latency_window'])
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _call_model(self, client: LLMClient, prompt: str):
+        client.throttle()
+        start = time.perf_counter()
+        answer = client.query(prompt)
+        self.metrics.observe('llm', time.perf_counter() - start)
+        return answer
+
+    async def _ask(self, model: str, prompt: str):
+        async with self.slots[model]:
+            return await self._in_thread(self._call_model, self.clients[model], prompt)
+
+    async def _serialize(self, key: tuple) -> str:
+        start = time.perf_counter()
+        text = await self._in_thread(self.store.serialize, *key)
+        self.metrics.observe('serialize', time.perf_counter() - start)
+        return text
+
+    def _parse_query(self, request: dict) -> dict:
+        if not isinstance(request, dict):
+            raise ServiceError(400, "Expected a JSON object")
+        for field in ('scene_id', 'question'):
+            if not isinstance(request.get(field), str) or not request[field].strip():
+                raise ServiceError(400, f"'{field}' must be a non-empty string")
+
+        serialization_cfg = self.config['prompt']['serialization']
+        types = request.get('serialization') or serialization_cfg['type']
+        types = [types] if isinstance(types, str) else types
+        if not isinstance(types, list) or not all(isinstance(t, str) for t in types):
+            raise ServiceError(400, "'serialization' must be a string or a list of strings")
+        unknown = [t for t in types if t not in serialization_functions]
+        if unknown:
+            raise ServiceError(400, f"Unknown serialization {unknown}, choose from {list(serialization_functions)}")
+
+        detail_keys = request.get('detail_keys') or serialization_cfg['detail_keys']
+        detail_keys = [detail_keys] if isinstance(detail_keys, str) else detail_keys
+        if not isinstance(detail_keys, list) or not all(isinstance(key, str) for key in detail_keys):
+            raise ServiceError(400, "'detail_keys' must be a string or a list of strings")
+        unknown = [key for key in detail_keys if key != 'NA' and key not in DETAIL_KEYS]
+        if unknown:
+            raise ServiceError(400, f"Unknown detail keys {unknown}, choose from {list(DETAIL_KEYS) + ['NA']}")
+        detail_keys = ['NA'] if 'NA' in detail_keys else list(dict.fromkeys(detail_keys))
+
+        model = request.get('model') or self.default_model
+        if model not in self.clients:
+            raise ServiceError(400, f"Unknown model '{model}', choose from {list(self.clients)}")
+
+        return {
+            'scene': self.store.resolve(request['scene_id']),
+            'question': request['question'],
+            'types': tuple(dict.fromkeys(types)),
+            'detail_keys': tuple(detail_keys),
+            'model': model,
+        }
+
+    async def query(self, request: dict) -> dict:
+        query = self._parse_query(request)
+        repr_key = (query['scene'], query['types'], query['detail_keys'])
+
+        scene_repr = self.store.cached_repr(repr_key)
+        if scene_repr is None:
+            self.metrics.count('serialization_misses')
+            scene_repr, _ = await self.coalescer.run(('serialize',) + repr_key, lambda: self._serialize(repr_key))
+
+        prompt = build_prompt(scene_repr, query['question'], self.config['prompt'])
+        answer_key = (query['model'], hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+
+        cached = answer_key in self.answers
+        coalesced = False
+        if cached:
+            self.answers.move_to_end(answer_key)
+            answer = self.answers[answer_key]
+            self.metrics.count('answer_cache_hits')
+        else:
+            answer, coalesced = await self.coalescer.run(('answer',) + answer_key, lambda: self._ask(query['model'], prompt))
+            self.metrics.count('coalesced' if coalesced else 'llm_calls')
+            if self.cfg['answer_cache_size'] > 0:
+                self.answers[answer_key] = answer
+                while len(self.answers) > self.cfg['answer_cache_size']:
+                    self.answers.popitem(last=False)
+
+        return {
+            'scene_id': query['scene'],
+            'question': query['question'],
+            'serialization': list(query['types']),
+            'detail_keys': list(query['detail_keys']),
+            'model': query['model'],
+            'answer': answer,
+            'cached': cached,
+            'coalesced': coalesced,
+        }
+
+    def health(self) -> dict:
+        return {
+            'status': 'ok',
+            'scenes': sorted(self.store.scenes),
+            'models': list(self.clients),
+            'in_flight': len(self.coalescer.in_flight),
+            'uptime_s': time.time() - self.metrics.started,
+        }
+
+    async def _read_request(self, reader) -> Tuple[str, str, bytes]:
+        request_line = await reader.readline()
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ServiceError(400, "Malformed request line")
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ServiceError(400, f"Invalid Content-Length '{headers['content-length']}'")
+        if length > self.cfg['max_body_bytes']:
+            raise ServiceError(413, f"Body over {self.cfg['max_body_bytes']} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method, target.split('?', 1)[0], body
+
+    async def _route(self, method: str, path: str, body: bytes) -> dict:
+        routes = {'/query': 'POST', '/health': 'GET', '/metrics': 'GET'}
+        if path not in routes:
+            raise ServiceError(404, f"No endpoint {path}, use {list(routes)}")
+        if method != routes[path]:
+            raise ServiceError(405, f"{path} only accepts {routes[path]}")
+
+        if path == '/health':
+            return self.health()
+        if path == '/metrics':
+            return dict(self.metrics.snapshot(), scenes=len(self.store.scenes), serialized=len(self.store.reprs), cached_answers=len(self.answers))
+        try:
+            request = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            raise ServiceError(400, f"Invalid JSON: {e}")
+        return await self.query(request)
+
+    async def handle(self, reader, writer):
+        start = time.perf_counter()
+        path = None
+        try:
+            method, path, body = await self._read_request(reader)
+            status, payload = 200, await self._route(method, path, body)
+        except ServiceError as e:
+            status, payload = e.status, {'error': e.message}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        self.metrics.count(f"status_{status}")
+        if path in ('/query', '/health', '/metrics'):
+            self.metrics.observe(path, time.perf_counter() - start)
+
+        data = json.dumps(payload, default=str).encode('utf-8')
+        header = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n"
+        )
+        try:
+            writer.write(header.encode('latin-1') + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def watch_scenes(self):
+        """Reload scene files that changed on disk every reload_interval_s."""
+        while True:
+            await asyncio.sleep(self.cfg['reload_interval_s'])
+            try:
+                loaded, removed = await self._in_thread(self.store.refresh)
+            except Exception as e:
+                print(f"[WARN] Scene reload failed: {type(e).__name__}: {e}")
+                continue
+            if loaded or removed:
+                self.metrics.count('scene_reloads', len(loaded))
+                print(f"[INFO] Reloaded {loaded}, removed {removed}")
+
+    async def serve(self):
+        loaded, _ = await self._in_thread(self.store.refresh)
+        if self.cfg['unix_socket']:
+            server = await asyncio.start_unix_server(self.handle, path=self.cfg['unix_socket'])
+            address = f"unix:{self.cfg['unix_socket']}"
+        else:
+            server = await asyncio.start_server(self.handle, self.cfg['host'], self.cfg['port'])
+            host, port = server.sockets[0].getsockname()[:2]
+            address = f"http://{host}:{port}"
+
+        watcher = asyncio.create_task(self.watch_scenes())
+        print(f"[INFO] Serving {len(loaded)} scenes with {', '.join(self.clients)} on {address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_service(config: dict, dry_run: bool = False):
+    try:
+        asyncio.run(SceneQueryService(config, dry_run=dry_run).serve())
+    except KeyboardInterrupt:
+        print("[INFO] Service stopped")
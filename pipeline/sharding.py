@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import re
+from typing import List, Tuple
+
+import pandas as pd
+
+MANIFEST_FILE = "shard_manifest.json"
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse "i/N" (0 <= i < N) into (i, N)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', shard or '')
+    if not match:
+        raise ValueError(f"--shard must look like i/N, got '{shard}'")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"--shard index must be between 0 and {count - 1}, got '{shard}'")
+    return index, count
+
+
+def shard_of(experiment_name: str, task: str, num_shards: int) -> int:
+    # Stable across machines and Python processes, unlike hash()
+    digest = hashlib.sha256(f"{experiment_name}\0{task}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+def config_hash(base_config: dict, experiments_config: dict) -> str:
+    return hashlib.sha256(json.dumps([base_config, experiments_config], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def row_items(df: pd.DataFrame) -> List[Tuple[str, str]]:
+    # Work item of every result row: (experiment, task id as in the task dataset)
+    return list(zip(df['experiment'], df['question_type'].astype(str) + '_' + df['question_id'].astype(str)))
+
+
+def build_manifest(shard: Tuple[int, int], cfg_hash: str, all_items: list, shard_items: list) -> dict:
+    return {
+        'shard': shard[0],
+        'num_shards': shard[1],
+        'config_hash': cfg_hash,
+        'all_items': [list(item) for item in all_items],
+        'items': [list(item) for item in shard_items],
+    }
+
+
+def load_shard(results_path: str) -> (dict, pd.DataFrame):
+    with open(os.path.join(results_path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    results = pd.read_csv(os.path.join(results_path, "raw_experiment_results.csv"), dtype={'question_id': str})
+    return manifest, results
+
+
+def merge_shards(results_paths: List[str]) -> pd.DataFrame:
+    """
+    Combine the results of every shard of a sweep, in the order an unsharded run produces them.
+    Raises ValueError listing every problem: shards of different sweeps or configs, missing or
+    repeated shards, and missing, unexpected or duplicate work items.
+    """
+    shards = [(path,) + load_shard(path) for path in results_paths]
+    errors = []
+
+    reference_path, reference, _ = shards[0]
+    for path, manifest, _ in shards[1:]:
+        if manifest['config_hash'] != reference['config_hash']:
+            errors.append(f"{path}: configs differ from {reference_path}")
+        if manifest['num_shards'] != reference['num_shards']:
+            errors.append(f"{path}: is one of {manifest['num_shards']} shards, {reference_path} of {reference['num_shards']}")
+        if manifest['all_items'] != reference['all_items']:
+            errors.append(f"{path}: covers different experiments or tasks than {reference_path}")
+
+    indices = [manifest['shard'] for _, manifest, _ in shards]
+    missing_shards = sorted(set(range(reference['num_shards'])) - set(indices))
+    repeated_shards = sorted({index for index in indices if indices.count(index) > 1})
+    if missing_shards:
+        errors.append(f"missing shards: {missing_shards}")
+    if repeated_shards:
+        errors.append(f"shards given more than once: {repeated_shards}")
+
+    expected = [tuple(item) for item in reference['all_items']]
+    # A work item has one result per answer model
+    counts = {}
+    seen = set()
+    for path, manifest, results in shards:
+        assigned = {tuple(item) for item in manifest['items']}
+        produced = row_items(results)
+        unexpected = set(produced) - assigned
+        if unexpected:
+            errors.append(f"{path}: {len(unexpected)} results outside its shard, e.g. {sorted(unexpected)[0]}")
+        not_produced = assigned - set(produced)
+        if not_produced:
+            errors.append(f"{path}: {len(not_produced)} work items without results, e.g. {sorted(not_produced)[0]}")
+        models = results['model'] if 'model' in results else [None] * len(results)
+        for item, model in zip(produced, models):
+            counts[item, model] = counts.get((item, model), 0) + 1
+            seen.add(item)
+
+    duplicates = sorted(item for (item, _), count in counts.items() if count > 1)
+    if duplicates:
+        errors.append(f"{len(duplicates)} work items have more than one result, e.g. {duplicates[0]}")
+    missing = [item for item in expected if item not in seen]
+    if missing and not missing_shards:
+        errors.append(f"{len(missing)} work items have no result, e.g. {missing[0]}")
+
+    if errors:
+        raise ValueError("\n".join(errors))
+
+    merged = pd.concat([results for _, _, results in shards], ignore_index=True)
+    order = {item: i for i, item in enumerate(expected)}
+    merged['_order'] = [order[item] for item in row_items(merged)]
+    return merged.sort_values('_order', kind='stable').drop(columns='_order').reset_index(drop=True)
@@ -0,0 +1,57 @@
+from typing import Dict, List
+
+import pandas as pd
+
+from models.scene_index import SceneIndex, select_rooms
+from reference_matching import normalize_answers, normalize_labels, extract_room_ids, extract_labels, ROOM_PATTERN, OBJECT_ID_PATTERN
+
+# Negations, comparisons and quantifiers over rooms, on normalized text ("none" reads as 0,
+# "doesn't" as "doesn t"). Their answers can lie in rooms without the mentioned labels
+COMPARES_PATTERN = (
+    r'\b(?:no|not|\w+n t|0|without|lacks?|lacking|missing|empty'
+    r'|most|least|more|less|fewer|fewest|than|compared?'
+    r'|largest|smallest|biggest|highest|lowest|every|each|all|only)\b'
+)
+
+
+def analyze_queries(queries: pd.Series, labels: List[str]) -> pd.DataFrame:
+    """
+    Room ids and object labels (as labelspace names) mentioned by every query, and whether it
+    is negative or compares rooms.
+    """
+    text = normalize_answers(queries)
+    # "room no 3" and "id 0" name a room or object, they don't negate anything
+    ids_removed = text.str.replace(ROOM_PATTERN, ' ', regex=True).str.replace(OBJECT_ID_PATTERN, ' ', regex=True)
+    # extract_labels matches normalized labels ("swivel chair"), map them back to labelspace names
+    label_names = {}
+    for name, normalized in zip(labels, normalize_labels(labels)):
+        label_names.setdefault(normalized, []).append(name)
+
+    return pd.DataFrame({
+        'room_ids': extract_room_ids(text).map(lambda ids: frozenset(int(i) for i in ids)),
+        'labels': extract_labels(text, labels).map(
+            lambda found: frozenset(name for label in found for name in label_names.get(label, ()))
+        ),
+        'compares': ids_removed.str.contains(COMPARES_PATTERN, regex=True),
+    }, index=queries.index)
+
+
+def select_task_subgraphs(task_dataset: dict, indices: Dict[str, SceneIndex], labels: List[str], hops: int = 1) -> Dict[str, dict]:
+    """
+    Rooms to serialize for every task, or None for the full scene.
+    Returns task id -> {'rooms': frozenset or None, 'reason': why they were selected}.
+    """
+    queries = pd.Series({task: task_dataset[task]['query'] for task in task_dataset}, dtype=object)
+    if queries.empty:
+        return {}
+    mentions = analyze_queries(queries, labels)
+
+    selections = {}
+    for task, row in mentions.iterrows():
+        rooms, reason = select_rooms(indices[task_dataset[task]['scene_id']], row['room_ids'], row['labels'], hops, row['compares'])
+        selections[task] = {'rooms': None if rooms is None else frozenset(rooms), 'reason': reason}
+    return selections
+
+
+def format_rooms(rooms) -> str:
+    return 'all' if rooms is None else ','.join(str(room_id) for room_id in sorted(rooms))
@@ -1,4 +1,3 @@
-import pandas as pd
 import os
 
 FILES = {
@@ -9,6 +8,9 @@ FILES = {
 }
 
 def load_task_dataset(cfg):
+    # pandas is only needed to read the tasks, validate imports FILES without it
+    import pandas as pd
+
     files = FILES[cfg['task']]
     directory = cfg['task_path']
 
@@ -6,6 +6,34 @@ import argparse
 import yaml
 import numpy as np
 
+from bootstrap import QuestionBootstrap, error_bars
+
+
+def ci_barplot(table, x, hue=None, ax=None):
+    """Bars of ci_table accuracies with their bootstrap intervals as error bars."""
+    ax = ax or plt.gca()
+    xs = list(dict.fromkeys(table[x]))
+    hues = list(dict.fromkeys(table[hue])) if hue else [None]
+    width = 0.8 / len(hues)
+    palette = sns.color_palette(n_colors=len(hues))
+    for i, hue_value in enumerate(hues):
+        subset = table if hue is None else table[table[hue] == hue_value]
+        subset = subset.set_index(x).reindex(xs)
+        positions = np.arange(len(xs)) - 0.4 + width * (i + 0.5)
+        ax.bar(positions, subset['accuracy'], width, color=palette[i], label=hue_value)
+        ax.errorbar(positions, subset['accuracy'], yerr=error_bars(subset), fmt='none', ecolor='black', capsize=3)
+    ax.set_xticks(np.arange(len(xs)))
+    ax.set_xticklabels(xs)
+    ax.set_xlabel(x)
+
+
+def ci_lineplot(table, x, hue=None, ax=None):
+    """Lines of ci_table accuracies with their bootstrap intervals as error bars."""
+    ax = ax or plt.gca()
+    groups = table.groupby(hue, sort=False) if hue else [(None, table)]
+    for hue_value, subset in groups:
+        ax.errorbar(subset[x], subset['accuracy'], yerr=error_bars(subset), marker='o', capsize=3, label=hue_value)
+    ax.set_xlabel(x)
 
 
 
@@ -19,12 +47,23 @@ def plot_serialization_results(experiment_dataframe, results_dir, args):
     # Set Seaborn style
     sns.set(style="whitegrid", palette="muted")
 
+    # Bootstrap intervals over questions, the same resamples for every table
+    bootstrap = QuestionBootstrap(experiment_dataframe)
+    acc_by_serial = bootstrap.ci_table(['serialization'])
+    grouped_acc = bootstrap.ci_table(['serialization', 'question_type'])
+    acc_by_serial.to_csv(f"{results_dir}/accuracy_ci_by_serialization.csv", index=False)
+    grouped_acc.to_csv(f"{results_dir}/accuracy_ci_by_serialization_and_question_type.csv", index=False)
+    differences = pd.concat([
+        bootstrap.paired_differences(['question_type']),
+        bootstrap.paired_differences([]).assign(question_type='all'),
+    ], ignore_index=True)
+    differences.to_csv(f"{results_dir}/paired_differences_by_serialization.csv", index=False)
+
     # ----------------------------
     # Plot 1: Accuracy by Serialization Method
     # ----------------------------
     plt.figure(figsize=(8, 6))
-    acc_by_serial = experiment_dataframe.groupby('serialization')['correct'].mean().reset_index()
-    sns.barplot(data=acc_by_serial, x='serialization', y='correct')
+    ci_barplot(acc_by_serial, x='serialization')
     plt.title('Accuracy by Serialization Method')
     plt.ylabel('Accuracy (% Correct)')
     plt.ylim(0, 1.1)
@@ -36,13 +75,7 @@ def plot_serialization_results(experiment_dataframe, results_dir, args):
     # Plot 2: Accuracy by Serialization × Question Type
     # ----------------------------
     plt.figure(figsize=(10, 6))
-    grouped_acc = (
-        experiment_dataframe
-        .groupby(['serialization', 'question_type'])['correct']
-        .mean()
-        .reset_index()
-    )
-    sns.barplot(data=grouped_acc, x='question_type', y='correct', hue='serialization')
+    ci_barplot(grouped_acc, x='question_type', hue='serialization')
     plt.title('Accuracy by Serialization and Question Type')
     plt.ylabel('Accuracy (% Correct)')
     plt.ylim(0, 1.1)
@@ -116,12 +149,19 @@ def plot_attribute_analysis_single_serialization(experiment_dataframe, results_d
 
     sns.set(style="whitegrid", palette="muted")
 
+    bootstrap = QuestionBootstrap(df)
+    acc_by_attr = bootstrap.ci_table(['num_attributes'])
+    acc_by_attr_type = bootstrap.ci_table(['num_attributes', 'question_type'])
+    acc_by_attr_type.to_csv(f"{results_dir}/accuracy_ci_by_attr_and_type_{serialization_type}.csv", index=False)
+    bootstrap.paired_differences(['question_type'], compare='num_attributes').to_csv(
+        f"{results_dir}/paired_differences_by_attr_count_{serialization_type}.csv", index=False
+    )
+
     # ----------------------------
     # Plot 1: Accuracy by Number of Attributes (Line)
     # ----------------------------
     plt.figure(figsize=(8, 6))
-    acc_by_attr = df.groupby('num_attributes')['correct'].mean().reset_index()
-    sns.lineplot(data=acc_by_attr, x='num_attributes', y='correct', marker='o')
+    ci_lineplot(acc_by_attr, x='num_attributes')
     plt.title(f'Accuracy vs. Number of Attributes ({serialization_type})')
     plt.ylabel('Accuracy')
     plt.xlabel('Number of Attributes')
@@ -135,8 +175,7 @@ def plot_attribute_analysis_single_serialization(experiment_dataframe, results_d
     # Plot 2: Accuracy by Number of Attributes (Bar)
     # ----------------------------
     plt.figure(figsize=(8, 6))
-    acc_by_cat = df.groupby('num_attr_cat')['correct'].mean().reset_index()
-    sns.barplot(data=acc_by_cat, x='num_attr_cat', y='correct')
+    ci_barplot(acc_by_attr.assign(num_attr_cat=acc_by_attr['num_attributes'].astype(str)), x='num_attr_cat')
     plt.title(f'Accuracy by Number of Attributes ({serialization_type})')
     plt.ylabel('Accuracy')
     plt.xlabel('Number of Attributes')
@@ -161,8 +200,8 @@ def plot_attribute_analysis_single_serialization(experiment_dataframe, results_d
     # Plot 4: Accuracy vs Number of Attributes × Question Type
     # ----------------------------
     plt.figure(figsize=(10, 6))
-    acc_by_attr_type = df.groupby(['num_attr_cat', 'question_type'])['correct'].mean().reset_index()
-    sns.lineplot(data=acc_by_attr_type, x='num_attr_cat', y='correct', hue='question_type', marker='o')
+    ci_lineplot(acc_by_attr_type, x='num_attributes', hue='question_type')
+    plt.legend(title='question_type')
     plt.title(f'Accuracy by Num Attributes and Question Type ({serialization_type})')
     plt.ylabel('Accuracy')
     plt.xlabel('Number of Attributes')
@@ -176,6 +215,30 @@ def plot_multi_serialization_analysis(experiment_dataframe, results_dir, args):
     return
 
 
+def plot_model_comparison(experiment_dataframe, results_dir):
+    os.makedirs(results_dir, exist_ok=True)
+    df = experiment_dataframe.copy()
+    df['correct'] = df['score'] > 3.5
+
+    sns.set(style="whitegrid", palette="muted")
+
+    acc = QuestionBootstrap(df).ci_table(['model', 'serialization', 'question_type'])
+    acc.to_csv(f"{results_dir}/accuracy_ci_by_model.csv", index=False)
+    models = list(dict.fromkeys(acc['model']))
+    fig, axes = plt.subplots(1, len(models), figsize=(6 * len(models), 6), sharey=True)
+    for ax, model in zip(np.atleast_1d(axes), models):
+        ci_barplot(acc[acc['model'] == model], x='question_type', hue='serialization', ax=ax)
+        ax.set_title(model)
+        ax.set_xlabel('Question Type')
+        ax.set_ylim(0, 1.1)
+    np.atleast_1d(axes)[0].set_ylabel('Accuracy (% Correct)')
+    np.atleast_1d(axes)[-1].legend(title='Serialization')
+    fig.suptitle('Accuracy by Model, Serialization and Question Type')
+    fig.tight_layout()
+    fig.savefig(f"{results_dir}/0_accuracy_by_model.png")
+    plt.close(fig)
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Load config file")
     parser.add_argument('--results_path', type=str, default='results/logs/experiment_20250620_230756', help="Results Directory to Update")
@@ -188,20 +251,34 @@ vizualize_fns = {
 }
 
 
-if __name__ == '__main__':
-    args = parse_args()
+def visualize(experiment_dataframe, results_dir, viz_config):
+    """Draw the configured plots, faceted by answer model when several models were run."""
+    plot_fn = vizualize_fns[viz_config['type']]
+    models = experiment_dataframe['model'].dropna().unique() if 'model' in experiment_dataframe else []
+    if len(models) < 2:
+        plot_fn(experiment_dataframe, results_dir, viz_config['args'])
+        return
 
+    plot_model_comparison(experiment_dataframe, results_dir)
+    for model in models:
+        subset = experiment_dataframe[experiment_dataframe['model'] == model].copy()
+        plot_fn(subset, os.path.join(results_dir, f"model_{model}"), viz_config['args'])
 
-    experiment_config = f"{args.results_path}/configs/experiment_config.yaml"
+
+def plot_results(results_path):
+    """Redraw the plots of a saved experiment from its configs and condensed results."""
+    experiment_config = f"{results_path}/configs/experiment_config.yaml"
     with open(experiment_config, "r") as f:
         experiments_config = yaml.safe_load(f)
 
     viz_config = experiments_config['visualization']
 
-    experiment_results = f"{args.results_path}/condensed_experiment_results.csv"
+    experiment_results = f"{results_path}/condensed_experiment_results.csv"
     experiments_df = pd.read_csv(experiment_results)
 
-    if viz_config['type'] == 'serialization':
-        plot_serialization_results(experiments_df, args.results_path)
-    else:
-        plot_attribute_analysis_single_serialization(experiments_df, args.results_path, viz_config['args'])
+    visualize(experiments_df, results_path, viz_config)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    plot_results(args.results_path)
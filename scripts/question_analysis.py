@@ -3,9 +3,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
 from pathlib import Path
 from collections import defaultdict
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'pipeline'))
+
+from bootstrap import QuestionBootstrap
+from visualize import ci_barplot
+
 def load_and_prepare_data(results_dir):
     """Load and prepare the experiment data."""
     df = pd.read_csv(results_dir / 'raw_experiment_results.csv')
@@ -101,6 +107,32 @@ def create_question_breakdown(df, output_dir, top_n=10):
     
     return question_serialization_perf
 
+def create_accuracy_intervals(df, output_dir):
+    """
+    Bootstrap confidence intervals of the accuracy of every serialization per question type
+    and number of attributes, and of the paired differences between serializations.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    bootstrap = QuestionBootstrap(df)
+    intervals = bootstrap.ci_table(['serialization', 'question_type', 'num_attributes'])
+    intervals.to_csv(output_dir / 'accuracy_ci.csv', index=False)
+    differences = bootstrap.paired_differences(['question_type', 'num_attributes'])
+    differences.to_csv(output_dir / 'paired_differences.csv', index=False)
+
+    by_type = bootstrap.ci_table(['serialization', 'question_type'])
+    plt.figure(figsize=(10, 6))
+    ci_barplot(by_type, x='question_type', hue='serialization')
+    plt.title('Accuracy by Serialization and Question Type (95% bootstrap CI)')
+    plt.ylabel('Accuracy (% Correct)')
+    plt.ylim(0, 1.1)
+    plt.legend(title='Serialization')
+    plt.tight_layout()
+    plt.savefig(output_dir / 'accuracy_ci_by_question_type.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+    return intervals, differences
+
 def main():
     # Set paths
     results_dir = Path('/home/anaveen/Documents/mit_research_ws/01_dsg_prompting/dsg_llm_eval/results/logs/experiment_20250620_213816')
@@ -113,10 +145,14 @@ def main():
     # Create question breakdowns
     print("\nAnalyzing individual question performance...")
     question_breakdown = create_question_breakdown(df, output_dir, top_n=5)
+
+    print("\nComputing bootstrap confidence intervals...")
+    intervals, differences = create_accuracy_intervals(df, output_dir)
     
     print(f"\nAnalysis complete! Results saved to: {output_dir}")
     print(f"- Question breakdown: {output_dir}/question_breakdown_*.png")
     print(f"- Detailed metrics: {output_dir}/question_breakdown.csv")
+    print(f"- Confidence intervals: {output_dir}/accuracy_ci.csv, {output_dir}/paired_differences.csv")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+PIPELINE_DIR = Path(__file__).resolve().parent.parent / 'pipeline'
+sys.path.insert(0, str(PIPELINE_DIR))
+
+from models.serialization import serialization_functions
+from planner import count_tokens
+from prompt_builder import load_dataset
+
+# The detail key sets of configs/experiment_attributes.yaml
+DETAIL_KEY_SETS = [
+    ['NA'],
+    ['bounding_box'],
+    ['bounding_box', 'position'],
+    ['bounding_box', 'position', 'world_R_object'],
+]
+
+
+def count_scene_tokens(scene_graphs, formats, detail_key_sets, model_name):
+    rows = []
+    for detail_keys in detail_key_sets:
+        for serialize_type in formats:
+            for name, scene_graph in scene_graphs.items():
+                try:
+                    encoding = serialization_functions[serialize_type](scene_graph, detail_keys)
+                except Exception as e:
+                    print(f"[WARN] {serialize_type} cannot serialize {name} with {detail_keys}: {type(e).__name__}")
+                    continue
+                rows.append({
+                    'scene': name,
+                    'serialization': serialize_type,
+                    'detail_keys': '-'.join(detail_keys),
+                    'num_attributes': 0 if 'NA' in detail_keys else len(detail_keys),
+                    'characters': len(encoding),
+                    'tokens': count_tokens(encoding, model_name),
+                })
+    return pd.DataFrame(rows)
+
+
+def plot_tokens(df, output_dir):
+    sns.set_theme(style="whitegrid", palette="muted")
+    plt.figure(figsize=(12, 6))
+    sns.barplot(data=df, x='num_attributes', y='tokens', hue='serialization', errorbar=None)
+    plt.title("Mean Tokens per Scene by Serialization")
+    plt.xlabel("Number of Attributes")
+    plt.ylabel("Tokens per Scene")
+    plt.tight_layout()
+    plt.savefig(output_dir / 'tokens_per_scene.png')
+    plt.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare tokens per scene across serialization formats")
+    parser.add_argument('--scene_dir', type=str, default='data/scenes/scene_graphs', help="Directory with the JSON scene graphs")
+    parser.add_argument('--formats', nargs='+', default=list(serialization_functions), help="Serialization types to compare")
+    parser.add_argument('--model_name', type=str, default='gpt-4o-mini', help="Model whose tokenizer is used")
+    parser.add_argument('--output_dir', type=str, default='results/token_comparison', help="Directory for the CSV and plot")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output_dir = Path(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    scene_graphs = load_dataset({'scene_dir': args.scene_dir})
+    df = count_scene_tokens(scene_graphs, args.formats, DETAIL_KEY_SETS, args.model_name)
+    df.to_csv(output_dir / 'tokens_per_scene.csv', index=False)
+
+    summary = df.pivot_table(index='serialization', columns='detail_keys', values='tokens', aggfunc='mean')
+    summary = summary[[keys for keys in map('-'.join, DETAIL_KEY_SETS) if keys in summary.columns]]
+    print(summary.round(0).to_string())
+
+    plot_tokens(df, output_dir)
+    print(f"\nResults saved to: {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
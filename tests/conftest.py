@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The pipeline modules import each other as top-level modules
+for path in (ROOT, os.path.join(ROOT, 'pipeline')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+LABELS = ['chair', 'desk', 'sofa', 'light', 'swivel chair']
+
+
+def make_scene(seed: int = 0, n_rooms: int = 3, objects_per_place: int = 3):
+    """A small scene: rooms in a row, two places per room and random objects with bounding boxes."""
+    import numpy as np
+    import spark_dsg as dsg
+
+    rng = np.random.default_rng(seed)
+    scene_graph = dsg.DynamicSceneGraph()
+    scene_graph.set_labelspace(dsg.Labelspace(dict(enumerate(LABELS))), 2, 0)
+    place_id = object_id = 0
+    for room_id in range(n_rooms):
+        room_attrs = dsg.RoomNodeAttributes()
+        room_attrs.position = rng.random(3)
+        scene_graph.add_node(dsg.DsgLayers.ROOMS, dsg.NodeSymbol('R', room_id), room_attrs)
+        for _ in range(2):
+            place_attrs = dsg.PlaceNodeAttributes()
+            place_attrs.position = rng.random(3)
+            scene_graph.add_node(dsg.DsgLayers.PLACES, dsg.NodeSymbol('p', place_id), place_attrs)
+            scene_graph.insert_edge(dsg.NodeSymbol('R', room_id), dsg.NodeSymbol('p', place_id))
+            for _ in range(objects_per_place):
+                object_attrs = dsg.ObjectNodeAttributes()
+                object_attrs.position = rng.random(3) * 5
+                object_attrs.semantic_label = int(rng.integers(0, len(LABELS)))
+                object_attrs.bounding_box = dsg.BoundingBox(rng.random(3), rng.random(3))
+                scene_graph.add_node(dsg.DsgLayers.OBJECTS, dsg.NodeSymbol('O', object_id), object_attrs)
+                scene_graph.insert_edge(dsg.NodeSymbol('p', place_id), dsg.NodeSymbol('O', object_id))
+                object_id += 1
+            place_id += 1
+    for room_id in range(n_rooms - 1):
+        scene_graph.insert_edge(dsg.NodeSymbol('R', room_id), dsg.NodeSymbol('R', room_id + 1))
+    return scene_graph
+
+
+@pytest.fixture
+def scene_file(tmp_path):
+    path = tmp_path / 'scene_a.json'
+    make_scene().save(str(path))
+    return path
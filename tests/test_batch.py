@@ -0,0 +1,117 @@
+import json
+import os
+
+import pandas as pd
+
+import experiment as experiment_module
+from evaluator import build_judge_prompt, evaluate_summary, rescore_results
+from llm.batch import ReplayClient, answer_id, batch_judge, batch_request, parse_output, prompt_id, run_jobs, write_job
+
+LLM_CFG = {'model_name': 'gpt-4o', 'temperature': 0, 'max_tokens': 10, 'mode': 'text'}
+REPLY = '[local batch] gpt-4o'
+
+
+def batch_cfg(tmp_path):
+    return {'backend': 'local', 'job_dir': str(tmp_path), 'local_delay_s': 0, 'poll_interval_s': 0}
+
+
+def test_custom_ids_are_stable(tmp_path):
+    assert answer_id('baseline', 'count_1') == 'answer-baseline-count_1'
+    assert prompt_id('How many chairs?') == prompt_id('How many chairs?') != prompt_id('How many tables?')
+
+    requests = [batch_request(answer_id('baseline', task), LLM_CFG, task) for task in ('count_1', 'count_2', 'count_1')]
+    job_path = write_job(str(tmp_path), 'answer', 'gpt-4o', requests)
+    assert write_job(str(tmp_path), 'answer', 'gpt-4o', requests[:2]) == job_path
+    with open(job_path) as f:
+        assert [json.loads(line)['custom_id'] for line in f] == ['answer-baseline-count_1', 'answer-baseline-count_2']
+
+
+def test_rerun_resumes_submitted_jobs(tmp_path):
+    requests = {'gpt-4o': [batch_request(answer_id('baseline', task), LLM_CFG, task) for task in ('count_1', 'count_2')]}
+    expected = {'gpt-4o': {'answer-baseline-count_1': REPLY, 'answer-baseline-count_2': REPLY}}
+
+    assert run_jobs('answer', requests, batch_cfg(tmp_path)) == expected
+    assert run_jobs('answer', requests, batch_cfg(tmp_path)) == expected
+    assert len(os.listdir(tmp_path / 'local_backend')) == 1
+
+
+def test_judge_replays_batch_replies(tmp_path):
+    prompts = ['Judge answer 1', 'Judge answer 2', 'Judge answer 1']
+    asked = []
+
+    def judge_fn(i, evaluator):
+        asked.append(type(evaluator).__name__)
+        return [evaluator.query(prompt) for prompt in prompts]
+
+    assert batch_judge(judge_fn, [LLM_CFG], batch_cfg(tmp_path)) == [[REPLY] * 3]
+    assert asked == ['PromptRecorder', 'ReplayClient']
+
+
+def test_failed_requests_have_no_reply():
+    lines = [
+        {'custom_id': 'a', 'response': {'status_code': 200, 'body': {'choices': [{'message': {'content': 'yes'}}]}}, 'error': None},
+        {'custom_id': 'b', 'response': {'status_code': 500, 'body': {}}, 'error': None},
+        {'custom_id': 'c', 'response': None, 'error': {'message': 'expired'}},
+    ]
+    assert parse_output("\n".join(json.dumps(line) for line in lines)) == {'a': 'yes', 'b': None, 'c': None}
+
+
+JUDGE_TEMPLATE = 'Q: {{question}} A: {{ground_truth}} P: {{predicted}}'
+TASKS = {
+    'object-count_1': {'query': 'How many chairs?', 'answer': '2'},
+    'object-count_2': {'query': 'How many sofas?', 'answer': '1'},
+}
+
+
+def eval_cfg(tmp_path, eval_type='llm_judge'):
+    template = tmp_path / 'judge.txt'
+    template.write_text(JUDGE_TEMPLATE)
+    return {'eval_type': eval_type, 'llm': LLM_CFG, 'expected_template': str(template)}
+
+
+def test_unanswered_judge_requests_are_left_out(tmp_path):
+    predictions = {task: {'answer': '2', 'elapsed_time': None} for task in TASKS}
+    # The judge job only has a reply for the first answer
+    replies = {prompt_id(build_judge_prompt(JUDGE_TEMPLATE, 'How many chairs?', '2', '2')): '5'}
+    serialization_cfg = {'type': ['json'], 'detail_keys': ['NA']}
+
+    results = evaluate_summary(predictions, TASKS, eval_cfg(tmp_path), serialization_cfg, evaluator=ReplayClient(LLM_CFG, replies))
+    assert list(results['question']) == ['How many chairs?']
+    assert list(results['score']) == [5.0]
+
+    # Hybrid evaluation: the first answer is matched locally, the second one needs the judge
+    predictions['object-count_2'] = {'answer': 'Either 1 or 2', 'elapsed_time': None}
+    results = evaluate_summary(predictions, TASKS, eval_cfg(tmp_path, 'hybrid'), serialization_cfg, labels=[], evaluator=ReplayClient(LLM_CFG, {}))
+    assert list(results['question']) == ['How many chairs?']
+    assert list(results['eval_method']) == ['reference_matching']
+
+    saved = pd.DataFrame({
+        'question': ['How many chairs?', 'How many sofas?'],
+        'ground_truth_answer': ['2', '1'],
+        'predicted_answer': ['2', '2'],
+        'score': [0, 0],
+    })
+    rescored = rescore_results(saved, eval_cfg(tmp_path), evaluator=ReplayClient(LLM_CFG, replies))
+    assert list(rescored['question']) == ['How many chairs?']
+    assert list(rescored['score']) == [5.0]
+
+
+def test_unanswered_answer_requests_are_left_out(tmp_path, monkeypatch):
+    def partial_jobs(stage, requests, cfg):
+        replies = run_jobs(stage, requests, cfg)
+        del replies['gpt-4o'][answer_id('baseline', 'object-count_2')]
+        return replies
+
+    monkeypatch.setattr(experiment_module, 'run_jobs', partial_jobs)
+    monkeypatch.setattr(experiment_module, 'task_prompt', lambda experiment, task: (experiment['task_dataset'][task]['query'], None))
+    prepared = {
+        'config': {'evaluation': eval_cfg(tmp_path), 'prompt': {'serialization': {'type': ['json'], 'detail_keys': ['NA']}}},
+        'task_dataset': TASKS,
+        'labels': [],
+        'evaluator': None,
+        'llmclients': {'gpt-4o': ReplayClient(LLM_CFG, {})},
+    }
+
+    [results] = experiment_module.run_batched_experiments([('baseline', prepared)], batch_cfg(tmp_path))
+    assert list(results['question']) == ['How many chairs?']
+    assert list(results['predicted_answer']) == [REPLY]
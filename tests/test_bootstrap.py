@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap import QuestionBootstrap, resample_counts
+
+
+def results(scores_by_serialization, question_types=('count', 'room')):
+    rows = []
+    for serialization, scores in scores_by_serialization.items():
+        for i, score in enumerate(scores):
+            rows.append({
+                'serialization': serialization,
+                'question_type': question_types[i % len(question_types)],
+                'question_id': str(i),
+                'score': score,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_resamples_stay_within_their_stratum():
+    strata = np.array([0, 1, 0, 1, 1, 2])
+    counts = resample_counts(strata, 50, np.random.default_rng(0))
+    assert counts.shape == (50, 6)
+    for stratum, size in enumerate(np.bincount(strata)):
+        np.testing.assert_array_equal(counts[:, strata == stratum].sum(axis=1), size)
+
+
+def test_resampled_accuracy_matches_a_loop():
+    rng = np.random.default_rng(1)
+    df = results({'json': rng.choice([1, 5], 30), 'compact': rng.choice([1, 5], 30)})
+    bootstrap = QuestionBootstrap(df, n_resamples=20)
+    keys, point, samples = bootstrap.accuracy(['serialization'])
+
+    correct = df['score'] > 3.5
+    for group, (serialization, n) in enumerate(zip(keys['serialization'], keys['n'])):
+        rows = (df['serialization'] == serialization).to_numpy()
+        assert n == rows.sum()
+        assert point[group] == correct[rows].mean()
+        question_weights = bootstrap.weights[:, bootstrap.question_codes[rows]]
+        np.testing.assert_allclose(samples[:, group], question_weights @ correct[rows] / question_weights.sum(axis=1))
+
+
+def test_intervals_contain_the_point_accuracy():
+    table = QuestionBootstrap(results({'json': [5, 5, 1, 1] * 10})).ci_table(['serialization'])
+    assert table.loc[0, 'accuracy'] == 0.5
+    assert table.loc[0, 'lower'] < 0.5 < table.loc[0, 'upper']
+
+
+def test_differences_are_paired_by_question():
+    scores = np.random.default_rng(2).choice([1, 5], 40)
+    identical = QuestionBootstrap(results({'json': scores, 'compact': scores})).paired_differences([])
+    assert identical.loc[0, ['diff', 'lower', 'upper']].tolist() == [0, 0, 0]
+    assert not identical.loc[0, 'decided']
+
+    worse = QuestionBootstrap(results({'json': scores, 'compact': np.where(scores > 3.5, 1, scores)})).paired_differences([])
+    assert worse.loc[0, ['serialization_a', 'serialization_b']].tolist() == ['compact', 'json']
+    assert worse.loc[0, 'decided']
+    assert worse.loc[0, 'upper'] < 0
+    assert worse.loc[0, 'p_a_better'] == 0
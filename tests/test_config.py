@@ -0,0 +1,41 @@
+import pytest
+
+from config import execution_key, expand_experiments, expand_grid, group_equivalent
+
+BASE = {
+    'dataset': {'scene_dir': 'scenes'},
+    'prompt': {'task': 'all', 'serialization': {'type': ['json'], 'detail_keys': ['bounding_box']}},
+    'llm': {'model_name': 'gpt-4o', 'temperature': 0.0, 'delay': 1},
+    'evaluation': {'eval_type': 'llm_judge'},
+}
+
+
+def test_grid_has_one_experiment_per_combination():
+    grid = {'axes': {'prompt.serialization.type': [['json'], ['natural']], 'llm.temperature': [0.0, 0.2]}}
+    experiments = expand_grid(grid)
+    assert [experiment['name'] for experiment in experiments] == ['json_0.0', 'json_0.2', 'natural_0.0', 'natural_0.2']
+    assert experiments[3]['overrides'] == {'prompt': {'serialization': {'type': ['natural']}}, 'llm': {'temperature': 0.2}}
+
+
+def test_grid_names_follow_the_format():
+    grid = {'axes': {'llm.temperature': [0.0, 0.2]}, 'name': 't{temperature}'}
+    assert [experiment['name'] for experiment in expand_grid(grid)] == ['t0.0', 't0.2']
+
+
+def test_equivalent_configs_share_an_execution_key():
+    experiments = expand_experiments(BASE, {'experiments': [
+        {'name': 'plain', 'overrides': {}},
+        # Repeated keys and a different request delay don't change the prompts or answers
+        {'name': 'repeated', 'overrides': {'prompt': {'serialization': {'detail_keys': ['bounding_box', 'bounding_box']}}, 'llm': {'delay': 5}}},
+        {'name': 'na', 'overrides': {'prompt': {'serialization': {'detail_keys': ['position', 'NA']}}}},
+        {'name': 'hot', 'overrides': {'llm': {'temperature': 0.7}}},
+    ]})
+    groups = group_equivalent(experiments)
+    assert [[name for name, _ in group] for group in groups] == [['plain', 'repeated'], ['na'], ['hot']]
+    assert dict(experiments)['na']['prompt']['serialization']['detail_keys'] == ['NA']
+    assert execution_key(dict(experiments)['plain']) == execution_key(dict(experiments)['repeated'])
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError):
+        expand_experiments(BASE, {'experiments': [{'name': 'a', 'overrides': {}}, {'name': 'a', 'overrides': {}}]})
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import spark_dsg as dsg
+
+from conftest import make_scene
+from models.incremental import serialize_incremental
+from models.serialization import room_serializers, serialization_functions
+from prompt_builder import serialize_dataset
+
+DETAIL_KEYS = ['position', 'bounding_box']
+CASES = [(serialize_type, DETAIL_KEYS) for serialize_type in sorted(room_serializers)] + [('natural', ['NA'])]
+
+
+@pytest.mark.parametrize('serialize_type, detail_keys', CASES)
+def test_matches_full_serialization(tmp_path, serialize_type, detail_keys):
+    scene_graph = make_scene()
+    expected = serialization_functions[serialize_type](scene_graph, detail_keys)
+
+    encoding, changed, total = serialize_incremental('scene_a.json', scene_graph, serialize_type, detail_keys, tmp_path)
+    assert (encoding, changed, total) == (expected, 3, 3)
+
+    encoding, changed, _ = serialize_incremental('scene_a.json', scene_graph, serialize_type, detail_keys, tmp_path)
+    assert (encoding, changed) == (expected, 0)
+
+
+@pytest.mark.parametrize('serialize_type, detail_keys', CASES)
+def test_only_the_edited_room_is_serialized_again(tmp_path, serialize_type, detail_keys):
+    serialize_incremental('scene_a.json', make_scene(), serialize_type, detail_keys, tmp_path)
+
+    scene_graph = make_scene()
+    scene_graph.get_node(dsg.NodeSymbol('O', 7)).attributes.position = np.array([0.5, 0.5, 0.5])
+    encoding, changed, _ = serialize_incremental('scene_a.json', scene_graph, serialize_type, detail_keys, tmp_path)
+    assert changed == 1
+    assert encoding == serialization_functions[serialize_type](scene_graph, detail_keys)
+
+
+def test_reuse_is_only_reported_when_rooms_were_reused(tmp_path, capsys):
+    serialization_cfg = {'type': ['indented'], 'detail_keys': DETAIL_KEYS, 'cache_dir': str(tmp_path), 'verbose': False}
+    serialize_dataset({'scene_a.json': make_scene()}, serialization_cfg)
+    assert 'reused' not in capsys.readouterr().out
+
+    serialize_dataset({'scene_a.json': make_scene()}, serialization_cfg)
+    assert '[INFO] Serialized 0/3 rooms, reused the rest' in capsys.readouterr().out
@@ -0,0 +1,104 @@
+import copy
+import os
+
+import pandas as pd
+import pytest
+
+import planner
+from planner import DEFAULT_PLANNER_CFG, check_budget, load_history, plan_experiment
+
+
+def write_run(log_dir, name, rows, base_config=None):
+    run_dir = os.path.join(log_dir, name)
+    os.makedirs(os.path.join(run_dir, 'configs'))
+    pd.DataFrame(rows).to_csv(os.path.join(run_dir, 'raw_experiment_results.csv'), index=False)
+    if base_config:
+        with open(os.path.join(run_dir, 'configs', 'base_config.yaml'), "w") as f:
+            f.write(base_config)
+
+
+@pytest.fixture
+def config(tmp_path, scene_file):
+    (tmp_path / 'tasks').mkdir()
+    pd.DataFrame({
+        'id': [0, 1],
+        'scene_id': 'scene_a.json',
+        'query': ['How many chairs are in room 0?', 'Which room is connected to room 2?'],
+        'answer': ['2 items', 'room 1'],
+    }).to_csv(tmp_path / 'tasks' / 'object-count.csv', index=False)
+    (tmp_path / 'v0.txt').write_text("{{scene_repr}}\nQuestion: {{query}}")
+    (tmp_path / 'judge.txt').write_text("Score the answer from 1 to 5.")
+    return {
+        'dataset': {'scene_dir': str(scene_file.parent)},
+        'prompt': {
+            'task': 'count',
+            'task_path': str(tmp_path / 'tasks'),
+            'template_path': str(tmp_path / 'v0.txt'),
+            'serialization': {'type': ['indented'], 'detail_keys': ['NA'], 'verbose': False},
+        },
+        'llm': {'model_name': 'gpt-4o', 'models': ['gpt-4o', 'gpt-4o-mini'], 'max_tokens': 10, 'delay': 0, 'concurrency': 2},
+        'evaluation': {
+            'eval_type': 'llm_judge',
+            'expected_template': str(tmp_path / 'judge.txt'),
+            'llm': {'model_name': 'gpt-4o-mini', 'delay': 0, 'concurrency': 8},
+        },
+    }
+
+
+def test_scenes_are_serialized_once_for_every_model(config, monkeypatch):
+    calls = []
+    serialize_dataset = planner.serialize_dataset
+    monkeypatch.setattr(planner, 'serialize_dataset', lambda *args: calls.append(args) or serialize_dataset(*args))
+
+    scene_cache = {}
+    first = plan_experiment(config, {}, DEFAULT_PLANNER_CFG, scene_cache)
+    hotter = copy.deepcopy(config)
+    hotter['llm']['temperature'] = 1.0
+    assert plan_experiment(hotter, {}, DEFAULT_PLANNER_CFG, scene_cache) == first
+    assert len(calls) == 1
+
+
+def test_judge_is_planned_one_call_at_a_time(config):
+    plan = plan_experiment(config, {}, DEFAULT_PLANNER_CFG, {})
+    # 2 tasks at 5 s with 2 answers in flight, then 2 models x 2 answers judged in turn at 1 s
+    assert plan['calls'] == 8
+    assert plan['wall_time_s'] == 2 * 5.0 / 2 + 4 * 1.0
+
+
+def test_subgraph_selection_is_planned(config):
+    full = plan_experiment(config, {}, DEFAULT_PLANNER_CFG, {})
+    config['prompt']['subgraph'] = {'enabled': True, 'hops': 0}
+    selected = plan_experiment(config, {}, DEFAULT_PLANNER_CFG, {})
+    assert selected['input_tokens'] < full['input_tokens']
+    assert selected['calls'] == full['calls']
+
+
+def test_history_is_kept_per_model(tmp_path):
+    write_run(tmp_path, 'models', [
+        {'model': 'fast', 'llm_elapsed_time': 1.0, 'predicted_answer': 'room 1'},
+        {'model': 'slow', 'llm_elapsed_time': 9.0, 'predicted_answer': 'room 1'},
+    ])
+    # Runs without a model column are attributed to their base config's model
+    write_run(tmp_path, 'single', [
+        {'llm_elapsed_time': 3.0, 'predicted_answer': 'room 2'},
+    ], base_config="llm:\n  model_name: fast\n")
+
+    history = load_history(str(tmp_path))
+    assert history['fast']['latency_s'] == 2.0
+    assert history['fast']['runs'] == 2
+    assert history['slow']['latency_s'] == 9.0
+
+
+def test_dry_runs_are_ignored(tmp_path):
+    write_run(tmp_path, 'real', [{'model': 'gpt-4o', 'llm_elapsed_time': 2.0, 'predicted_answer': 'room 1'}])
+    write_run(tmp_path, 'dry', [{'model': 'gpt-4o', 'llm_elapsed_time': 0.0, 'predicted_answer': '[dry run] gpt-4o'}])
+    assert load_history(str(tmp_path))['gpt-4o']['latency_s'] == 2.0
+
+
+def test_budget_reports_every_exceeded_limit():
+    plan = pd.DataFrame({'calls': [60, 60], 'cost_usd': [1.0, 1.5], 'wall_time_h': [0.5, 0.25]})
+    messages = check_budget(plan, {'max_calls': 100, 'max_cost_usd': 5.0, 'max_hours': 0.5})
+    assert len(messages) == 2
+    assert messages[0].startswith('calls 120.00 exceeds')
+    assert messages[1].startswith('hours 0.75 exceeds')
+    assert check_budget(plan, {}) == []
@@ -0,0 +1,85 @@
+import csv
+import threading
+import time
+
+import pytest
+
+import profiling
+from profiling import StageProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def read_summary(profile_dir):
+    with open(f"{profile_dir}/summary.csv", newline='') as f:
+        return {row['stage']: row for row in csv.DictReader(f)}
+
+
+def test_timing_counts_nested_spans(tmp_path):
+    profiler = StageProfiler('timing')
+    with profiler.span('run'):
+        for _ in range(3):
+            with profiler.span('serialize'):
+                busy(0.01)
+    summary = read_summary(profiler.write(str(tmp_path)))
+    assert int(summary['serialize']['calls']) == 3
+    assert float(summary['serialize']['total_s']) >= 0.03
+    assert float(summary['run']['total_s']) >= float(summary['serialize']['total_s'])
+
+
+def test_share_is_of_the_run_wall_time(tmp_path):
+    profiler = StageProfiler('timing')
+    with profiler.span('run'):
+        with profiler.span('serialize'):
+            busy(0.02)
+        # Queries that overlap in worker threads add up to more than the run took
+        def query():
+            with profiler.span('llm_query'):
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=query) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    summary = read_summary(profiler.write(str(tmp_path)))
+    assert float(summary['run']['share']) == 1.0
+    assert 0 < float(summary['serialize']['share']) < 1.0
+    assert float(summary['llm_query']['share']) > 1.0
+
+
+def test_cprofile_profiles_outermost_spans(tmp_path):
+    profiler = StageProfiler('cprofile')
+    with profiler.span('run'):
+        with profiler.span('serialize'):
+            busy(0.01)
+    profile_dir = profiler.write(str(tmp_path))
+    assert (tmp_path / 'profile' / 'run.prof').exists()
+    assert not (tmp_path / 'profile' / 'serialize.prof').exists()
+    assert set(read_summary(profile_dir)) == {'run', 'serialize'}
+
+
+def test_sampling_writes_stage_stacks(tmp_path):
+    profiler = StageProfiler('sampling', sample_interval=0.001)
+    with profiler.span('run'):
+        with profiler.span('serialize'):
+            busy(0.1)
+    profiler.write(str(tmp_path))
+    stacks = (tmp_path / 'profile' / 'stacks.folded').read_text().splitlines()
+    assert any(line.startswith('run;serialize;') and 'busy' in line for line in stacks)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        StageProfiler('perf')
+
+
+def test_span_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, '_profiler', None)
+    with profiling.span('run'):
+        pass
+    assert profiling.get_profiler() is None
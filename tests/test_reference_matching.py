@@ -0,0 +1,65 @@
+import pandas as pd
+
+from reference_matching import AMBIGUOUS, MATCH, MISMATCH, extract_labels, extract_room_ids, match_references, normalize_answers
+
+LABELS = ['chair', 'box', 'swivel chair', 'table', 'cabinet']
+
+
+def score(question_type, ground_truth, predicted, cfg=None):
+    questions = pd.DataFrame({
+        'question_type': [question_type],
+        'ground_truth_answer': [ground_truth],
+        'predicted_answer': [predicted],
+    })
+    return match_references(questions, LABELS, cfg or {}).iloc[0]
+
+
+def test_counts():
+    assert score('object-count', '3', 'There are three chairs.')['match_status'] == MATCH
+    assert score('object-count', '3', 'I count 4.')['match_status'] == MISMATCH
+    assert score('object-count', '3', 'Either 3 or 4.')['match_status'] == AMBIGUOUS
+
+
+def test_room_lists():
+    text = normalize_answers(pd.Series(['Rooms 1 and 2', 'room 7']))
+    assert list(extract_room_ids(text)) == [frozenset({'1', '2'}), frozenset({'7'})]
+
+
+def test_misspelled_labels_are_corrected():
+    text = normalize_answers(pd.Series(['a cabnet next to the swivel chair']))
+    assert extract_labels(text, LABELS)[0] == frozenset({'cabinet', 'swivel chair'})
+
+
+def test_near_miss_words_are_not_corrected():
+    text = normalize_answers(pd.Series(['The hair dryer is in the bathroom', 'a cab by the tabs']))
+    assert list(extract_labels(text, LABELS)) == [frozenset(), frozenset()]
+    assert score('room-attributes', 'chair', 'a hair dryer')['match_status'] == AMBIGUOUS
+
+
+def test_scores_follow_config():
+    cfg = {'match_score': 4.0, 'mismatch_score': 2.0, 'ambiguous_score': -1}
+    assert score('object-count', '3', '3', cfg)['score'] == 4.0
+    assert score('object-count', '3', '5', cfg)['score'] == 2.0
+    assert score('object-count', '3', 'I cannot tell', cfg)['score'] == -1
+
+
+def test_room_no_is_a_room_id():
+    text = normalize_answers(pd.Series(['It is in room no 3.', 'Rooms no. 1 and 4']))
+    assert list(extract_room_ids(text)) == [frozenset({'3'}), frozenset({'1', '4'})]
+
+
+def test_yes_no_prefixed_counts():
+    assert score('object-count', '2', 'No, there are 2 chairs.')['match_status'] == MATCH
+    assert score('object-count', '2', 'Yes, two chairs.')['match_status'] == MATCH
+
+
+def test_yes_no_prefixed_rooms():
+    assert score('room-attributes', 'room 3', 'No, it is room no 3.')['match_status'] == MATCH
+
+
+def test_plurals_only_stripped_from_labels():
+    text = normalize_answers(pd.Series(['this has boxes and chairs', 'is this a swivel chairs']))
+    assert 'this' in text[0]
+    found = extract_labels(text, LABELS)
+    assert found[0] == frozenset({'box', 'chair'})
+    assert found[1] == frozenset({'swivel chair'})
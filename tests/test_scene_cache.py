@@ -0,0 +1,38 @@
+import pytest
+import spark_dsg as dsg
+
+from models.formats import DETAIL_KEYS
+from models.scene_cache import CachedSceneGraph, cache_path_for, load_cached_scene
+from models.serialization import serialization_functions
+
+# Every sanitized key, all of them together, and attributes the cache reads from the JSON scene
+DETAIL_KEY_SETS = [[key] for key in DETAIL_KEYS] + [list(DETAIL_KEYS), ['name', 'color'], ['NA']]
+
+
+@pytest.fixture
+def scenes(scene_file, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    # The first load converts the scene, the second one reads the cache
+    load_cached_scene(scene_file, cache_dir)
+    cached = load_cached_scene(scene_file, cache_dir)
+    assert isinstance(cached, CachedSceneGraph)
+    return dsg.DynamicSceneGraph.load(str(scene_file)), cached
+
+
+@pytest.mark.parametrize('detail_keys', DETAIL_KEY_SETS, ids=lambda keys: '+'.join(keys))
+@pytest.mark.parametrize('serialize_type', list(serialization_functions))
+def test_cache_serializes_like_the_json_scene(scenes, serialize_type, detail_keys):
+    if serialize_type == 'json' and not set(detail_keys) <= set(DETAIL_KEYS) | {'NA'}:
+        pytest.skip("json only encodes sanitized detail keys")
+    scene_graph, cached = scenes
+    serialize = serialization_functions[serialize_type]
+    assert serialize(cached, detail_keys) == serialize(scene_graph, detail_keys)
+
+
+def test_edited_scene_gets_a_new_cache(scene_file, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    before, _ = cache_path_for(scene_file, cache_dir)
+    scene_file.write_text(scene_file.read_text() + '\n')
+    after, _ = cache_path_for(scene_file, cache_dir)
+    assert before != after
+    assert not isinstance(load_cached_scene(scene_file, cache_dir), CachedSceneGraph)
@@ -0,0 +1,99 @@
+import random
+
+from reference_matching import AMBIGUOUS
+from sequential import paired_interval, run_adaptive
+
+CONFIDENCE = 0.95
+
+
+def arms(names, n_questions, eval_type='llm_judge'):
+    return {
+        name: {'task_dataset': {qid: None for qid in range(n_questions)}, 'config': {'evaluation': {'eval_type': eval_type}}}
+        for name in names
+    }
+
+
+def answer_fn(experiment, qid):
+    return None
+
+
+def scripted_judge(scores_by_arm, seed=0):
+    rng = random.Random(seed)
+
+    def judge_fn(experiment, qid, prediction):
+        name = next(name for name, arm in ARMS.items() if arm is experiment)
+        return {'score': rng.choice(scores_by_arm[name]), 'eval_method': 'llm_judge'}
+    return judge_fn
+
+
+ARMS = arms(['good', 'bad'], 200)
+
+
+def test_clearly_better_arm_stops_early():
+    judge_fn = scripted_judge({'good': [4, 5], 'bad': [1, 2]})
+    rows, decision, history = run_adaptive(ARMS, answer_fn, judge_fn, {'confidence': CONFIDENCE, 'min_questions': 10, 'check_every': 5})
+    assert decision['leader'] == 'good'
+    assert decision['stopped_early'] and decision['reason'] == 'confidence'
+    assert decision['questions_evaluated'] < decision['questions_total']
+    assert len(rows) == 2 * decision['questions_evaluated']
+    assert not history.empty
+
+
+def test_call_budget_stops_sweep():
+    judge_fn = scripted_judge({'good': [1, 5], 'bad': [1, 5]})
+    adaptive_cfg = {'confidence': CONFIDENCE, 'min_questions': 10, 'check_every': 5, 'max_calls': 40}
+    _, decision, _ = run_adaptive(ARMS, answer_fn, judge_fn, adaptive_cfg)
+    # Two arms, each with an answer and a judge call per question
+    assert decision['reason'] == 'budget'
+    assert decision['api_calls'] <= 40
+    assert decision['questions_evaluated'] == 10
+
+
+def test_reference_matching_budget_only_counts_answer_calls():
+    def judge_fn(experiment, qid, prediction):
+        return {'score': 5, 'eval_method': 'reference_matching'}
+
+    adaptive_cfg = {'confidence': CONFIDENCE, 'min_questions': 100, 'max_calls': 40}
+    _, decision, _ = run_adaptive(arms(['a', 'b'], 200, 'reference_matching'), answer_fn, judge_fn, adaptive_cfg)
+    assert decision['questions_evaluated'] == 20
+    assert decision['api_calls'] == 40
+    assert decision['api_calls_full_sweep'] == 400
+
+
+def test_ambiguous_rows_are_not_scored():
+    # Both arms answer everything right, but reference matching can't read half of a's answers
+    experiments = arms(['a', 'b'], 200, 'reference_matching')
+
+    def judge_fn(experiment, qid, prediction):
+        if experiment is experiments['a'] and qid % 2 == 0:
+            return {'score': -1, 'eval_method': AMBIGUOUS}
+        return {'score': 5, 'eval_method': 'reference_matching'}
+
+    rows, decision, _ = run_adaptive(experiments, answer_fn, judge_fn, {'confidence': CONFIDENCE, 'min_questions': 10})
+    assert decision['leader'] is None
+    assert decision['reason'] == 'exhausted'
+    assert (rows['eval_method'] == AMBIGUOUS).sum() == 100
+
+
+def test_identical_arms_are_rarely_decided():
+    # Every arm draws its scores from the same distribution, any decision is a false one
+    adaptive_cfg = {'confidence': CONFIDENCE, 'min_questions': 10, 'check_every': 5}
+    n_sweeps = 200
+    false_decisions = 0
+    for sweep in range(n_sweeps):
+        rng = random.Random(sweep)
+
+        def judge_fn(experiment, qid, prediction):
+            return {'score': rng.choice([1, 5]), 'eval_method': 'reference_matching'}
+
+        _, decision, _ = run_adaptive(arms(['a', 'b', 'c'], 200), answer_fn, judge_fn, adaptive_cfg, seed=sweep)
+        false_decisions += decision['leader'] is not None
+    assert false_decisions / n_sweeps <= 1 - CONFIDENCE
+
+
+def test_zero_variance_interval_has_width():
+    scores_a = {qid: 5 for qid in range(3)}
+    scores_b = {qid: 1 for qid in range(3)}
+    interval = paired_interval(scores_a, scores_b, CONFIDENCE)
+    assert interval['mean_diff'] == 4
+    assert interval['upper'] - interval['lower'] > 0
@@ -0,0 +1,39 @@
+import re
+
+import numpy as np
+import pytest
+import spark_dsg as dsg
+
+from models.serialization import _compact_attribute, compact_encoding, triplets_encoding
+from models.utils import get_object_counts_in_room
+
+
+def test_triplets_list_each_rooms_own_counts(scene_file):
+    scene_graph = dsg.DynamicSceneGraph.load(str(scene_file))
+    encoding = triplets_encoding(scene_graph, ['NA'])
+
+    for room in scene_graph.get_layer(dsg.DsgLayers.ROOMS).nodes:
+        counts = {label: count for label, count in get_object_counts_in_room(scene_graph, room).items() if count}
+        listed = re.findall(rf"\(Room \[id = {room.id.category_id}\], has, ([\w ]+) \[count = (\d+)\]\)", encoding)
+        assert {label: int(count) for label, count in listed} == counts
+        assert len(listed) == len(counts)
+
+
+def test_compact_rows_match_their_header(scene_file):
+    scene_graph = dsg.DynamicSceneGraph.load(str(scene_file))
+    encoding = compact_encoding(scene_graph, ['position', 'bounding_box', 'world_R_object'])
+
+    header = next(line for line in encoding.splitlines() if line.startswith('object rows: '))
+    columns = re.sub(r'\w+\(([^)]*)\)', r'\1', header[len('object rows: '):]).split()
+    rows = [line.split() for line in encoding.splitlines() if re.match(r'\d+ \d+ ', line)]
+    assert rows
+    for row in rows:
+        assert len(row) == len(columns)
+
+
+def test_compact_rejects_values_that_do_not_fit_the_header():
+    with pytest.raises(ValueError):
+        _compact_attribute('position', np.array([1.0, 2.0, 3.0, 4.0]))
+    rotated = dsg.BoundingBox(np.array([1.0, 2.0, 3.0]), np.array([0.1, 0.2, 0.3]), 0.5)
+    with pytest.raises(ValueError):
+        _compact_attribute('bounding_box', rotated)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from service import SceneQueryService, ServiceError
+
+
+@pytest.fixture
+def service(tmp_path, scene_file):
+    template = tmp_path / 'templates' / 'v0.txt'
+    template.parent.mkdir()
+    template.write_text("{{scene_repr}}\nQuestion: {{query}}")
+    config = {
+        'dataset': {'scene_dir': str(scene_file.parent)},
+        'llm': {'model_name': 'gpt-4o-mini', 'mode': 'text', 'temperature': 0.0, 'max_tokens': 16, 'delay': 0},
+        'prompt': {'template_path': str(template), 'serialization': {'type': ['json'], 'detail_keys': ['NA']}},
+    }
+    service = SceneQueryService(config, dry_run=True)
+    service.store.refresh()
+    return service
+
+
+def post(service, request):
+    body = request if isinstance(request, bytes) else json.dumps(request).encode('utf-8')
+    return asyncio.run(service._route('POST', '/query', body))
+
+
+def test_query_answers_and_caches(service):
+    request = {'scene_id': 'scene_a', 'question': 'How many rooms are there?', 'serialization': 'compact'}
+    first = post(service, request)
+    assert first['answer'] == '[dry run] gpt-4o-mini'
+    assert (first['scene_id'], first['serialization'], first['cached']) == ('scene_a.json', ['compact'], False)
+    assert post(service, request)['cached']
+
+
+def test_single_detail_key_is_not_split(service):
+    answer = post(service, {'scene_id': 'scene_a', 'question': 'How many rooms?', 'detail_keys': 'position'})
+    assert answer['detail_keys'] == ['position']
+
+
+@pytest.mark.parametrize('request_body, status', [
+    (b'{"scene_id": ', 400),
+    ([], 400),
+    ({'question': 'How many rooms are there?'}, 400),
+    ({'scene_id': 'scene_a', 'question': ' '}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'serialization': 'yaml'}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'serialization': 5}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'serialization': [['json']]}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'serialization': {'json': True}}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'detail_keys': 'color'}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'detail_keys': [['position']]}, 400),
+    ({'scene_id': 'scene_a', 'question': 'How many rooms?', 'model': 'gpt-5'}, 400),
+    ({'scene_id': 'scene_z', 'question': 'How many rooms?'}, 404),
+])
+def test_invalid_requests_are_rejected(service, request_body, status):
+    with pytest.raises(ServiceError) as error:
+        post(service, request_body)
+    assert error.value.status == status
+
+
+def test_unknown_routes_and_methods(service):
+    with pytest.raises(ServiceError) as error:
+        asyncio.run(service._route('GET', '/query', b''))
+    assert error.value.status == 405
+    with pytest.raises(ServiceError) as error:
+        asyncio.run(service._route('GET', '/answers', b''))
+    assert error.value.status == 404
+
+
+@pytest.mark.parametrize('length', ['abc', '-1'])
+def test_invalid_content_length_is_rejected(service, length):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /query HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode('latin-1'))
+        reader.feed_eof()
+        return await service._read_request(reader)
+
+    with pytest.raises(ServiceError) as error:
+        asyncio.run(read())
+    assert error.value.status == 400
@@ -0,0 +1,59 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from sharding import MANIFEST_FILE, build_manifest, merge_shards, parse_shard, shard_of
+
+ITEMS = [(experiment, f"count_{i}") for experiment in ('baseline', 'json') for i in range(6)]
+
+
+def write_shard(tmp_path, index, num_shards, items=None, rows=None):
+    items = [item for item in ITEMS if shard_of(*item, num_shards) == index] if items is None else items
+    rows = items if rows is None else rows
+    path = tmp_path / f"run_shard{index}of{num_shards}"
+    path.mkdir(exist_ok=True)
+    with open(path / MANIFEST_FILE, 'w') as f:
+        json.dump(build_manifest((index, num_shards), 'hash', ITEMS, items), f)
+    pd.DataFrame({
+        'experiment': [experiment for experiment, _ in rows],
+        'question_type': [task.split('_')[0] for _, task in rows],
+        'question_id': [task.split('_')[1] for _, task in rows],
+        'score': 5,
+    }).to_csv(path / "raw_experiment_results.csv", index=False)
+    return str(path)
+
+
+def merged_items(merged):
+    return list(zip(merged['experiment'], merged['question_type'] + '_' + merged['question_id']))
+
+
+def test_parse_shard():
+    assert parse_shard(' 1 / 3 ') == (1, 3)
+    for shard in ('3/3', '1', '0/0'):
+        with pytest.raises(ValueError):
+            parse_shard(shard)
+
+
+def test_merge_restores_unsharded_order(tmp_path):
+    paths = [write_shard(tmp_path, index, 3) for index in (2, 0, 1)]
+    assert merged_items(merge_shards(paths)) == ITEMS
+
+
+def test_missing_and_repeated_shards_are_reported(tmp_path):
+    first, second = write_shard(tmp_path, 0, 3), write_shard(tmp_path, 1, 3)
+    with pytest.raises(ValueError, match=r"missing shards: \[2\]"):
+        merge_shards([first, second])
+    with pytest.raises(ValueError, match=r"shards given more than once: \[0\]"):
+        merge_shards([first, first, second, write_shard(tmp_path, 2, 3)])
+
+
+def test_missing_and_duplicate_results_are_reported(tmp_path):
+    items = [item for item in ITEMS if shard_of(*item, 2) == 0]
+    incomplete = write_shard(tmp_path, 0, 2, items, rows=items[1:] + items[1:2])
+    with pytest.raises(ValueError) as error:
+        merge_shards([incomplete, write_shard(tmp_path, 1, 2)])
+    assert "1 work items without results" in str(error.value)
+    assert "1 work items have more than one result" in str(error.value)
+    assert "1 work items have no result" in str(error.value)
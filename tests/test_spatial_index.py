@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from models.spatial_index import KDTree
+
+
+def brute_force_distances(points):
+    distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    return distances
+
+
+@pytest.mark.parametrize('n_points, leaf_size', [(5, 32), (300, 8), (1000, 32)])
+def test_knn_matches_brute_force(n_points, leaf_size):
+    points = np.random.default_rng(n_points).random((n_points, 3)) * 10
+    indices, distances = KDTree(points, leaf_size).query_knn(3)
+
+    expected = np.argsort(brute_force_distances(points), axis=1)[:, :3]
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(distances, np.linalg.norm(points[expected] - points[:, None, :], axis=2))
+
+
+@pytest.mark.parametrize('n_points, leaf_size', [(5, 32), (300, 8), (1000, 32)])
+def test_radius_matches_brute_force(n_points, leaf_size):
+    points = np.random.default_rng(n_points).random((n_points, 3)) * 10
+    neighbors = KDTree(points, leaf_size).query_radius(1.5)
+
+    distances = brute_force_distances(points)
+    for i, found in enumerate(neighbors):
+        within = np.flatnonzero(distances[i] <= 1.5)
+        np.testing.assert_array_equal(found, within[np.argsort(distances[i, within])])
+
+
+def test_fewer_points_than_neighbors():
+    indices, distances = KDTree(np.zeros((1, 3))).query_knn(3)
+    assert indices.shape == distances.shape == (1, 0)
+    assert [list(found) for found in KDTree(np.array([[0.0, 0, 0], [0.5, 0, 0]])).query_radius(1.0)] == [[1], [0]]
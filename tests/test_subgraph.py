@@ -0,0 +1,71 @@
+import spark_dsg as dsg
+
+from conftest import make_scene
+from models.scene_index import SceneIndex, SubgraphView
+from models.serialization import indented_encoding
+from subgraph import select_task_subgraphs
+
+LABELS = ['chair', 'table']
+
+
+def chain_index(n_rooms):
+    # Rooms 0 - 1 - ... - n-1 in a row, a chair in room 0 and a table in the last room
+    index = SceneIndex.__new__(SceneIndex)
+    index.rooms = {room_id: room_id for room_id in range(n_rooms)}
+    index.adjacency = {room_id: {r for r in (room_id - 1, room_id + 1) if 0 <= r < n_rooms} for room_id in range(n_rooms)}
+    index.label_rooms = {'chair': {0}, 'table': {n_rooms - 1}}
+    return index
+
+
+def select(query, hops=1):
+    tasks = {'task': {'scene_id': 'scene', 'query': query}}
+    return select_task_subgraphs(tasks, {'scene': chain_index(6)}, LABELS, hops)['task']
+
+
+def test_named_rooms_select_their_neighbors():
+    assert select('Which room is room 2 connected to?') == {'rooms': frozenset({1, 2, 3}), 'reason': 'rooms'}
+    assert select('Which room is room 2 connected to?', hops=2) == {'rooms': frozenset({0, 1, 2, 3, 4}), 'reason': 'rooms'}
+
+
+def test_labels_select_their_rooms():
+    assert select('Is there a table in the house?') == {'rooms': frozenset({5}), 'reason': 'labels'}
+
+
+def test_falls_back_to_the_full_scene():
+    assert select('How many rooms are there?') == {'rooms': None, 'reason': 'no rooms or labels'}
+    assert select('What is in room 9?') == {'rooms': None, 'reason': 'unknown room'}
+    assert select('Which rooms are connected to room 1 or room 4?', hops=2)['rooms'] is None
+
+
+def test_view_only_serializes_the_selected_rooms():
+    scene_graph = make_scene()
+    view = SubgraphView(scene_graph, {0})
+    assert [room.id.category_id for room in view.get_layer(dsg.DsgLayers.ROOMS).nodes] == [0]
+    encoding = indented_encoding(view, ['NA'])
+    assert 'Room (id = 0)' in encoding
+    assert 'Room (id = 1)' not in encoding
+
+
+def test_room_no_selects_that_room_and_its_neighbors():
+    assert select('Which room is room no 2 connected to?') == {'rooms': frozenset({1, 2, 3}), 'reason': 'rooms'}
+
+
+def test_plural_labels_select_their_rooms():
+    assert select('How many tables are there?') == {'rooms': frozenset({5}), 'reason': 'labels'}
+
+
+def test_negative_and_comparative_questions_keep_the_full_scene():
+    for query in (
+        'Which room has no chairs?',
+        'Which room does not have a table?',
+        "Which room doesn't have a table?",
+        'Which room has none of the tables?',
+        'Which room has the most chairs?',
+        'Are there more tables than chairs?',
+    ):
+        assert select(query) == {'rooms': None, 'reason': 'negative or comparative'}, query
+
+
+def test_room_and_object_ids_are_not_negations():
+    assert select('Is there a table with id 0?') == {'rooms': frozenset({5}), 'reason': 'labels'}
+    assert select('How many chairs are in room no 0?') == {'rooms': frozenset({0, 1}), 'reason': 'rooms'}